@@ -0,0 +1,96 @@
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import config  # noqa: E402
+from embedding_writer import EmbeddingWriter  # noqa: E402
+from fake_openai import FakeOpenAIServer  # noqa: E402
+import chromadb  # noqa: E402
+from langchain_chroma import Chroma  # noqa: E402
+from langchain_openai import OpenAIEmbeddings  # noqa: E402
+from vectorstore import LocalChromaDB  # noqa: E402
+
+
+def make_items(count, words):
+    return [
+        (
+            f"bench:{i}",
+            {
+                "content": " ".join(f"word{(i * 7 + w) % 997}" for w in range(words)),
+                "metadata": {"doc_id": "bench", "chunk_index": i},
+            },
+        )
+        for i in range(count)
+    ]
+
+
+def serial_add_texts(vectorstore, items, batch_size):
+    for start in range(0, len(items), batch_size):
+        batch = items[start : start + batch_size]
+        vectorstore.add_texts(
+            texts=[chunk["content"] for _, chunk in batch],
+            metadatas=[chunk["metadata"] for _, chunk in batch],
+            ids=[chunk_id for chunk_id, _ in batch],
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serial add_texts vs EmbeddingWriter against a fake, rate limited embeddings API."
+    )
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=150)
+    parser.add_argument("--embedding-latency", type=float, default=0.2)
+    parser.add_argument(
+        "--max-concurrent-requests",
+        type=int,
+        default=4,
+        help="Requests above this many in flight get a 429 from the fake API.",
+    )
+    parser.add_argument(
+        "--max-concurrency", type=int, default=config.EMBEDDING_MAX_CONCURRENCY
+    )
+    args = parser.parse_args()
+
+    items = make_items(args.chunks, args.words)
+    with FakeOpenAIServer(
+        embedding_latency=args.embedding_latency,
+        max_concurrent_embeddings=args.max_concurrent_requests,
+    ) as server:
+        embeddings = OpenAIEmbeddings(
+            model=config.EMBEDDING_MODEL,
+            api_key="sk-fake",
+            base_url=server.base_url,
+            check_embedding_ctx_length=False,
+            max_retries=0,
+        )
+
+        baseline = Chroma(
+            client=chromadb.PersistentClient(tempfile.mkdtemp()),
+            collection_name="bench",
+            embedding_function=embeddings,
+        )
+        start = time.perf_counter()
+        serial_add_texts(baseline, items, config.EMBEDDING_BATCH_SIZE)
+        serial = time.perf_counter() - start
+        print(f"serial add_texts: {args.chunks / serial:>10.1f} chunks/s")
+
+        vectorstore = LocalChromaDB(tempfile.mkdtemp()).get_vectorstore(embeddings)
+        writer = EmbeddingWriter(vectorstore, max_concurrency=args.max_concurrency)
+        writer.write(items)
+        stats = writer.stats()
+        print(
+            f"EmbeddingWriter:  {stats['chunks_per_s']:>10.1f} chunks/s "
+            f"({stats['batches']} batches, {stats['retries']} retries, "
+            f"{stats['rate_limited']} rate limited, final concurrency "
+            f"{stats['concurrency']})"
+        )
+        assert vectorstore.count() == args.chunks
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import argparse
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import config  # noqa: E402
+from fakes import get_redis_client  # noqa: E402
+from session_manager import RedisSessionManager  # noqa: E402
+
+
+class RoundTripCounter:
+    def __init__(self, client):
+        self.count = 0
+        self.lock = threading.Lock()
+        execute_command = client.execute_command
+        pipeline = client.pipeline
+
+        def counted_execute_command(*args, **kwargs):
+            self._increment()
+            return execute_command(*args, **kwargs)
+
+        def counted_pipeline(*args, **kwargs):
+            pipe = pipeline(*args, **kwargs)
+            execute = pipe.execute
+
+            def counted_execute(*exec_args, **exec_kwargs):
+                self._increment()
+                return execute(*exec_args, **exec_kwargs)
+
+            pipe.execute = counted_execute
+            return pipe
+
+        client.execute_command = counted_execute_command
+        client.pipeline = counted_pipeline
+
+    def _increment(self):
+        with self.lock:
+            self.count += 1
+
+    def measure(self, fn, *args):
+        before = self.count
+        fn(*args)
+        return self.count - before
+
+
+def report_round_trips(manager, counter):
+    manager.redis_client.flushdb()
+    for script in (
+        manager._create_session,
+        manager._touch_session,
+        manager._add_file,
+    ):
+        manager.redis_client.script_load(script.script)
+    session_ids = [manager.generate_session_id() for _ in range(config.MAX_SESSIONS)]
+    for session_id in session_ids:
+        manager.create_session(session_id)
+    new_session = manager.generate_session_id()
+    operations = [
+        ("create_session (evicting)", manager.create_session, new_session),
+        ("is_valid_session", manager.is_valid_session, new_session),
+        ("can_add_file", manager.can_add_file, new_session),
+        ("add_file_to_session", manager.add_file_to_session, new_session, "a.pdf"),
+        ("get_session_files", manager.get_session_files, new_session),
+        (
+            "remove_file_from_session",
+            manager.remove_file_from_session,
+            new_session,
+            "a.pdf",
+        ),
+        ("remove_session", manager.remove_session, new_session),
+    ]
+    print(f"{'operation':<28} {'round trips':>11}")
+    for name, fn, *args in operations:
+        print(f"{name:<28} {counter.measure(fn, *args):>11}")
+
+
+def check_concurrent_writers(manager, writers):
+    manager.redis_client.flushdb()
+    session_id = manager.generate_session_id()
+    manager.create_session(session_id)
+    barrier = threading.Barrier(writers)
+    accepted = []
+
+    def upload(i):
+        barrier.wait()
+        if manager.add_file_to_session(session_id, f"file-{i}.pdf"):
+            accepted.append(i)
+
+    threads = [threading.Thread(target=upload, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stored = manager.get_session_files(session_id)
+    print(
+        f"\n{writers} concurrent add_file_to_session calls: "
+        f"{len(accepted)} accepted, {len(stored)} stored "
+        f"(limit {manager.max_files_per_session})"
+    )
+    assert len(stored) == len(accepted) <= manager.max_files_per_session
+
+
+def check_concurrent_sessions(manager, writers):
+    manager.redis_client.flushdb()
+    barrier = threading.Barrier(writers)
+
+    def create(i):
+        barrier.wait()
+        manager.create_session(f"session-{i}")
+
+    threads = [threading.Thread(target=create, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    queued = manager.redis_client.zcard(manager.session_queue_key)
+    print(
+        f"{writers} concurrent create_session calls: {queued} sessions queued "
+        f"(limit {manager.max_sessions})"
+    )
+    assert queued == manager.max_sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Round trips and concurrency behaviour of RedisSessionManager."
+    )
+    parser.add_argument(
+        "--redis-url",
+        help="Redis to run against (default: in-process fakeredis stand-in).",
+    )
+    parser.add_argument("--writers", type=int, default=32)
+    args = parser.parse_args()
+
+    client = get_redis_client(args.redis_url)
+    counter = RoundTripCounter(client)
+    manager = RedisSessionManager(redis_client=client)
+
+    report_round_trips(manager, counter)
+    check_concurrent_writers(manager, args.writers)
+    check_concurrent_sessions(manager, args.writers)
+
+
+if __name__ == "__main__":
+    main()
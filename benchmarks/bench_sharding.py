@@ -0,0 +1,136 @@
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from numpy_vectorstore import NumpyVectorStore  # noqa: E402
+from vectorstore import LocalChromaDB, RemoteChromaDB  # noqa: E402
+
+EMBEDDING_SIZE = 32
+FILES_PER_SESSION = 3
+K = 20
+
+
+def session_doc_ids(session):
+    return [f"session-{session}-doc-{f}" for f in range(FILES_PER_SESSION)]
+
+
+def add_sessions(vectorstore, start, stop, chunks_per_doc, vectors):
+    for session in range(start, stop):
+        for doc_id in session_doc_ids(session):
+            rng = np.random.default_rng(zlib.crc32(doc_id.encode()))
+            embeddings = rng.random((chunks_per_doc, EMBEDDING_SIZE), dtype=np.float32)
+            vectors[doc_id] = embeddings
+            vectorstore.upsert(
+                ids=[f"{doc_id}:{i}" for i in range(chunks_per_doc)],
+                embeddings=embeddings.tolist(),
+                documents=[f"chunk {i} of {doc_id}" for i in range(chunks_per_doc)],
+                metadatas=[
+                    {"doc_id": doc_id, "chunk_index": i, "file_name": f"{doc_id}.pdf"}
+                    for i in range(chunks_per_doc)
+                ],
+            )
+
+
+def exact_top_k(vectors, doc_ids, query):
+    ids = [f"{doc_id}:{i}" for doc_id in doc_ids for i in range(len(vectors[doc_id]))]
+    matrix = np.concatenate([vectors[doc_id] for doc_id in doc_ids])
+    distances = ((matrix - query) ** 2).sum(axis=1)
+    return {ids[i] for i in np.argsort(distances)[:K]}
+
+
+def measure(vectorstore, vectors, session_ids, rng):
+    latencies, recalls = [], []
+    for session in session_ids:
+        doc_ids = session_doc_ids(session)
+        query = np.array([rng.random() for _ in range(EMBEDDING_SIZE)], np.float32)
+        start = time.perf_counter()
+        matches = vectorstore.query(query.tolist(), K, doc_ids=doc_ids)
+        latencies.append((time.perf_counter() - start) * 1000)
+        expected = exact_top_k(vectors, doc_ids, query)
+        recalls.append(len(expected & {match["id"] for match in matches}) / K)
+    latencies.sort()
+    return (
+        statistics.median(latencies),
+        latencies[max(int(len(latencies) * 0.95) - 1, 0)],
+        statistics.mean(recalls),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Query latency and recall vs number of sessions for a single "
+        "filtered collection, hashed buckets, one collection per document and "
+        "the memory-mapped NumPy store."
+    )
+    parser.add_argument(
+        "--sessions",
+        default="10,100,500",
+        help="Comma separated session counts to measure at.",
+    )
+    parser.add_argument("--chunks-per-doc", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument(
+        "--layouts",
+        default="1,16,0,int8,float32",
+        help="VECTOR_SHARDS values to compare (1 = single collection, "
+        "0 = one collection per document) and NUMPY_VECTOR_DTYPE values for the "
+        "NumPy store.",
+    )
+    parser.add_argument(
+        "--host", help="Benchmark a remote ChromaDB instead of a local one."
+    )
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    stores = {}
+    for layout in args.layouts.split(","):
+        if not layout.isdigit():
+            stores[layout] = NumpyVectorStore(
+                tempfile.mkdtemp(prefix=f"bench_numpy_{layout}_"), None, layout
+            )
+            continue
+        layout = int(layout)
+        if args.host:
+            db = RemoteChromaDB(args.host, args.port)
+            db.collection_name = f"bench-{layout}-{int(time.time())}"
+        else:
+            db = LocalChromaDB(tempfile.mkdtemp(prefix=f"bench_shards_{layout}_"))
+        stores[layout] = db.get_vectorstore(None, shards=layout)
+
+    vectors = {}
+    # "cold" is each session's first query, which has to load the session's
+    # index segments; "warm" repeats queries against already loaded ones.
+    print(
+        f"{'sessions':>9} {'layout':>14} {'cold p50':>9} {'warm p50':>9} "
+        f"{'warm p95':>9} {'recall@' + str(K):>10}"
+    )
+    filled = 0
+    for sessions in (int(s) for s in args.sessions.split(",")):
+        for layout, vectorstore in stores.items():
+            add_sessions(vectorstore, filled, sessions, args.chunks_per_doc, vectors)
+        filled = sessions
+        for layout, vectorstore in stores.items():
+            name = {0: "per-document", 1: "single"}.get(layout, f"{layout} buckets")
+            if isinstance(layout, str):
+                name = f"numpy {layout}"
+            rng = random.Random(sessions)
+            session_ids = rng.sample(range(sessions), min(args.queries, sessions))
+            cold, _, _ = measure(vectorstore, vectors, session_ids, rng)
+            warm, warm_p95, recall = measure(vectorstore, vectors, session_ids, rng)
+            print(
+                f"{sessions:>9} {name:>14} {cold:>7.2f}ms {warm:>7.2f}ms "
+                f"{warm_p95:>7.2f}ms {recall:>10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
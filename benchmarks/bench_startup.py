@@ -0,0 +1,104 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+APP = ROOT / "src" / "app.py"
+
+
+def median_ms(samples):
+    return round(statistics.median(samples) * 1000, 2)
+
+
+def timed_reruns(app_test, reruns):
+    samples = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app_test.run()
+        samples.append(time.perf_counter() - start)
+    return median_ms(samples)
+
+
+def child(reruns):
+    start = time.perf_counter()
+    sys.path.insert(0, str(ROOT / "src"))
+    import config
+
+    # Keep the benchmark's sessions and indexes out of the real data dir.
+    data_dir = Path(tempfile.mkdtemp(prefix="bench_startup_"))
+    original = config.DATA_DIR
+    for name, value in list(vars(config).items()):
+        if isinstance(value, Path) and value.is_relative_to(original):
+            setattr(config, name, data_dir / value.relative_to(original))
+
+    from streamlit.testing.v1 import AppTest
+
+    app_test = AppTest.from_file(str(APP), default_timeout=120)
+    # The local storage component never answers outside a browser.
+    app_test.session_state["storage_init"] = {}
+    app_test.run()
+    result = {"first_render_ms": median_ms([time.perf_counter() - start])}
+    result["rerun_no_key_ms"] = timed_reruns(app_test, reruns)
+
+    app_test.sidebar.text_input[0].input("sk-bench").run()
+    result["rerun_ms"] = timed_reruns(app_test, reruns)
+
+    from session_manager import get_session_manager
+
+    get_session_manager().add_file_to_session(
+        app_test.session_state["session_id"], "bench.pdf"
+    )
+    start = time.perf_counter()
+    app_test.run()
+    result["first_chat_ms"] = median_ms([time.perf_counter() - start])
+    result["rerun_with_chat_ms"] = timed_reruns(app_test, reruns)
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cold start and per-rerun overhead of the Streamlit app, run "
+        "headless with AppTest in fresh processes."
+    )
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes.")
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.reruns)
+        return
+
+    runs = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", "--reruns", str(args.reruns)],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result["process_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        runs.append(result)
+
+    # "first render" is interpreter start to the API key prompt, "first chat"
+    # the rerun that builds a session's chatbot once it has a document.
+    for key in (
+        "process_ms",
+        "first_render_ms",
+        "rerun_no_key_ms",
+        "rerun_ms",
+        "first_chat_ms",
+        "rerun_with_chat_ms",
+    ):
+        print(f"{key:>20}: {statistics.median(run[key] for run in runs):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import config  # noqa: E402
+from langchain_openai import OpenAIEmbeddings  # noqa: E402
+from chatbot import ChatBot  # noqa: E402
+from document_registry import LocalDocumentRegistry  # noqa: E402
+from fake_openai import FakeOpenAIServer  # noqa: E402
+from lexical_index import LexicalIndexManager  # noqa: E402
+from vectorstore import LocalChromaDB, VectorStoreManager  # noqa: E402
+
+SESSION_ID = "bench-session"
+DOC_ID = "bench-document"
+
+
+async def sync_retrieval_stream(chatbot, query):
+    message_history, prompt = chatbot.augment_prompt(query)
+    async with chatbot.agent.run_stream(
+        prompt, message_history=message_history
+    ) as result:
+        async for text in result.stream_text(delta=True):
+            yield text
+
+
+async def time_to_first_token(stream):
+    start = time.perf_counter()
+    ttft = None
+    async for _ in stream:
+        if ttft is None:
+            ttft = time.perf_counter() - start
+    return ttft * 1000
+
+
+async def run(chatbot, mode, concurrency):
+    streams = [
+        (
+            chatbot.chat_stream(f"question {i}")
+            if mode == "async"
+            else sync_retrieval_stream(chatbot, f"question {i}")
+        )
+        for i in range(concurrency)
+    ]
+    return await asyncio.gather(*(time_to_first_token(s) for s in streams))
+
+
+def build_chatbot(base_url, chunks):
+    tmp_dir = tempfile.mkdtemp(prefix="bench_ttft_")
+    embed_model = OpenAIEmbeddings(
+        model=config.EMBEDDING_MODEL,
+        api_key="sk-fake",
+        base_url=base_url,
+        check_embedding_ctx_length=False,
+    )
+    vectorstore = LocalChromaDB(f"{tmp_dir}/chroma").get_vectorstore(embed_model)
+    lexical_index = LexicalIndexManager(f"{tmp_dir}/lexical_index")
+    registry = LocalDocumentRegistry(f"{tmp_dir}/documents.sqlite3")
+    manager = VectorStoreManager(
+        vectorstore, lexical_index=lexical_index, document_registry=registry
+    )
+    manager.attach_document(SESSION_ID, "bench.pdf", DOC_ID)
+    manager.add_chunks(
+        [
+            {
+                "content": f"chunk {i} about topic {i % 17}",
+                "metadata": {
+                    "source": "bench.pdf",
+                    "file_name": "bench.pdf",
+                    "doc_id": DOC_ID,
+                    "chunk_index": i,
+                },
+            }
+            for i in range(chunks)
+        ]
+    )
+    manager.mark_documents_stored(SESSION_ID, [DOC_ID])
+    return ChatBot(
+        vectorstore=vectorstore,
+        openai_api_key="sk-fake",
+        session_id=SESSION_ID,
+        lexical_index=lexical_index,
+        document_registry=registry,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time to first token of ChatBot.chat_stream with sync vs async retrieval."
+    )
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--first-token-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(
+        embedding_latency=args.embedding_latency,
+        first_token_latency=args.first_token_latency,
+    ) as server:
+        config.OPENAI_BASE_URL = server.base_url
+        chatbot = build_chatbot(server.base_url, args.chunks)
+
+        print(f"{'mode':>6} {'concurrency':>11} {'ttft p50':>10} {'ttft p95':>10}")
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            for mode in ("sync", "async"):
+                ttfts = sorted(asyncio.run(run(chatbot, mode, concurrency)))
+                p95 = ttfts[min(len(ttfts) - 1, int(len(ttfts) * 0.95))]
+                print(
+                    f"{mode:>6} {concurrency:>11} "
+                    f"{statistics.median(ttfts):>8.1f}ms {p95:>8.1f}ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from document_registry import LocalDocumentRegistry  # noqa: E402
+from langchain_core.embeddings import DeterministicFakeEmbedding  # noqa: E402
+from vectorstore import LocalChromaDB, RemoteChromaDB, VectorStoreManager  # noqa: E402
+
+EMBEDDING_SIZE = 32
+CHUNKS_PER_FILE = 200
+FILES_PER_SESSION = 3
+
+
+def fill_collection(vectorstore, start, stop, batch_size):
+    rng = random.Random(start)
+    for batch_start in range(start, stop, batch_size):
+        batch_ids = range(batch_start, min(batch_start + batch_size, stop))
+        vectorstore.upsert(
+            ids=[f"filler-{i}" for i in batch_ids],
+            embeddings=[
+                [rng.random() for _ in range(EMBEDDING_SIZE)] for _ in batch_ids
+            ],
+            documents=[f"filler chunk {i}" for i in batch_ids],
+            metadatas=[
+                {
+                    "doc_id": f"filler-doc-{i // CHUNKS_PER_FILE}",
+                    "chunk_index": i % CHUNKS_PER_FILE,
+                    "file_name": f"file-{(i // CHUNKS_PER_FILE) % FILES_PER_SESSION}.pdf",
+                    "source": "filler",
+                }
+                for i in batch_ids
+            ],
+        )
+
+
+def add_target_session(manager, session_id):
+    doc_ids = [f"{session_id}-doc-{f}" for f in range(FILES_PER_SESSION)]
+    for f, doc_id in enumerate(doc_ids):
+        manager.attach_document(session_id, f"file-{f}.pdf", doc_id)
+    chunks = [
+        {
+            "content": f"target chunk {i}",
+            "metadata": {
+                "source": f"file-{f}.pdf",
+                "file_name": f"file-{f}.pdf",
+                "doc_id": doc_id,
+                "chunk_index": i,
+            },
+        }
+        for f, doc_id in enumerate(doc_ids)
+        for i in range(CHUNKS_PER_FILE)
+    ]
+    manager.add_chunks(chunks)
+    manager.mark_documents_stored(session_id, doc_ids)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Latency of session-scoped VectorStoreManager operations vs collection size."
+    )
+    parser.add_argument(
+        "--sizes",
+        default="10000,100000,1000000",
+        help="Comma separated collection sizes (in chunks) to measure at.",
+    )
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--host", help="Benchmark a remote ChromaDB instead of a local one.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=None,
+        help="Override VECTOR_SHARDS (0 = one collection per document).",
+    )
+    args = parser.parse_args()
+
+    embed_model = DeterministicFakeEmbedding(size=EMBEDDING_SIZE)
+    if args.host:
+        db = RemoteChromaDB(args.host, args.port)
+    else:
+        db = LocalChromaDB(tempfile.mkdtemp(prefix="bench_chroma_"))
+    vectorstore = db.get_vectorstore(embed_model, shards=args.shards)
+    registry = LocalDocumentRegistry(
+        Path(tempfile.mkdtemp(prefix="bench_registry_")) / "documents.sqlite3"
+    )
+
+    print(f"{'chunks':>10} {'processed_files':>16} {'remove_file':>12} {'remove_session':>15}")
+    filled = 0
+    for run, size in enumerate(int(s) for s in args.sizes.split(",")):
+        fill_collection(vectorstore, filled, size, args.batch_size)
+        filled = size
+
+        session_id = f"target-session-{run}"
+        manager = VectorStoreManager(vectorstore, document_registry=registry)
+        add_target_session(manager, session_id)
+
+        lookup_ms = timed(manager.get_processed_files_for_session, session_id)
+        remove_file_ms = timed(
+            manager.remove_documents_by_session_and_file, session_id, "file-0.pdf"
+        )
+        remove_session_ms = timed(manager.remove_documents_by_session, session_id)
+        print(
+            f"{size:>10} {lookup_ms:>14.1f}ms {remove_file_ms:>10.1f}ms {remove_session_ms:>13.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
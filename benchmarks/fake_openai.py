@@ -0,0 +1,182 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_SIZE = 256
+
+
+def fake_embedding(value, size=EMBEDDING_SIZE):
+    seed = hashlib.sha256(json.dumps(value).encode()).digest()
+    rng = random.Random(seed)
+    return [rng.uniform(-1, 1) for _ in range(size)]
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = self._read_json()
+        if self.path.endswith("/embeddings"):
+            self._embeddings(request)
+        elif self.path.endswith("/chat/completions"):
+            self._chat_completions(request)
+        else:
+            self.send_error(404)
+
+    def _send_rate_limited(self):
+        body = json.dumps(
+            {"error": {"message": "Rate limit reached", "type": "requests"}}
+        ).encode()
+        self.send_response(429)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _embeddings(self, request):
+        if not self.server.acquire_embedding_slot():
+            self._send_rate_limited()
+            return
+        try:
+            time.sleep(self.server.embedding_latency)
+        finally:
+            self.server.release_embedding_slot()
+        inputs = request["input"]
+        if not isinstance(inputs, list) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        self._send_json(
+            {
+                "object": "list",
+                "model": request.get("model", "fake"),
+                "data": [
+                    {
+                        "object": "embedding",
+                        "index": i,
+                        "embedding": fake_embedding(value),
+                    }
+                    for i, value in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            }
+        )
+
+    def _chat_chunk(self, request, delta, finish_reason=None):
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    def _chat_completions(self, request):
+        time.sleep(self.server.first_token_latency)
+        tokens = [f"token{i} " for i in range(self.server.answer_tokens)]
+        if not request.get("stream"):
+            self._send_json(
+                {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "fake"),
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {
+                                "role": "assistant",
+                                "content": "".join(tokens),
+                            },
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": 0,
+                        "completion_tokens": 0,
+                        "total_tokens": 0,
+                    },
+                }
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        events = [self._chat_chunk(request, {"role": "assistant", "content": ""})]
+        events += [self._chat_chunk(request, {"content": token}) for token in tokens]
+        events.append(self._chat_chunk(request, {}, "stop"))
+        for i, event in enumerate(events):
+            if i > 1:
+                time.sleep(self.server.token_latency)
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        embedding_latency=0.05,
+        first_token_latency=0.1,
+        token_latency=0.005,
+        answer_tokens=20,
+        max_concurrent_embeddings=None,
+    ):
+        super().__init__(("127.0.0.1", 0), FakeOpenAIHandler)
+        self.embedding_latency = embedding_latency
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.answer_tokens = answer_tokens
+        self.max_concurrent_embeddings = max_concurrent_embeddings
+        self.active_embeddings = 0
+        self.rate_limited = 0
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def acquire_embedding_slot(self):
+        with self.lock:
+            limit = self.max_concurrent_embeddings
+            if limit is not None and self.active_embeddings >= limit:
+                self.rate_limited += 1
+                return False
+            self.active_embeddings += 1
+            return True
+
+    def release_embedding_slot(self):
+        with self.lock:
+            self.active_embeddings -= 1
+
+    @property
+    def base_url(self):
+        host, port = self.server_address
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,60 @@
+import asyncio
+import random
+
+import pymupdf
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from pydantic_ai.models.function import FunctionModel
+
+WORDS = (
+    "contract clause section warranty liability payment invoice delivery "
+    "supplier customer term notice party agreement schedule annex service "
+    "level availability incident response support renewal termination fee "
+    "penalty audit compliance data privacy security breach report"
+).split()
+
+
+def fake_embeddings(size=256):
+    return DeterministicFakeEmbedding(size=size)
+
+
+def fake_stream_model(first_token_latency=0.1, token_latency=0.005, tokens=20):
+    async def stream(messages, agent_info):
+        await asyncio.sleep(first_token_latency)
+        for i in range(tokens):
+            yield f"token{i} "
+            await asyncio.sleep(token_latency)
+
+    return FunctionModel(stream_function=stream, model_name="fake-stream")
+
+
+def make_pdf(path, pages, words_per_page=400, seed=0):
+    rng = random.Random(seed)
+    doc = pymupdf.open()
+    for page_number in range(pages):
+        page = doc.new_page()
+        paragraphs = [f"Section {page_number + 1}"]
+        for _ in range(max(words_per_page // 60, 1)):
+            words = rng.choices(WORDS, k=60)
+            words.append(f"ID-{rng.randint(1000, 9999)}.")
+            paragraphs.append(" ".join(words))
+        text = "\n\n".join(paragraphs)
+        box = page.rect + (50, 50, -50, -50)
+        # insert_textbox writes nothing and returns a negative value when the
+        # text does not fit, so shrink the font until the whole page fits.
+        for fontsize in (11, 9, 7, 5, 4):
+            if page.insert_textbox(box, text, fontsize=fontsize) >= 0:
+                break
+        else:
+            raise ValueError(f"{words_per_page} words do not fit on one page")
+    doc.save(path)
+    doc.close()
+
+
+def get_redis_client(url=None):
+    import redis
+
+    if url:
+        return redis.Redis.from_url(url, decode_responses=True)
+    import fakeredis
+
+    return fakeredis.FakeRedis(decode_responses=True)
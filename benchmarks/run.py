@@ -0,0 +1,294 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+import config  # noqa: E402
+from chatbot import ChatBot  # noqa: E402
+from document_registry import LocalDocumentRegistry  # noqa: E402
+from embeddings import HashingEmbeddings  # noqa: E402
+from fakes import (  # noqa: E402
+    fake_embeddings,
+    fake_stream_model,
+    get_redis_client,
+    make_pdf,
+)
+from lexical_index import LexicalIndexManager  # noqa: E402
+from markdown_cache import MarkdownCache  # noqa: E402
+from processing import DocumentProcessor  # noqa: E402
+from session_manager import LocalSessionManager, RedisSessionManager  # noqa: E402
+from vectorstore import LocalChromaDB, VectorStoreManager  # noqa: E402
+
+SESSION_ID = "bench-session"
+QUERIES = [
+    "What is the liability cap in the agreement?",
+    "When does the supplier have to report a security breach?",
+    "Which clause covers termination fees?",
+    "ID-4821",
+    "What are the service level availability terms?",
+]
+
+
+def percentiles(samples_ms):
+    samples = sorted(samples_ms)
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "samples": len(samples),
+    }
+
+
+def peak_rss_mb():
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # PDF conversion pools are joined when each call finishes, so their
+    # workers are counted here.
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {
+        "self_mb": round(self_kb / 1024, 1),
+        "pdf_workers_mb": round(children_kb / 1024, 1),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_ingestion(work_dir, args, vector_manager):
+    pdf_dir = work_dir / "pdfs"
+    pdf_dir.mkdir()
+    file_names = []
+    for i in range(args.files):
+        file_name = f"synthetic-{i}.pdf"
+        make_pdf(pdf_dir / file_name, args.pages, args.words_per_page, seed=i)
+        file_names.append(file_name)
+
+    processor = DocumentProcessor(
+        str(pdf_dir),
+        workers=args.workers,
+        markdown_cache=MarkdownCache(work_dir / "markdown_cache.sqlite3"),
+    )
+    start = time.perf_counter()
+    documents = {}
+    for file_name in file_names:
+        doc_id = processor.document_id(file_name)
+        vector_manager.attach_document(SESSION_ID, file_name, doc_id)
+        documents[file_name] = doc_id
+    chunks = vector_manager.add_chunk_stream(processor.iter_chunks(documents))
+    vector_manager.mark_documents_stored(SESSION_ID, documents.values())
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for file_name in file_names:
+        vector_manager.attach_document(
+            "bench-other-session", file_name, processor.document_id(file_name)
+        )
+    known_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rechunked = sum(1 for _ in processor.iter_chunks(documents))
+    rechunk_elapsed = time.perf_counter() - start
+    pages = args.files * args.pages
+    return {
+        "files": args.files,
+        "pages": pages,
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "pages_per_s": round(pages / elapsed, 2),
+        "chunks_per_s": round(chunks / elapsed, 2),
+        "known_document_ms": round(known_elapsed / args.files * 1000, 3),
+        "cached_markdown_chunks_per_s": round(rechunked / rechunk_elapsed, 2),
+        "embedding_writer": vector_manager.writer.stats(),
+    }
+
+
+def bench_retrieval(chatbot, repeats):
+    samples = []
+    for _ in range(repeats):
+        for query in QUERIES:
+            start = time.perf_counter()
+            chatbot.retrieve(query)
+            samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+
+async def _ttft(chatbot, query):
+    start = time.perf_counter()
+    ttft = None
+    async for _ in chatbot.chat_stream(query):
+        if ttft is None:
+            ttft = (time.perf_counter() - start) * 1000
+    return ttft
+
+
+def bench_ttft(chatbot, repeats, first_token_latency):
+    model = fake_stream_model(first_token_latency=first_token_latency)
+
+    async def run():
+        samples = []
+        with chatbot.agent.override(model=model):
+            for i in range(repeats):
+                for query in QUERIES:
+                    samples.append(await _ttft(chatbot, f"{query} #{i}"))
+        return samples
+
+    result = percentiles(asyncio.run(run()))
+    result["llm_first_token_latency_ms"] = first_token_latency * 1000
+    return result
+
+
+def bench_session_manager(manager, sessions):
+    timings = {
+        name: []
+        for name in (
+            "create_session",
+            "add_file_to_session",
+            "get_session_files",
+            "remove_session",
+        )
+    }
+
+    def timed(name, fn, *fn_args):
+        start = time.perf_counter()
+        fn(*fn_args)
+        timings[name].append((time.perf_counter() - start) * 1000)
+
+    session_ids = [manager.generate_session_id() for _ in range(sessions)]
+    for session_id in session_ids:
+        timed("create_session", manager.create_session, session_id)
+        for f in range(config.MAX_FILES_PER_SESSION):
+            timed(
+                "add_file_to_session",
+                manager.add_file_to_session,
+                session_id,
+                f"{f}.pdf",
+            )
+        timed("get_session_files", manager.get_session_files, session_id)
+    for session_id in session_ids:
+        timed("remove_session", manager.remove_session, session_id)
+    return {name: percentiles(samples) for name, samples in timings.items()}
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    def walk(current, previous, prefix=""):
+        for key, value in current.items():
+            if key not in previous:
+                continue
+            if isinstance(value, dict):
+                walk(value, previous[key], f"{prefix}{key}.")
+            elif isinstance(value, (int, float)) and previous[key]:
+                change = (value - previous[key]) / previous[key] * 100
+                print(
+                    f"{prefix}{key:<40} {previous[key]:>12} -> {value:>12} ({change:+.1f}%)"
+                )
+
+    print(f"\nCompared with {baseline_path} ({baseline.get('commit')}):")
+    walk(results["metrics"], baseline["metrics"])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Headless ingestion/chat benchmark with local fakes (no OpenAI, no services)."
+    )
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--workers", type=int, default=config.PDF_WORKERS)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--first-token-latency", type=float, default=0.1)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument(
+        "--embeddings",
+        choices=("fake", "hashing"),
+        default="fake",
+        help="Embedding model used for ingestion and retrieval.",
+    )
+    parser.add_argument(
+        "--redis-url", help="Use a real Redis instead of the fakeredis stand-in."
+    )
+    parser.add_argument("--output", help="Where to write the JSON results.")
+    parser.add_argument("--compare", help="Previous results JSON to diff against.")
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_run_"))
+    embeddings = (
+        HashingEmbeddings() if args.embeddings == "hashing" else fake_embeddings()
+    )
+    vectorstore = LocalChromaDB(work_dir / "chroma").get_vectorstore(embeddings)
+    lexical_index = LexicalIndexManager(work_dir / "lexical_index")
+    registry = LocalDocumentRegistry(work_dir / "documents.sqlite3")
+    vector_manager = VectorStoreManager(
+        vectorstore, lexical_index=lexical_index, document_registry=registry
+    )
+    chatbot = ChatBot(
+        vectorstore=vectorstore,
+        openai_api_key="sk-fake",
+        session_id=SESSION_ID,
+        lexical_index=lexical_index,
+        document_registry=registry,
+    )
+
+    metrics = {"ingestion": bench_ingestion(work_dir, args, vector_manager)}
+    metrics["retrieval"] = bench_retrieval(chatbot, args.repeats)
+    metrics["time_to_first_token"] = bench_ttft(
+        chatbot, max(args.repeats // 4, 1), args.first_token_latency
+    )
+    metrics["context"] = chatbot.context_builder.stats()
+    metrics["last_turn_prompt"] = chatbot.last_prompt_stats
+    metrics["session_manager"] = {
+        "local": bench_session_manager(
+            LocalSessionManager(work_dir / "sessions.sqlite3"), args.sessions
+        ),
+        "redis": bench_session_manager(
+            RedisSessionManager(redis_client=get_redis_client(args.redis_url)),
+            args.sessions,
+        ),
+    }
+    metrics["peak_rss"] = peak_rss_mb()
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "parameters": vars(args),
+        "metrics": metrics,
+    }
+    output = Path(
+        args.output
+        or ROOT / "benchmarks" / "results" / f"{results['commit'] or 'local'}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(json.dumps(metrics, indent=2))
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+import config
+
+
+def _normalize(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        threshold: float = config.ANSWER_CACHE_THRESHOLD,
+        ttl: float = config.ANSWER_CACHE_TTL,
+        max_entries_per_session: int = config.ANSWER_CACHE_MAX_ENTRIES,
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries_per_session = max_entries_per_session
+        self.lock = threading.Lock()
+        self.sessions: Dict[str, "OrderedDict[int, Tuple]"] = {}
+        self.next_entry_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(
+        self, session_id: str, document_set: Tuple[str, ...], embedding: Sequence[float]
+    ) -> Optional[str]:
+        query = _normalize(embedding)
+        now = time.monotonic()
+        with self.lock:
+            entries = self.sessions.get(session_id, OrderedDict())
+            best_id, best_score = None, self.threshold
+            for entry_id, (entry_documents, vector, _, created) in list(
+                entries.items()
+            ):
+                if now - created > self.ttl:
+                    del entries[entry_id]
+                    continue
+                if entry_documents != document_set:
+                    continue
+                score = sum(a * b for a, b in zip(query, vector))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            entries.move_to_end(best_id)
+            self.hits += 1
+            return entries[best_id][2]
+
+    def store(
+        self,
+        session_id: str,
+        document_set: Tuple[str, ...],
+        embedding: Sequence[float],
+        answer: str,
+    ):
+        with self.lock:
+            entries = self.sessions.setdefault(session_id, OrderedDict())
+            entries[self.next_entry_id] = (
+                document_set,
+                _normalize(embedding),
+                answer,
+                time.monotonic(),
+            )
+            self.next_entry_id += 1
+            while len(entries) > self.max_entries_per_session:
+                entries.popitem(last=False)
+
+    def invalidate_session(self, session_id: str):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": sum(len(entries) for entries in self.sessions.values()),
+        }
+
+
+_answer_cache: Optional[AnswerCache] = None
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    global _answer_cache
+    if not config.ANSWER_CACHE_ENABLED:
+        return None
+    if _answer_cache is None:
+        _answer_cache = AnswerCache()
+    return _answer_cache
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import logging
+from typing import Dict
+from aiohttp import web
+import config
+from garbage_collector import get_garbage_collector
+from metrics import start_metrics_server
+from session_manager import get_session_manager
+from uploads import file_states, queue_uploads
+
+logger = logging.getLogger("rag.api")
+routes = web.RouteTableDef()
+
+
+def _error(status, message: str) -> web.HTTPException:
+    return status(text=json.dumps({"error": message}), content_type="application/json")
+
+
+def _api_key(request: web.Request) -> str:
+    scheme, _, api_key = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not api_key:
+        raise _error(web.HTTPUnauthorized, "Missing 'Authorization: Bearer <key>'")
+    return api_key
+
+
+async def _session_id(request: web.Request) -> str:
+    session_id = request.match_info["session_id"]
+    if not await asyncio.to_thread(get_session_manager().is_valid_session, session_id):
+        raise _error(web.HTTPNotFound, f"Unknown session '{session_id}'")
+    return session_id
+
+
+def _sse(event: str, data: Dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+@routes.get("/health")
+async def health(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok"})
+
+
+@routes.post("/sessions")
+async def create_session(request: web.Request) -> web.Response:
+    session_manager = get_session_manager()
+    session_id = session_manager.generate_session_id()
+    removed = await asyncio.to_thread(session_manager.create_session, session_id)
+    if removed:
+        get_garbage_collector().schedule(removed)
+    return web.json_response({"session_id": session_id}, status=201)
+
+
+@routes.get("/sessions/{session_id}")
+async def get_session(request: web.Request) -> web.Response:
+    session_id = await _session_id(request)
+    session_manager = get_session_manager()
+    files = await asyncio.to_thread(session_manager.get_session_files, session_id)
+    return web.json_response(
+        {
+            "session_id": session_id,
+            "files": files,
+            "can_add_file": len(files) < config.MAX_FILES_PER_SESSION,
+        }
+    )
+
+
+@routes.delete("/sessions/{session_id}")
+async def delete_session(request: web.Request) -> web.Response:
+    session_id = await _session_id(request)
+    await asyncio.to_thread(get_session_manager().remove_session, session_id)
+    get_garbage_collector().schedule([session_id])
+    return web.Response(status=204)
+
+
+@routes.get("/sessions/{session_id}/files")
+async def list_files(request: web.Request) -> web.Response:
+    session_id = await _session_id(request)
+    return web.json_response(
+        {"files": await asyncio.to_thread(file_states, session_id)}
+    )
+
+
+@routes.post("/sessions/{session_id}/files")
+async def upload_files(request: web.Request) -> web.Response:
+    session_id = await _session_id(request)
+    api_key = _api_key(request)
+    uploads = {}
+    reader = await request.multipart()
+    async for part in reader:
+        if part.filename:
+            uploads[part.filename] = await part.read()
+    if not uploads:
+        raise _error(web.HTTPBadRequest, "No files in the multipart body")
+    result = await asyncio.to_thread(queue_uploads, session_id, uploads, api_key)
+    return web.json_response(result, status=202)
+
+
+@routes.delete("/sessions/{session_id}/files/{file_name}")
+async def delete_file(request: web.Request) -> web.Response:
+    from resources import get_vector_manager
+
+    session_id = await _session_id(request)
+    api_key = _api_key(request)
+    file_name = request.match_info["file_name"]
+
+    def remove():
+        get_vector_manager(api_key).remove_documents_by_session_and_file(
+            session_id, file_name
+        )
+        get_session_manager().remove_file_from_session(session_id, file_name)
+
+    await asyncio.to_thread(remove)
+    return web.Response(status=204)
+
+
+@routes.post("/sessions/{session_id}/chat")
+async def chat(request: web.Request) -> web.StreamResponse:
+    from conversation_memory import ConversationMemory
+    from resources import create_chatbot
+
+    session_id = await _session_id(request)
+    api_key = _api_key(request)
+    try:
+        body = await request.json()
+        question = body["question"]
+        memory = ConversationMemory.restore(
+            [tuple(turn) for turn in body.get("history", [])],
+            body.get("summary", []),
+        )
+    except (ValueError, KeyError, TypeError):
+        raise _error(
+            web.HTTPBadRequest,
+            "Expected {'question': str, 'history': [[question, answer], ...], "
+            "'summary': [str, ...]}",
+        )
+    chatbot = await asyncio.to_thread(create_chatbot, api_key, session_id, memory)
+
+    response = web.StreamResponse(
+        headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+    )
+    await response.prepare(request)
+    answer = []
+    stream = chatbot.chat_stream(question)
+    try:
+        async for text in stream:
+            answer.append(text)
+            await response.write(_sse("token", {"text": text}))
+        await response.write(
+            _sse(
+                "done",
+                {"answer": "".join(answer), "prompt": chatbot.last_prompt_stats},
+            )
+        )
+    except ConnectionResetError:
+        return response
+    except Exception as e:
+        logger.exception("Chat in session %s failed", session_id)
+        await response.write(_sse("error", {"error": str(e)}))
+    finally:
+        await stream.aclose()
+    await response.write_eof()
+    return response
+
+
+def create_app() -> web.Application:
+    app = web.Application(client_max_size=config.API_MAX_UPLOAD_BYTES)
+    app.add_routes(routes)
+    return app
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    start_metrics_server()
+    get_garbage_collector().start()
+    web.run_app(create_app(), host=config.API_HOST, port=config.API_PORT)
+
+
+if __name__ == "__main__":
+    main()
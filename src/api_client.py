@@ -0,0 +1,128 @@
+import json
+from typing import Dict, Mapping, Optional
+from urllib.parse import quote
+import httpx
+import config
+from conversation_memory import ConversationMemory
+
+
+def _headers(openai_api_key: Optional[str]) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {openai_api_key}"} if openai_api_key else {}
+
+
+class ApiClient:
+    """Client for the HTTP API in ``api.py``, used by the Streamlit UI when
+    ``API_URL`` is set."""
+
+    def __init__(
+        self, base_url: str = config.API_URL, timeout: float = config.API_TIMEOUT
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.client = httpx.Client(base_url=self.base_url, timeout=timeout)
+
+    def create_session(self) -> str:
+        response = self.client.post("/sessions")
+        response.raise_for_status()
+        return response.json()["session_id"]
+
+    def get_session(self, session_id: str) -> Optional[Dict]:
+        """The session's files and whether another fits, or ``None`` once it
+        has expired or been evicted. Looking it up keeps it alive."""
+        response = self.client.get(f"/sessions/{session_id}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def file_states(self, session_id: str) -> Dict[str, Dict]:
+        response = self.client.get(f"/sessions/{session_id}/files")
+        response.raise_for_status()
+        return response.json()["files"]
+
+    def upload(
+        self, session_id: str, files: Mapping[str, bytes], openai_api_key: str
+    ) -> Dict:
+        response = self.client.post(
+            f"/sessions/{session_id}/files",
+            files=[
+                ("files", (file_name, data, "application/pdf"))
+                for file_name, data in files.items()
+            ],
+            headers=_headers(openai_api_key),
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def delete_file(self, session_id: str, file_name: str, openai_api_key: str):
+        response = self.client.delete(
+            f"/sessions/{session_id}/files/{quote(file_name, safe='')}",
+            headers=_headers(openai_api_key),
+        )
+        response.raise_for_status()
+
+    async def chat_events(self, session_id: str, openai_api_key: str, payload: Dict):
+        # Streamlit drives each stream on a fresh event loop, so the async
+        # client can't be kept across calls.
+        async with httpx.AsyncClient(
+            base_url=self.base_url, timeout=self.timeout
+        ) as client:
+            async with client.stream(
+                "POST",
+                f"/sessions/{session_id}/chat",
+                json=payload,
+                headers=_headers(openai_api_key),
+            ) as response:
+                response.raise_for_status()
+                event = "message"
+                async for line in response.aiter_lines():
+                    if line.startswith("event:"):
+                        event = line[len("event:") :].strip()
+                    elif line.startswith("data:"):
+                        yield event, json.loads(line[len("data:") :])
+                        event = "message"
+
+
+class RemoteChatBot:
+    """Stands in for ``ChatBot`` in the UI; the API is stateless, so the
+    conversation memory stays here and is sent along with every question."""
+
+    def __init__(
+        self,
+        client: ApiClient,
+        session_id: str,
+        openai_api_key: str,
+        memory: Optional[ConversationMemory] = None,
+    ):
+        self.client = client
+        self.session_id = session_id
+        self.openai_api_key = openai_api_key
+        self.memory = memory if memory is not None else ConversationMemory()
+        self.last_prompt_stats = {}
+
+    async def chat_stream(self, query: str):
+        payload = {
+            "question": query,
+            "history": self.memory.history(),
+            "summary": list(self.memory.summary_lines),
+        }
+        async for event, data in self.client.chat_events(
+            self.session_id, self.openai_api_key, payload
+        ):
+            if event == "token":
+                yield data["text"]
+            elif event == "done":
+                self.last_prompt_stats = data["prompt"]
+                self.memory.add_turn(query, data["answer"])
+            elif event == "error":
+                raise RuntimeError(data["error"])
+
+
+_api_client = None
+
+
+def get_api_client():
+    global _api_client
+    if _api_client is None:
+        _api_client = ApiClient()
+    return _api_client
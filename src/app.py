@@ -1,26 +1,33 @@
 import os
 import sys
 import streamlit as st
-from services.session_service import SessionService
-from services.auth_service import AuthService
-from services.file_service import FileService
+import config
+from services.session_service import get_session_service
+from services.auth_service import get_auth_service
+from services.file_service import get_file_service
 from ui.sidebar import SidebarComponent
 from ui.chat import ChatComponent
 from utils.state_manager import StateManager
+from metrics import start_metrics_server
+from garbage_collector import get_garbage_collector
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
 def main():
+    start_metrics_server()
+    # A thin client only talks to the API, which collects its own garbage.
+    if not config.API_URL:
+        get_garbage_collector().start()
     st.set_page_config(
         page_title="Chat with PDF", page_icon="📄", initial_sidebar_state="expanded"
     )
     st.title("Chat with PDF RAG 🤖📄")
 
-    session_service = SessionService()
-    auth_service = AuthService()
+    session_service = get_session_service()
+    auth_service = get_auth_service()
     state_manager = StateManager()
-    file_service = FileService(session_service)
+    file_service = get_file_service()
 
     sidebar_component = SidebarComponent(session_service, file_service)
     chat_component = ChatComponent(state_manager)
@@ -41,11 +48,15 @@ def main():
             uploaded_files, openai_api_key
         )
         if files_processed:
-            chatbot = file_service.create_chatbot(openai_api_key)
+            chatbot = file_service.create_chatbot(
+                openai_api_key, state_manager.get_conversation_memory()
+            )
             state_manager.set_chatbot(chatbot)
 
     if not state_manager.get_chatbot():
-        chatbot = file_service.create_chatbot(openai_api_key)
+        chatbot = file_service.create_chatbot(
+            openai_api_key, state_manager.get_conversation_memory()
+        )
         state_manager.set_chatbot(chatbot)
 
     prompt = chat_component.render_chat_interface()
@@ -1,39 +1,290 @@
+import asyncio
+import re
+import time
 import config
+import metrics
 from pydantic_ai import Agent
+from pydantic_ai.messages import (
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    UserPromptPart,
+)
 from pydantic_ai.models.openai import OpenAIChatModel
 from pydantic_ai.providers.openai import OpenAIProvider
-from prompts import SYSTEM_PROMPT, AUGMENTED_PROMPT
+from langchain_core.documents import Document
+from prompts import SYSTEM_PROMPT, CONTEXT_PROMPT, SUMMARY_PROMPT
+from context_builder import ContextBuilder
+from conversation_memory import ConversationMemory
+from embedding_writer import estimate_tokens
+from lexical_index import reciprocal_rank_fusion
+from utils.resource_pool import shared_pool
+
+
+def _create_agent(openai_api_key) -> Agent:
+    provider = OpenAIProvider(api_key=openai_api_key, base_url=config.OPENAI_BASE_URL)
+    model = OpenAIChatModel(config.LLM_MODEL, provider=provider)
+    # SYSTEM_PROMPT is sent as the first message of every prompt (see
+    # _format_prompt) rather than as agent instructions, which the OpenAI
+    # model would place after the history's system messages.
+    return Agent(model)
 
 
 class ChatBot:
-    def __init__(self, vectorstore, openai_api_key, session_id):
+    def __init__(
+        self,
+        vectorstore,
+        openai_api_key,
+        session_id,
+        lexical_index=None,
+        answer_cache=None,
+        document_registry=None,
+        context_builder=None,
+        memory=None,
+    ):
         self.vectorstore = vectorstore
         self.session_id = session_id
-        provider = OpenAIProvider(api_key=openai_api_key)
-        model = OpenAIChatModel(config.LLM_MODEL, provider=provider)
-        self.agent = Agent(
-            model,
-            instructions=SYSTEM_PROMPT,
+        self.lexical_index = lexical_index
+        self.answer_cache = answer_cache
+        self.document_registry = document_registry
+        self.context_builder = context_builder or ContextBuilder()
+        self.memory = memory if memory is not None else ConversationMemory()
+        self.last_prompt_stats = {}
+        # The agent holds no conversation state, so chatbots with the same
+        # key share it and its HTTP connection pool.
+        self.agent = shared_pool.get(
+            ("chat_agent", openai_api_key), lambda: _create_agent(openai_api_key)
+        )
+
+    def _document_ids(self):
+        if self.document_registry is None:
+            return ()
+        documents = self.document_registry.get_session_documents(self.session_id)
+        return tuple(sorted(set(documents.values())))
+
+    def embed_query(self, query: str):
+        return self.vectorstore.embeddings.embed_query(query)
+
+    def _vector_search(self, query_embedding, doc_ids):
+        # Chunks written before the document registry are only tagged with
+        # the session id, so they are matched on that as well.
+        matches = self.vectorstore.query(
+            query_embedding,
+            config.RETRIEVAL_FETCH_K,
+            doc_ids=doc_ids,
+            where={"session_id": self.session_id},
+        )
+        documents = [
+            Document(
+                id=match["id"],
+                page_content=match["document"],
+                metadata=match["metadata"],
+            )
+            for match in matches
+        ]
+        return documents, {match["id"]: match["embedding"] for match in matches}
+
+    def _select_context(self, query_embedding, candidates, embeddings):
+        missing = [doc.id for doc in candidates if doc.id not in embeddings]
+        if missing:
+            embeddings.update(self.vectorstore.get_embeddings(missing))
+        return self.context_builder.select(
+            query_embedding,
+            candidates,
+            [embeddings.get(doc.id) for doc in candidates],
+        )
+
+    def retrieve(self, query: str, query_embedding=None, doc_ids=None):
+        if doc_ids is None:
+            doc_ids = self._document_ids()
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
+        candidates, embeddings = self._vector_search(query_embedding, doc_ids)
+        if self.lexical_index is not None:
+            lexical_results = self.lexical_index.search(
+                doc_ids, query, k=config.RETRIEVAL_FETCH_K
+            )
+            candidates = reciprocal_rank_fusion(
+                [candidates, lexical_results], k=config.RETRIEVAL_FETCH_K
+            )
+        return self._select_context(query_embedding, candidates, embeddings)
+
+    async def aembed_query(self, query: str):
+        return await self.vectorstore.embeddings.aembed_query(query)
+
+    def _start_lexical_search(self, query: str, doc_ids):
+        if self.lexical_index is None:
+            return None
+        return asyncio.create_task(
+            asyncio.to_thread(
+                self.lexical_index.search,
+                doc_ids,
+                query,
+                config.RETRIEVAL_FETCH_K,
+            )
+        )
+
+    async def aretrieve(
+        self, query: str, query_embedding=None, lexical_task=None, doc_ids=None
+    ):
+        if doc_ids is None:
+            doc_ids = await asyncio.to_thread(self._document_ids)
+        if lexical_task is None:
+            lexical_task = self._start_lexical_search(query, doc_ids)
+        if query_embedding is None:
+            query_embedding = await self.aembed_query(query)
+        candidates, embeddings = await asyncio.to_thread(
+            self._vector_search, query_embedding, doc_ids
+        )
+        if lexical_task is not None:
+            candidates = reciprocal_rank_fusion(
+                [candidates, await lexical_task], k=config.RETRIEVAL_FETCH_K
+            )
+        return await asyncio.to_thread(
+            self._select_context, query_embedding, candidates, embeddings
         )
 
-    def augment_prompt(self, query: str) -> str:
-        context = self.vectorstore.similarity_search(
-            query, k=3, filter={"session_id": self.session_id}
+    def _format_prompt(self, query: str, context, tags):
+        # Stable parts go first (instructions, document context, summary,
+        # then recent turns) so that follow-up questions retrieving the same
+        # chunks share a prefix the provider can serve from its prompt cache.
+        system_parts = [SystemPromptPart(content=SYSTEM_PROMPT)]
+        if context:
+            context, stats = self.context_builder.format(context)
+            tags.update(stats)
+            system_parts.append(
+                SystemPromptPart(content=CONTEXT_PROMPT.format(context=context))
+            )
+        if self.memory.summary_lines:
+            system_parts.append(
+                SystemPromptPart(
+                    content=SUMMARY_PROMPT.format(summary=self.memory.summary)
+                )
+            )
+        message_history = [ModelRequest(parts=system_parts)]
+        for question, answer in self.memory.history():
+            message_history.append(
+                ModelRequest(parts=[UserPromptPart(content=question)])
+            )
+            message_history.append(ModelResponse(parts=[TextPart(content=answer)]))
+
+        tags.update(self.memory.token_counts())
+        tags["prompt_tokens"] = (
+            sum(estimate_tokens(part.content) for part in system_parts)
+            + tags["history_tokens"]
+            + estimate_tokens(query)
         )
+        metrics.registry.inc("rag_prompt_tokens_total", tags["prompt_tokens"])
+        self.last_prompt_stats = {
+            key: tags.get(key, 0)
+            for key in (
+                "prompt_tokens",
+                "context_tokens",
+                "history_tokens",
+                "summary_tokens",
+            )
+        }
+        return message_history, query
+
+    def _record_usage(self, result):
+        # usage is a method in pydantic-ai 1.x (the locked version) and a
+        # property in later releases.
+        usage = result.usage
+        if callable(usage):
+            usage = usage()
+        self.last_prompt_stats["input_tokens"] = usage.input_tokens
+        self.last_prompt_stats["cache_read_tokens"] = usage.cache_read_tokens
+        if usage.cache_read_tokens:
+            metrics.registry.inc(
+                "rag_prompt_cached_tokens_total", usage.cache_read_tokens
+            )
 
-        if not context:
-            return query
+    def augment_prompt(self, query: str, query_embedding=None, doc_ids=None):
+        with metrics.timed("augment_prompt", session_id=self.session_id) as tags:
+            context = self.retrieve(query, query_embedding, doc_ids)
+            return self._format_prompt(query, context, tags)
+
+    async def aaugment_prompt(
+        self, query: str, query_embedding=None, lexical_task=None, doc_ids=None
+    ):
+        with metrics.timed("augment_prompt", session_id=self.session_id) as tags:
+            context = await self.aretrieve(
+                query, query_embedding, lexical_task, doc_ids
+            )
+            return self._format_prompt(query, context, tags)
+
+    def _uses_answer_cache(self) -> bool:
+        # The cache is keyed on the question alone, so an answer that may
+        # build on earlier turns is neither served from it nor stored in it.
+        return (
+            self.answer_cache is not None
+            and not self.memory.turns
+            and not self.memory.summary_lines
+        )
 
-        context = "\n".join([doc.page_content for doc in context])
-        return AUGMENTED_PROMPT.format(query=query, context=context)
+    def _cached_answer(self, query_embedding, doc_ids):
+        if not self._uses_answer_cache():
+            return None
+        return self.answer_cache.lookup(self.session_id, doc_ids, query_embedding)
+
+    def _store_answer(self, query_embedding, doc_ids, answer: str):
+        if self._uses_answer_cache() and answer:
+            self.answer_cache.store(self.session_id, doc_ids, query_embedding, answer)
 
     def chat(self, query: str) -> str:
-        augmented_query = self.augment_prompt(query)
-        augmented_response = self.agent.run_sync(augmented_query)
+        doc_ids = self._document_ids()
+        query_embedding = self.embed_query(query)
+        cached_answer = self._cached_answer(query_embedding, doc_ids)
+        if cached_answer is not None:
+            self.memory.add_turn(query, cached_answer)
+            return cached_answer
+        message_history, prompt = self.augment_prompt(query, query_embedding, doc_ids)
+        augmented_response = self.agent.run_sync(
+            prompt, message_history=message_history
+        )
+        self._record_usage(augmented_response)
+        self._store_answer(query_embedding, doc_ids, augmented_response.output)
+        self.memory.add_turn(query, augmented_response.output)
         return augmented_response.output
 
     async def chat_stream(self, query: str):
-        augmented_query = self.augment_prompt(query)
-        async with self.agent.run_stream(augmented_query) as result:
-            async for text in result.stream_text(delta=True):
+        start = time.perf_counter()
+        first_token = None
+        async for text in self._chat_stream(query):
+            if first_token is None:
+                first_token = time.perf_counter() - start
+                metrics.record(
+                    "chat_time_to_first_token", first_token, session_id=self.session_id
+                )
+            yield text
+        metrics.record(
+            "chat_stream", time.perf_counter() - start, session_id=self.session_id
+        )
+
+    async def _chat_stream(self, query: str):
+        doc_ids = await asyncio.to_thread(self._document_ids)
+        lexical_task = self._start_lexical_search(query, doc_ids)
+        query_embedding = await self.aembed_query(query)
+        cached_answer = self._cached_answer(query_embedding, doc_ids)
+        if cached_answer is not None:
+            if lexical_task is not None:
+                lexical_task.cancel()
+            self.memory.add_turn(query, cached_answer)
+            for text in re.findall(r"\s*\S+", cached_answer):
+                yield text
+            return
+        message_history, prompt = await self.aaugment_prompt(
+            query, query_embedding, lexical_task, doc_ids
+        )
+        answer = []
+        async with self.agent.run_stream(
+            prompt, message_history=message_history
+        ) as result:
+            async for text in result.stream_text(delta=True, debounce_by=None):
+                answer.append(text)
                 yield text
+            self._record_usage(result)
+        answer = "".join(answer)
+        self._store_answer(query_embedding, doc_ids, answer)
+        self.memory.add_turn(query, answer)
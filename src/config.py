@@ -4,19 +4,104 @@ from pathlib import Path
 
 load_dotenv()
 
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai").lower()
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+HASHING_EMBEDDING_DIM = int(os.getenv("HASHING_EMBEDDING_DIM", "1024"))
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", "")
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4-turbo")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
 
 DATA_DIR = Path(__file__).parent.parent / "data"
 
 CHROMA_DB_PATH = DATA_DIR / "chroma_db"
 SESSIONS_JSON = DATA_DIR / "sessions.json"
+SESSIONS_DB = DATA_DIR / "sessions.sqlite3"
+DOCUMENTS_DB = DATA_DIR / "documents.sqlite3"
+EMBEDDING_CACHE_PATH = DATA_DIR / "embedding_cache.sqlite3"
+LEXICAL_INDEX_DIR = DATA_DIR / "lexical_index"
+MARKDOWN_CACHE_PATH = DATA_DIR / "markdown_cache.sqlite3"
+UPLOADS_DIR = DATA_DIR / "uploads"
+NUMPY_VECTORS_PATH = DATA_DIR / "numpy_vectors"
 
 CHUNK_SIZE = 800
 CHUNK_OVERLAP = 80
 
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+PDF_CONVERSION_TIMEOUT = float(os.getenv("PDF_CONVERSION_TIMEOUT", "300"))
+
+VECTORSTORE_BATCH_SIZE = int(os.getenv("VECTORSTORE_BATCH_SIZE", "1000"))
+# 0 gives every document its own collection; N > 0 hashes documents into N.
+VECTOR_SHARDS = int(os.getenv("VECTOR_SHARDS", "0"))
+# "chroma" or "numpy" (memory-mapped files under NUMPY_VECTORS_PATH, shared
+# by every process on the host); NUMPY_VECTOR_DTYPE is float32, float16 or int8.
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma").lower()
+NUMPY_VECTOR_DTYPE = os.getenv("NUMPY_VECTOR_DTYPE", "int8")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "16000"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "8"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+EMBEDDING_TARGET_LATENCY = float(os.getenv("EMBEDDING_TARGET_LATENCY", "10"))
+
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+MARKDOWN_CACHE_MAX_BYTES = int(
+    os.getenv("MARKDOWN_CACHE_MAX_BYTES", str(512 * 1024 * 1024))
+)
+MARKDOWN_CACHE_MAX_DOCUMENT_CHARS = int(
+    os.getenv("MARKDOWN_CACHE_MAX_DOCUMENT_CHARS", str(32 * 1024 * 1024))
+)
+
+RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", "20"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+MEMORY_WINDOW_TOKENS = int(os.getenv("MEMORY_WINDOW_TOKENS", "1000"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "300"))
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "100"))
+
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "1"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "300"))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", str(24 * 3600)))
+# The API key a job embeds with is kept apart from the job and only this long.
+JOB_API_KEY_TTL_SECONDS = int(os.getenv("JOB_API_KEY_TTL_SECONDS", "3600"))
+# A document whose chunks are still being deleted after this long is taken
+# to have lost its deleter, so it can be ingested again.
+DOCUMENT_DELETE_TIMEOUT_SECONDS = float(
+    os.getenv("DOCUMENT_DELETE_TIMEOUT_SECONDS", "300")
+)
+UPLOAD_IN_MEMORY_MAX_BYTES = int(
+    os.getenv("UPLOAD_IN_MEMORY_MAX_BYTES", str(32 * 1024 * 1024))
+)
+
+GC_INTERVAL_SECONDS = float(os.getenv("GC_INTERVAL_SECONDS", "60"))
+GC_BATCH_SIZE = int(os.getenv("GC_BATCH_SIZE", "20"))
+# Expiry of the cross-process GC lock, in case its holder dies mid-pass.
+GC_LOCK_SECONDS = int(os.getenv("GC_LOCK_SECONDS", "600"))
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8080"))
+API_MAX_UPLOAD_BYTES = int(os.getenv("API_MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+# When set, the Streamlit UI uploads and chats through this API instead of
+# running ingestion and retrieval itself.
+API_URL = os.getenv("API_URL")
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "300"))
+
+# Loopback by default; containers that expose the port set METRICS_HOST=0.0.0.0.
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+METRICS_LOG = os.getenv("METRICS_LOG", "false").lower() == "true"
+
+RESOURCE_IDLE_TTL = float(os.getenv("RESOURCE_IDLE_TTL", "1800"))
+
 MAX_SESSIONS = 5
 MAX_FILES_PER_SESSION = 3
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
 
 APP_ENV = os.getenv("APP_ENV", "development")
 
@@ -0,0 +1,172 @@
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain_core.documents import Document
+import config
+import metrics
+from embedding_writer import estimate_tokens
+
+# Shorter suffix/prefix matches are coincidental ("." or a single word), not
+# the splitter's chunk overlap.
+MIN_OVERLAP = 16
+
+
+def _chunk_position(doc: Document) -> Optional[Tuple[str, int]]:
+    doc_id = doc.metadata.get("doc_id")
+    chunk_index = doc.metadata.get("chunk_index")
+    if chunk_index is None and doc.id and ":" in doc.id:
+        doc_id, _, index = doc.id.rpartition(":")
+        chunk_index = int(index) if index.isdigit() else None
+    if doc_id is None or chunk_index is None:
+        return None
+    return doc_id, int(chunk_index)
+
+
+def merge_overlap(left: str, right: str, max_overlap: int) -> str:
+    for size in range(min(len(left), len(right), max_overlap), MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return f"{left}\n{right}"
+
+
+def mmr_order(
+    query_embedding: Sequence[float],
+    embeddings: Sequence[Sequence[float]],
+    mmr_lambda: float,
+) -> List[int]:
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / (np.linalg.norm(query) + 1e-12)
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+
+    remaining = np.ones(len(vectors), dtype=bool)
+    max_similarity = None
+    selected = int(np.argmax(relevance))
+    order = []
+    while True:
+        order.append(selected)
+        remaining[selected] = False
+        if not remaining.any():
+            return order
+        if max_similarity is None:
+            max_similarity = similarity[selected].copy()
+        else:
+            np.maximum(max_similarity, similarity[selected], out=max_similarity)
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * max_similarity
+        scores[~remaining] = -np.inf
+        selected = int(np.argmax(scores))
+
+
+class ContextBuilder:
+    """Turns retrieval candidates into the prompt context.
+
+    Candidates are ranked with MMR so near-duplicates don't crowd out other
+    evidence, then taken while they fit ``token_budget``. Adjacent chunks of
+    the same document are merged, so their overlap is only sent once.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = config.CONTEXT_TOKEN_BUDGET,
+        mmr_lambda: float = config.MMR_LAMBDA,
+        max_overlap: int = 2 * config.CHUNK_OVERLAP,
+    ):
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.max_overlap = max_overlap
+        self.lock = threading.Lock()
+        self.counters = {
+            "contexts": 0,
+            "chunks": 0,
+            "naive_tokens": 0,
+            "context_tokens": 0,
+        }
+
+    def _merge(self, documents: Sequence[Document]) -> List[str]:
+        runs: List[Tuple[int, List[str]]] = []
+        positioned = []
+        for rank, doc in enumerate(documents):
+            position = _chunk_position(doc)
+            if position is None:
+                runs.append((rank, [doc.page_content]))
+            else:
+                positioned.append((position, rank, doc.page_content))
+
+        previous = None
+        for position, rank, text in sorted(positioned):
+            if position == previous:
+                continue
+            if previous and position == (previous[0], previous[1] + 1):
+                best_rank, texts = runs.pop()
+                runs.append((min(best_rank, rank), texts + [text]))
+            else:
+                runs.append((rank, [text]))
+            previous = position
+
+        merged = []
+        for _, texts in sorted(runs, key=lambda run: run[0]):
+            text = texts[0]
+            for following in texts[1:]:
+                text = merge_overlap(text, following, self.max_overlap)
+            merged.append(text)
+        return merged
+
+    def _tokens(self, documents: Sequence[Document]) -> int:
+        return estimate_tokens("\n".join(self._merge(documents)))
+
+    def select(
+        self,
+        query_embedding: Sequence[float],
+        candidates: Sequence[Document],
+        embeddings: Sequence[Optional[Sequence[float]]],
+    ) -> List[Document]:
+        candidates = [
+            (doc, embedding)
+            for doc, embedding in zip(candidates, embeddings)
+            if embedding is not None
+        ]
+        if not candidates:
+            return []
+        order = mmr_order(
+            query_embedding,
+            [embedding for _, embedding in candidates],
+            self.mmr_lambda,
+        )
+        selected: List[Document] = []
+        for index in order:
+            trial = selected + [candidates[index][0]]
+            if not selected or self._tokens(trial) <= self.token_budget:
+                selected = trial
+        return selected
+
+    def format(self, documents: Sequence[Document]) -> Tuple[str, Dict[str, int]]:
+        context = "\n".join(self._merge(documents))
+        stats = {
+            "chunk_count": len(documents),
+            "naive_tokens": estimate_tokens(
+                "\n".join(doc.page_content for doc in documents)
+            ),
+            "context_tokens": estimate_tokens(context),
+        }
+        stats["saved_tokens"] = max(stats["naive_tokens"] - stats["context_tokens"], 0)
+        with self.lock:
+            self.counters["contexts"] += 1
+            self.counters["chunks"] += stats["chunk_count"]
+            self.counters["naive_tokens"] += stats["naive_tokens"]
+            self.counters["context_tokens"] += stats["context_tokens"]
+        metrics.registry.inc("rag_context_tokens_total", stats["context_tokens"])
+        metrics.registry.inc("rag_context_tokens_saved_total", stats["saved_tokens"])
+        return context, stats
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            counters = dict(self.counters)
+        counters["saved_tokens"] = counters["naive_tokens"] - counters["context_tokens"]
+        counters["saved_ratio"] = (
+            round(counters["saved_tokens"] / counters["naive_tokens"], 4)
+            if counters["naive_tokens"]
+            else 0.0
+        )
+        return counters
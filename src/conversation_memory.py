@@ -0,0 +1,80 @@
+import re
+from collections import deque
+from typing import Deque, Dict, List, Sequence, Tuple
+import config
+from embedding_writer import estimate_tokens
+
+SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s")
+
+
+def _summary_line(question: str, answer: str, max_chars: int = 200) -> str:
+    answer = SENTENCE_END.split(answer.strip(), maxsplit=1)[0]
+    if len(answer) > max_chars:
+        answer = answer[:max_chars].rstrip() + "…"
+    return f"- Q: {question.strip()} A: {answer}"
+
+
+class ConversationMemory:
+    """Recent turns verbatim plus a summary of the older ones, both bounded.
+
+    When the window outgrows ``window_tokens`` the oldest turns are folded
+    into the summary until it is back under half the budget, so the
+    summary (which sits early in the prompt) changes every few turns
+    rather than on each one. Summary lines past ``summary_tokens`` are
+    dropped oldest first.
+    """
+
+    def __init__(
+        self,
+        window_tokens: int = config.MEMORY_WINDOW_TOKENS,
+        summary_tokens: int = config.MEMORY_SUMMARY_TOKENS,
+    ):
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.turns: Deque[Tuple[str, str]] = deque()
+        self.summary_lines: Deque[str] = deque()
+        self._turn_tokens: Deque[int] = deque()
+
+    @classmethod
+    def restore(
+        cls, history: Sequence[Tuple[str, str]], summary_lines: Sequence[str] = ()
+    ) -> "ConversationMemory":
+        memory = cls()
+        memory.summary_lines.extend(summary_lines)
+        for question, answer in history:
+            memory.add_turn(question, answer)
+        return memory
+
+    @property
+    def summary(self) -> str:
+        return "\n".join(self.summary_lines)
+
+    def add_turn(self, question: str, answer: str):
+        self.turns.append((question, answer))
+        self._turn_tokens.append(estimate_tokens(question) + estimate_tokens(answer))
+        if sum(self._turn_tokens) <= self.window_tokens:
+            return
+        while self.turns and sum(self._turn_tokens) > self.window_tokens // 2:
+            self._turn_tokens.popleft()
+            self.summary_lines.append(_summary_line(*self.turns.popleft()))
+        while (
+            len(self.summary_lines) > 1
+            and estimate_tokens(self.summary) > self.summary_tokens
+        ):
+            self.summary_lines.popleft()
+
+    def clear(self):
+        self.turns.clear()
+        self.summary_lines.clear()
+        self._turn_tokens.clear()
+
+    def token_counts(self) -> Dict[str, int]:
+        return {
+            "history_tokens": sum(self._turn_tokens),
+            "summary_tokens": (
+                estimate_tokens(self.summary) if self.summary_lines else 0
+            ),
+        }
+
+    def history(self) -> List[Tuple[str, str]]:
+        return list(self.turns)
@@ -0,0 +1,363 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+import config
+import redis
+from factories import DocumentRegistryInterface
+
+
+class LocalDocumentRegistry(DocumentRegistryInterface):
+    def __init__(self, db_path=config.DOCUMENTS_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "doc_id TEXT PRIMARY KEY, stored INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS document_refs ("
+                "session_id TEXT NOT NULL, file_name TEXT NOT NULL, "
+                "doc_id TEXT NOT NULL, PRIMARY KEY (session_id, file_name))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS document_refs_doc_id ON document_refs (doc_id)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+            if "deleting" not in columns:
+                conn.execute("ALTER TABLE documents ADD COLUMN deleting REAL")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _is_referenced(self, conn: sqlite3.Connection, doc_id: str) -> bool:
+        return bool(
+            conn.execute(
+                "SELECT 1 FROM document_refs WHERE doc_id = ? LIMIT 1", (doc_id,)
+            ).fetchone()
+        )
+
+    def _orphan_if_unreferenced(self, conn: sqlite3.Connection, doc_id: str) -> bool:
+        """Mark an unreferenced document as being deleted. Returns whether the
+        caller now owns deleting its chunks (no live deletion is running)."""
+        if self._is_referenced(conn, doc_id):
+            return False
+        now = time.time()
+        return (
+            conn.execute(
+                "INSERT INTO documents (doc_id, stored, deleting) VALUES (?, 0, ?) "
+                "ON CONFLICT (doc_id) DO UPDATE "
+                "SET stored = 0, deleting = excluded.deleting "
+                "WHERE deleting IS NULL OR deleting < ?",
+                (doc_id, now, now - config.DOCUMENT_DELETE_TIMEOUT_SECONDS),
+            ).rowcount
+            > 0
+        )
+
+    def add_reference(self, session_id: str, file_name: str, doc_id: str) -> bool:
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO documents (doc_id) VALUES (?)", (doc_id,)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO document_refs (session_id, file_name, doc_id) "
+                "VALUES (?, ?, ?)",
+                (session_id, file_name, doc_id),
+            )
+            (stored,) = conn.execute(
+                "SELECT stored FROM documents WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+            return bool(stored)
+
+    def mark_stored(self, doc_id: str):
+        with self._transaction() as conn:
+            conn.execute("UPDATE documents SET stored = 1 WHERE doc_id = ?", (doc_id,))
+
+    def get_session_documents(self, session_id: str) -> Dict[str, str]:
+        rows = self._connection().execute(
+            "SELECT r.file_name, r.doc_id FROM document_refs r "
+            "JOIN documents d ON d.doc_id = r.doc_id "
+            "WHERE r.session_id = ? AND d.stored = 1",
+            (session_id,),
+        )
+        return dict(rows)
+
+    def get_references(self) -> List[Tuple[str, str, str]]:
+        return self._connection().execute(
+            "SELECT session_id, file_name, doc_id FROM document_refs"
+        ).fetchall()
+
+    def remove_reference(self, session_id: str, file_name: str) -> Optional[str]:
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT doc_id FROM document_refs WHERE session_id = ? AND file_name = ?",
+                (session_id, file_name),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "DELETE FROM document_refs WHERE session_id = ? AND file_name = ?",
+                (session_id, file_name),
+            )
+            return row[0] if self._orphan_if_unreferenced(conn, row[0]) else None
+
+    def remove_session(self, session_id: str) -> List[str]:
+        with self._transaction() as conn:
+            doc_ids = {
+                doc_id
+                for (doc_id,) in conn.execute(
+                    "SELECT doc_id FROM document_refs WHERE session_id = ?",
+                    (session_id,),
+                )
+            }
+            conn.execute(
+                "DELETE FROM document_refs WHERE session_id = ?", (session_id,)
+            )
+            return [
+                doc_id
+                for doc_id in doc_ids
+                if self._orphan_if_unreferenced(conn, doc_id)
+            ]
+
+    def remove_document(self, doc_id: str) -> bool:
+        with self._transaction() as conn:
+            return self._orphan_if_unreferenced(conn, doc_id)
+
+    def is_deleting(self, doc_id: str) -> bool:
+        stale_before = time.time() - config.DOCUMENT_DELETE_TIMEOUT_SECONDS
+        return bool(
+            self._connection()
+            .execute(
+                "SELECT 1 FROM documents WHERE doc_id = ? AND deleting >= ?",
+                (doc_id, stale_before),
+            )
+            .fetchone()
+        )
+
+    def finish_deletion(self, doc_id: str):
+        with self._transaction() as conn:
+            if self._is_referenced(conn, doc_id):
+                conn.execute(
+                    "UPDATE documents SET deleting = NULL WHERE doc_id = ?", (doc_id,)
+                )
+            else:
+                conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+
+
+ADD_REFERENCE_SCRIPT = """
+local session_key = KEYS[1]
+local stored_key = KEYS[2]
+local file_name = ARGV[1]
+local doc_id = ARGV[2]
+local refs_prefix = ARGV[3]
+local member = ARGV[4]
+local previous = redis.call("HGET", session_key, file_name)
+if previous and previous ~= doc_id then
+    redis.call("SREM", refs_prefix .. previous, member)
+end
+redis.call("HSET", session_key, file_name, doc_id)
+redis.call("SADD", refs_prefix .. doc_id, member)
+return redis.call("SISMEMBER", stored_key, doc_id)
+"""
+
+# Orphaned documents are marked in the deleting hash with the time their
+# deletion started; only the caller that set the mark deletes the chunks.
+ORPHAN_DOCUMENT = """
+local function orphan(stored_key, deleting_key, doc_id, now, stale_before)
+    redis.call("SREM", stored_key, doc_id)
+    local started = redis.call("HGET", deleting_key, doc_id)
+    if started and tonumber(started) >= tonumber(stale_before) then
+        return false
+    end
+    redis.call("HSET", deleting_key, doc_id, now)
+    return true
+end
+"""
+
+REMOVE_REFERENCES_SCRIPT = ORPHAN_DOCUMENT + """
+local session_key = KEYS[1]
+local stored_key = KEYS[2]
+local deleting_key = KEYS[3]
+local refs_prefix = ARGV[1]
+local session_id = ARGV[2]
+local now = ARGV[3]
+local stale_before = ARGV[4]
+local file_names = {}
+if #ARGV > 4 then
+    for i = 5, #ARGV do
+        table.insert(file_names, ARGV[i])
+    end
+else
+    file_names = redis.call("HKEYS", session_key)
+end
+local orphaned = {}
+for _, file_name in ipairs(file_names) do
+    local doc_id = redis.call("HGET", session_key, file_name)
+    if doc_id then
+        redis.call("HDEL", session_key, file_name)
+        local refs_key = refs_prefix .. doc_id
+        redis.call("SREM", refs_key, session_id .. ":" .. file_name)
+        if redis.call("SCARD", refs_key) == 0
+            and orphan(stored_key, deleting_key, doc_id, now, stale_before) then
+            table.insert(orphaned, doc_id)
+        end
+    end
+end
+return orphaned
+"""
+
+REMOVE_DOCUMENT_SCRIPT = ORPHAN_DOCUMENT + """
+if redis.call("EXISTS", KEYS[1]) == 1 then
+    return 0
+end
+if orphan(KEYS[2], KEYS[3], ARGV[1], ARGV[2], ARGV[3]) then
+    return 1
+end
+return 0
+"""
+
+
+class RedisDocumentRegistry(DocumentRegistryInterface):
+    def __init__(self, redis_client=None):
+        self.redis_client = redis_client or redis.Redis(
+            host=config.REDIS_HOST,
+            port=config.REDIS_PORT,
+            db=config.REDIS_DB,
+            decode_responses=True,
+        )
+        self.session_documents_prefix = "session_documents:"
+        self.document_refs_prefix = "document_refs:"
+        self.stored_documents_key = "documents_stored"
+        self.deleting_documents_key = "documents_deleting"
+        self._add_reference = self.redis_client.register_script(ADD_REFERENCE_SCRIPT)
+        self._remove_references = self.redis_client.register_script(
+            REMOVE_REFERENCES_SCRIPT
+        )
+        self._remove_document = self.redis_client.register_script(
+            REMOVE_DOCUMENT_SCRIPT
+        )
+
+    def add_reference(self, session_id: str, file_name: str, doc_id: str) -> bool:
+        stored = self._add_reference(
+            keys=[
+                f"{self.session_documents_prefix}{session_id}",
+                self.stored_documents_key,
+            ],
+            args=[
+                file_name,
+                doc_id,
+                self.document_refs_prefix,
+                f"{session_id}:{file_name}",
+            ],
+        )
+        return stored == 1
+
+    def mark_stored(self, doc_id: str):
+        self.redis_client.sadd(self.stored_documents_key, doc_id)
+
+    def get_session_documents(self, session_id: str) -> Dict[str, str]:
+        documents = self.redis_client.hgetall(
+            f"{self.session_documents_prefix}{session_id}"
+        )
+        if not documents:
+            return {}
+        stored = self.redis_client.smismember(
+            self.stored_documents_key, list(documents.values())
+        )
+        return {
+            file_name: doc_id
+            for (file_name, doc_id), is_stored in zip(documents.items(), stored)
+            if is_stored
+        }
+
+    def get_references(self) -> List[Tuple[str, str, str]]:
+        references = []
+        prefix = self.session_documents_prefix
+        for key in self.redis_client.scan_iter(match=f"{prefix}*"):
+            session_id = key[len(prefix) :]
+            references.extend(
+                (session_id, file_name, doc_id)
+                for file_name, doc_id in self.redis_client.hgetall(key).items()
+            )
+        return references
+
+    def _remove(self, session_id: str, file_names: List[str]) -> List[str]:
+        now = time.time()
+        return self._remove_references(
+            keys=[
+                f"{self.session_documents_prefix}{session_id}",
+                self.stored_documents_key,
+                self.deleting_documents_key,
+            ],
+            args=[
+                self.document_refs_prefix,
+                session_id,
+                now,
+                now - config.DOCUMENT_DELETE_TIMEOUT_SECONDS,
+                *file_names,
+            ],
+        )
+
+    def remove_reference(self, session_id: str, file_name: str) -> Optional[str]:
+        orphaned = self._remove(session_id, [file_name])
+        return orphaned[0] if orphaned else None
+
+    def remove_session(self, session_id: str) -> List[str]:
+        return self._remove(session_id, [])
+
+    def remove_document(self, doc_id: str) -> bool:
+        now = time.time()
+        orphaned = self._remove_document(
+            keys=[
+                f"{self.document_refs_prefix}{doc_id}",
+                self.stored_documents_key,
+                self.deleting_documents_key,
+            ],
+            args=[doc_id, now, now - config.DOCUMENT_DELETE_TIMEOUT_SECONDS],
+        )
+        return orphaned == 1
+
+    def is_deleting(self, doc_id: str) -> bool:
+        started = self.redis_client.hget(self.deleting_documents_key, doc_id)
+        return (
+            started is not None
+            and float(started) >= time.time() - config.DOCUMENT_DELETE_TIMEOUT_SECONDS
+        )
+
+    def finish_deletion(self, doc_id: str):
+        self.redis_client.hdel(self.deleting_documents_key, doc_id)
+
+
+_document_registry = None
+
+
+def get_document_registry():
+    global _document_registry
+    if _document_registry is None:
+        app_env = os.getenv("APP_ENV", "development").lower()
+        if app_env == "production":
+            _document_registry = RedisDocumentRegistry()
+        else:
+            _document_registry = LocalDocumentRegistry()
+    return _document_registry
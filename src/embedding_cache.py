@@ -0,0 +1,184 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+import config
+import redis
+from langchain_core.embeddings import Embeddings
+from factories import EmbeddingCacheInterface
+
+
+def _pack(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class _CacheCounters:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, results: List[Optional[List[float]]]):
+        hits = sum(1 for vector in results if vector is not None)
+        self.hits += hits
+        self.misses += len(results) - hits
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class LocalEmbeddingCache(_CacheCounters, EmbeddingCacheInterface):
+    def __init__(self, db_path=config.EMBEDDING_CACHE_PATH):
+        super().__init__()
+        self.max_entries = config.EMBEDDING_CACHE_MAX_ENTRIES
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)"
+        )
+        self.conn.commit()
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                )
+                found.update(rows)
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self.conn.commit()
+        results = [_unpack(found[key]) if key in found else None for key in keys]
+        self.record(results)
+        return results
+
+    def set_many(self, items: Dict[str, List[float]]):
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                [(key, _pack(vector), now) for key, vector in items.items()],
+            )
+            (count,) = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                self.conn.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    "SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self.conn.commit()
+
+
+class RedisEmbeddingCache(_CacheCounters, EmbeddingCacheInterface):
+    def __init__(self):
+        super().__init__()
+        self.redis_client = redis.Redis(
+            host=config.REDIS_HOST,
+            port=config.REDIS_PORT,
+            db=config.REDIS_DB,
+        )
+        self.max_entries = config.EMBEDDING_CACHE_MAX_ENTRIES
+        self.key_prefix = "embedding_cache:"
+        self.lru_key = "embedding_cache_lru"
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        if not keys:
+            return []
+        blobs = self.redis_client.mget([f"{self.key_prefix}{key}" for key in keys])
+        hit_keys = {key: time.time() for key, blob in zip(keys, blobs) if blob}
+        if hit_keys:
+            self.redis_client.zadd(self.lru_key, hit_keys)
+        results = [_unpack(blob) if blob else None for blob in blobs]
+        self.record(results)
+        return results
+
+    def set_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        now = time.time()
+        pipe = self.redis_client.pipeline()
+        pipe.mset({f"{self.key_prefix}{key}": _pack(vector) for key, vector in items.items()})
+        pipe.zadd(self.lru_key, {key: now for key in items})
+        pipe.zcard(self.lru_key)
+        count = pipe.execute()[-1]
+        if count > self.max_entries:
+            evicted = self.redis_client.zpopmin(self.lru_key, count - self.max_entries)
+            if evicted:
+                self.redis_client.delete(
+                    *[f"{self.key_prefix}{key.decode()}" for key, _ in evicted]
+                )
+
+
+_embedding_cache = None
+
+
+def get_embedding_cache():
+    global _embedding_cache
+    if _embedding_cache is None:
+        app_env = os.getenv("APP_ENV", "development").lower()
+        if app_env == "production":
+            _embedding_cache = RedisEmbeddingCache()
+        else:
+            _embedding_cache = LocalEmbeddingCache()
+    return _embedding_cache
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCacheInterface, model_name: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode()).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing[key] = text
+        if missing:
+            computed = dict(
+                zip(missing, self.embeddings.embed_documents(list(missing.values())))
+            )
+            self.cache.set_many(computed)
+            vectors = [
+                computed[key] if vector is None else vector
+                for key, vector in zip(keys, vectors)
+            ]
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.embeddings.aembed_query(text)
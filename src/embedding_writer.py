@@ -0,0 +1,181 @@
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import config
+import metrics
+
+Item = Tuple[str, Dict[str, Any]]
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    status_code = getattr(exc, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(exc, "response", None), "status_code", None)
+    return status_code
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if _status_code(exc) in RETRYABLE_STATUS_CODES:
+        return True
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    return type(exc).__name__ in ("APITimeoutError", "APIConnectionError")
+
+
+class EmbeddingWriter:
+    """Embeds chunks in token-bounded batches on a small thread pool and
+    upserts each finished batch while the following ones are still embedding.
+
+    Concurrency follows AIMD: it grows by one after a fast batch, shrinks by
+    one after a slow one and halves on a 429.
+    """
+
+    def __init__(
+        self,
+        vectorstore,
+        max_batch_tokens: int = config.EMBEDDING_BATCH_TOKENS,
+        max_batch_size: int = config.EMBEDDING_BATCH_SIZE,
+        max_concurrency: int = config.EMBEDDING_MAX_CONCURRENCY,
+        max_retries: int = config.EMBEDDING_MAX_RETRIES,
+        target_latency: float = config.EMBEDDING_TARGET_LATENCY,
+    ):
+        self.vectorstore = vectorstore
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.target_latency = target_latency
+        self.concurrency = min(2, max_concurrency)
+        self.lock = threading.Lock()
+        self.counters = {"chunks": 0, "batches": 0, "retries": 0, "rate_limited": 0}
+        self.seconds = 0.0
+
+    def _batches(self, items: Iterable[Item]) -> Iterator[List[Item]]:
+        batch: List[Item] = []
+        tokens = 0
+        for item in items:
+            item_tokens = estimate_tokens(item[1]["content"])
+            if batch and (
+                tokens + item_tokens > self.max_batch_tokens
+                or len(batch) >= self.max_batch_size
+            ):
+                yield batch
+                batch, tokens = [], 0
+            batch.append(item)
+            tokens += item_tokens
+        if batch:
+            yield batch
+
+    def _adjust(self, latency: Optional[float] = None, rate_limited: bool = False):
+        with self.lock:
+            if rate_limited:
+                self.concurrency = max(1, self.concurrency // 2)
+            elif latency is not None and latency > self.target_latency:
+                self.concurrency = max(1, self.concurrency - 1)
+            elif latency is not None:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+
+    def _count(self, name: str, value: int = 1):
+        with self.lock:
+            self.counters[name] += value
+
+    def _embed(self, batch: List[Item]) -> Tuple[List[Item], List[List[float]]]:
+        texts = [chunk["content"] for _, chunk in batch]
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                vectors = self.vectorstore.embeddings.embed_documents(texts)
+            except Exception as exc:
+                if attempt == self.max_retries or not _is_retryable(exc):
+                    raise
+                rate_limited = _status_code(exc) == 429
+                self._adjust(rate_limited=rate_limited)
+                self._count("retries")
+                metrics.registry.inc("rag_embedding_retries_total")
+                if rate_limited:
+                    self._count("rate_limited")
+                    metrics.registry.inc("rag_embedding_rate_limited_total")
+                backoff = min(2**attempt, 30) * random.uniform(0.5, 1.5)
+                time.sleep(_retry_after(exc) or backoff)
+                continue
+            latency = time.perf_counter() - start
+            self._adjust(latency=latency)
+            metrics.record("embedding_batch", latency, chunk_count=len(batch))
+            return batch, vectors
+
+    def _upsert(self, batch: List[Item], vectors: List[List[float]]):
+        with metrics.timed("vectorstore_upsert", chunk_count=len(batch)):
+            self.vectorstore.upsert(
+                ids=[chunk_id for chunk_id, _ in batch],
+                embeddings=vectors,
+                documents=[chunk["content"] for _, chunk in batch],
+                metadatas=[chunk["metadata"] for _, chunk in batch],
+            )
+
+    def write(
+        self,
+        items: Iterable[Item],
+        on_written: Optional[Callable[[List[Item]], None]] = None,
+    ) -> int:
+        start = time.perf_counter()
+        written = 0
+        batches = self._batches(items)
+        pending = set()
+        exhausted = False
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            try:
+                while True:
+                    while not exhausted and len(pending) < self.concurrency:
+                        batch = next(batches, None)
+                        if batch is None:
+                            exhausted = True
+                        else:
+                            pending.add(executor.submit(self._embed, batch))
+                    if not pending:
+                        break
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        batch, vectors = future.result()
+                        self._upsert(batch, vectors)
+                        if on_written is not None:
+                            on_written(batch)
+                        written += len(batch)
+                        self._count("batches")
+            finally:
+                for future in pending:
+                    future.cancel()
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.counters["chunks"] += written
+            self.seconds += elapsed
+        metrics.record("embedding_write", elapsed, chunk_count=written)
+        return written
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            return {
+                **self.counters,
+                "seconds": round(self.seconds, 3),
+                "chunks_per_s": (
+                    round(self.counters["chunks"] / self.seconds, 2)
+                    if self.seconds
+                    else 0.0
+                ),
+                "concurrency": self.concurrency,
+            }
@@ -0,0 +1,150 @@
+import hashlib
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import List
+import config
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from lexical_index import tokenize
+
+
+@lru_cache(maxsize=1 << 16)
+def _feature_hash(feature: str) -> int:
+    return zlib.crc32(feature.encode())
+
+
+class HashingEmbeddings(Embeddings):
+    """Signed feature hashing of word unigrams and bigrams into a fixed-size
+    vector with sublinear term frequency; needs no model, network or fitting."""
+
+    def __init__(self, dimensions: int = config.HASHING_EMBEDDING_DIM):
+        self.dimensions = dimensions
+
+    def _features(self, text: str) -> List[str]:
+        tokens = tokenize(text)
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        features = [self._features(text) for text in texts]
+        rows = np.repeat(np.arange(len(texts)), [len(f) for f in features])
+        hashes = np.fromiter(
+            (_feature_hash(feature) for row in features for feature in row),
+            dtype=np.uint32,
+            count=len(rows),
+        )
+        columns = hashes % self.dimensions
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+        counts = np.bincount(
+            rows * self.dimensions + columns,
+            weights=signs,
+            minlength=len(texts) * self.dimensions,
+        ).reshape(len(texts), self.dimensions)
+        vectors = np.sign(counts) * np.log1p(np.abs(counts))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+        return vectors.astype(np.float32).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence-transformer style model exported to ONNX (``model.onnx`` and
+    ``tokenizer.json`` in ``model_dir``), mean pooled and L2 normalised."""
+
+    def __init__(
+        self,
+        model_dir,
+        batch_size: int = config.EMBEDDING_BATCH_SIZE,
+        max_length: int = 256,
+    ):
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError(
+                "EMBEDDING_BACKEND=onnx needs onnxruntime and tokenizers; "
+                "install the 'onnx' extra (uv sync --extra onnx)"
+            ) from e
+
+        model_dir = Path(model_dir)
+        self.batch_size = batch_size
+        self.session = onnxruntime.InferenceSession(
+            str(model_dir / "model.onnx"), providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            inputs["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, inputs)[0]
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(
+            np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return np.concatenate(
+            [
+                self._embed_batch(texts[start : start + self.batch_size])
+                for start in range(0, len(texts), self.batch_size)
+            ]
+        ).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+@lru_cache(maxsize=4)
+def _model_digest(path: str, size: int, mtime_ns: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def embedding_backend_id() -> str:
+    backend = config.EMBEDDING_BACKEND
+    if backend == "openai":
+        return f"openai:{config.EMBEDDING_MODEL}"
+    if backend == "hashing":
+        return f"hashing:{config.HASHING_EMBEDDING_DIM}"
+    if backend == "onnx":
+        # Directory names like "model" or "onnx" are not unique, so the id
+        # also carries a digest of the weights themselves.
+        model_file = Path(config.ONNX_MODEL_PATH) / "model.onnx"
+        stat = model_file.stat()
+        digest = _model_digest(str(model_file), stat.st_size, stat.st_mtime_ns)
+        return f"onnx:{model_file.parent.name}:{digest}"
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+
+def create_embeddings(openai_api_key=None) -> Embeddings:
+    backend = config.EMBEDDING_BACKEND
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+
+        return OpenAIEmbeddings(
+            model=config.EMBEDDING_MODEL,
+            openai_api_key=openai_api_key,
+            base_url=config.OPENAI_BASE_URL,
+        )
+    if backend == "hashing":
+        return HashingEmbeddings()
+    if backend == "onnx":
+        return OnnxEmbeddings(config.ONNX_MODEL_PATH)
+    raise ValueError(f"Unknown embedding backend: {backend}")
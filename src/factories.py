@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 
 class SessionManagerInterface(ABC):
@@ -12,7 +12,7 @@ class SessionManagerInterface(ABC):
         pass
 
     @abstractmethod
-    def create_session(self, session_id: str) -> str:
+    def create_session(self, session_id: str) -> List[str]:
         pass
 
     @abstractmethod
@@ -35,8 +35,110 @@ class SessionManagerInterface(ABC):
     def remove_session(self, session_id: str):
         pass
 
+    @abstractmethod
+    def list_sessions(self) -> List[str]:
+        pass
+
 
 class ChromaDBInterface(ABC):
     @abstractmethod
-    def get_vectorstore(self, embed_model):
+    def get_vectorstore(self, embed_model, shards=None):
+        pass
+
+
+class EmbeddingCacheInterface(ABC):
+    @abstractmethod
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        pass
+
+    @abstractmethod
+    def set_many(self, items: Dict[str, List[float]]):
+        pass
+
+    @abstractmethod
+    def stats(self) -> Dict[str, float]:
+        pass
+
+
+class DocumentRegistryInterface(ABC):
+    @abstractmethod
+    def add_reference(self, session_id: str, file_name: str, doc_id: str) -> bool:
+        pass
+
+    @abstractmethod
+    def mark_stored(self, doc_id: str):
+        pass
+
+    @abstractmethod
+    def get_session_documents(self, session_id: str) -> Dict[str, str]:
+        pass
+
+    @abstractmethod
+    def get_references(self) -> List[Tuple[str, str, str]]:
+        pass
+
+    @abstractmethod
+    def remove_reference(self, session_id: str, file_name: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def remove_session(self, session_id: str) -> List[str]:
+        pass
+
+    @abstractmethod
+    def remove_document(self, doc_id: str) -> bool:
+        pass
+
+    @abstractmethod
+    def is_deleting(self, doc_id: str) -> bool:
+        pass
+
+    @abstractmethod
+    def finish_deletion(self, doc_id: str):
+        pass
+
+
+class JobQueueInterface(ABC):
+    @abstractmethod
+    def enqueue(self, job: Dict, uploads: Optional[Dict[str, bytes]] = None) -> str:
+        pass
+
+    @abstractmethod
+    def dequeue(self, timeout: float) -> Optional[Dict]:
+        pass
+
+    @abstractmethod
+    def save(self, job: Dict):
+        pass
+
+    @abstractmethod
+    def finish(self, job: Dict):
+        pass
+
+    @abstractmethod
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        pass
+
+    @abstractmethod
+    def get_session_jobs(self, session_id: str) -> List[Dict]:
+        pass
+
+    @abstractmethod
+    def heartbeat(self, job_id: str):
+        pass
+
+    @abstractmethod
+    def requeue_stale(self) -> int:
+        pass
+
+    @abstractmethod
+    def get_upload(self, job_id: str, file_name: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def delete_upload(self, job_id: str, file_name: str):
+        pass
+
+    @abstractmethod
+    def purge_session(self, session_id: str) -> int:
         pass
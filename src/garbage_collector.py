@@ -0,0 +1,298 @@
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import config
+import metrics
+import redis
+from document_registry import get_document_registry
+from jobs import get_job_queue, upload_dir
+from session_manager import get_session_manager
+
+logger = logging.getLogger("rag.gc")
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _remove_tree(path: str) -> Tuple[int, int]:
+    files = size = 0
+    for root, _, names in os.walk(path):
+        files += len(names)
+        size += sum(_file_size(os.path.join(root, name)) for name in names)
+    shutil.rmtree(path, ignore_errors=True)
+    return files, size
+
+
+class GarbageCollector:
+    """Reclaims what evicted and expired sessions leave behind, off the
+    request path.
+
+    Evicted sessions are scheduled for the next pass. Every pass also
+    reconciles the session manager against the document registry, the
+    upload spool, the vector store and the lexical index, so sessions that
+    expired (or whose eviction was never scheduled) are collected as well.
+    At most ``batch_size`` sessions are removed per pass; the rest start the
+    next pass right away. Shards and lexical indexes no registered document
+    maps to are only dropped when they were already orphaned on the
+    previous pass, so a document attached in between is left alone.
+    """
+
+    def __init__(
+        self,
+        session_manager=None,
+        document_registry=None,
+        job_queue=None,
+        interval: float = config.GC_INTERVAL_SECONDS,
+        batch_size: int = config.GC_BATCH_SIZE,
+        uploads_dir=config.UPLOADS_DIR,
+    ):
+        self.session_manager = session_manager or get_session_manager()
+        self.document_registry = document_registry or get_document_registry()
+        self.job_queue = job_queue or get_job_queue()
+        self.interval = interval
+        self.batch_size = batch_size
+        self.uploads_dir = uploads_dir
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.pending: Set[str] = set()
+        self.suspects: Set[Tuple[str, str]] = set()
+        self.totals: Dict[str, int] = {"passes": 0}
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, session_ids: Iterable[str]):
+        with self.lock:
+            self.pending.update(session_ids)
+        self.wake.set()
+
+    def _take_pending(self) -> Set[str]:
+        with self.lock:
+            pending, self.pending = self.pending, set()
+        return pending
+
+    def _acquire(self) -> bool:
+        return True
+
+    def _release(self):
+        pass
+
+    def _vector_manager(self):
+        from resources import get_vector_manager
+
+        return get_vector_manager()
+
+    def _sweep_uploads(
+        self, upload_sessions: Set[str], live: Set[str], removed: List[str]
+    ) -> Tuple[int, int]:
+        files = size = 0
+        for session_id in removed:
+            if session_id in upload_sessions:
+                removed_files, removed_size = _remove_tree(upload_dir(session_id))
+                files += removed_files
+                size += removed_size
+        # Spooled uploads outlive their job only when a worker died mid-job;
+        # once the job has expired nothing will read them again.
+        deadline = time.time() - config.JOB_TTL_SECONDS
+        for session_id in upload_sessions & live:
+            directory = upload_dir(session_id)
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime >= deadline:
+                        continue
+                    os.remove(path)
+                except OSError:
+                    continue
+                files += 1
+                size += stat.st_size
+        return files, size
+
+    def _reconcile(
+        self,
+        vector_manager,
+        shard_names: Set[str],
+        lexical_ids: Set[str],
+        referenced: Set[str],
+    ) -> Dict[str, int]:
+        vectorstore = vector_manager.vectorstore
+        lexical_index = vector_manager.lexical_index
+        known_shards = {vectorstore.shard_name(doc_id) for doc_id in referenced}
+        orphans = {("shard", name) for name in shard_names - known_shards}
+        orphans.update(("lexical", doc_id) for doc_id in lexical_ids - referenced)
+        confirmed = orphans & self.suspects
+        self.suspects = orphans - confirmed
+        stats = {"orphaned_shards": 0, "chunks": 0}
+        for kind, name in sorted(confirmed):
+            if kind == "shard":
+                stats["orphaned_shards"] += 1
+                stats["chunks"] += vectorstore.delete_shard(name)
+            else:
+                lexical_index.remove_document(name)
+        return stats
+
+    def collect(self) -> Dict[str, int]:
+        vector_manager = self._vector_manager()
+        # Listed before the registry is read: documents (including those
+        # reindex.py rebuilds) are registered before their first chunk is
+        # written, so every shard seen here that belongs to a live document
+        # is in the references below.
+        shard_names = set(vector_manager.vectorstore.shard_names())
+        lexical_ids = (
+            set(vector_manager.lexical_index.document_ids())
+            if vector_manager.lexical_index is not None
+            else set()
+        )
+        references = self.document_registry.get_references()
+        upload_sessions = (
+            set(os.listdir(self.uploads_dir))
+            if os.path.isdir(self.uploads_dir)
+            else set()
+        )
+        # Read last: a session only gets references or uploads after it was
+        # created, so any session seen above that is still alive is listed.
+        live = set(self.session_manager.list_sessions())
+
+        dead = sorted(
+            (
+                self._take_pending()
+                | {session_id for session_id, _, _ in references}
+                | upload_sessions
+            )
+            - live
+        )
+        batch, backlog = dead[: self.batch_size], dead[self.batch_size :]
+        if backlog:
+            self.schedule(backlog)
+
+        stats = {"sessions": len(batch), "documents": 0, "chunks": 0, "jobs": 0}
+        if batch:
+            removed = vector_manager.remove_sessions(batch)
+            stats["documents"] = removed["documents"]
+            stats["chunks"] = removed["chunks"]
+            for session_id in batch:
+                stats["jobs"] += self.job_queue.purge_session(session_id)
+        stats["files"], stats["bytes"] = self._sweep_uploads(
+            upload_sessions, live, batch
+        )
+
+        removed_sessions = set(batch)
+        orphans = self._reconcile(
+            vector_manager,
+            shard_names,
+            lexical_ids,
+            {
+                doc_id
+                for session_id, _, doc_id in references
+                if session_id not in removed_sessions
+            },
+        )
+        stats["orphaned_shards"] = orphans["orphaned_shards"]
+        stats["chunks"] += orphans["chunks"]
+
+        with self.lock:
+            self.totals["passes"] += 1
+            for key, value in stats.items():
+                self.totals[key] = self.totals.get(key, 0) + value
+        for key, value in stats.items():
+            if value:
+                metrics.registry.inc(f"rag_gc_{key}_total", value)
+        if any(stats.values()):
+            logger.info("Garbage collection reclaimed %s", stats)
+        return stats
+
+    def run(self, stop_event: Optional[threading.Event] = None):
+        while stop_event is None or not stop_event.is_set():
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            if not self._acquire():
+                continue
+            try:
+                self.collect()
+            except Exception:
+                logger.exception("Garbage collection failed")
+            finally:
+                self._release()
+
+    def start(self):
+        with self.lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self.run, daemon=True)
+            self._thread.start()
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.totals)
+
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+class RedisGarbageCollector(GarbageCollector):
+    """Evictions are scheduled through Redis so any app replica can hand them
+    to the workers, and a lock keeps passes from overlapping."""
+
+    def __init__(self, redis_client=None, **kwargs):
+        super().__init__(**kwargs)
+        self.redis_client = redis_client or redis.Redis(
+            host=config.REDIS_HOST,
+            port=config.REDIS_PORT,
+            db=config.REDIS_DB,
+            decode_responses=True,
+        )
+        self.pending_key = "gc_pending_sessions"
+        self.lock_key = "gc_lock"
+        self.lock_token = str(uuid.uuid4())
+        self._release_lock = self.redis_client.register_script(RELEASE_LOCK_SCRIPT)
+
+    def schedule(self, session_ids: Iterable[str]):
+        session_ids = list(session_ids)
+        if session_ids:
+            self.redis_client.sadd(self.pending_key, *session_ids)
+        self.wake.set()
+
+    def _take_pending(self) -> Set[str]:
+        count = self.redis_client.scard(self.pending_key)
+        if not count:
+            return set()
+        return set(self.redis_client.spop(self.pending_key, count))
+
+    def _acquire(self) -> bool:
+        return bool(
+            self.redis_client.set(
+                self.lock_key,
+                self.lock_token,
+                nx=True,
+                ex=config.GC_LOCK_SECONDS,
+            )
+        )
+
+    def _release(self):
+        self._release_lock(keys=[self.lock_key], args=[self.lock_token])
+
+
+_garbage_collector = None
+
+
+def get_garbage_collector():
+    global _garbage_collector
+    if _garbage_collector is None:
+        app_env = os.getenv("APP_ENV", "development").lower()
+        if app_env == "production":
+            _garbage_collector = RedisGarbageCollector()
+        else:
+            _garbage_collector = GarbageCollector()
+    return _garbage_collector
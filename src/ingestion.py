@@ -0,0 +1,127 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional
+import config
+from factories import JobQueueInterface
+from jobs import DONE, FAILED, RUNNING, upload_dir
+from processing import DocumentProcessor
+from resources import get_vector_manager
+
+logger = logging.getLogger("rag.ingestion")
+
+PROGRESS_EVERY = 50
+
+
+def _report_progress(
+    chunks: Iterable[Dict[str, Any]], job: Dict, file_name: str, job_queue
+) -> Iterator[Dict[str, Any]]:
+    file_state = job["files"][file_name]
+    for count, chunk in enumerate(chunks, start=1):
+        yield chunk
+        if count % PROGRESS_EVERY == 0:
+            file_state["chunks"] = count
+            job_queue.save(job)
+
+
+def _ingest_file(job: Dict, file_name: str, processor, vector_manager, job_queue):
+    session_id = job["session_id"]
+    file_state = job["files"][file_name]
+    file_state.update(status=RUNNING, error=None)
+    job_queue.save(job)
+
+    doc_id = processor.document_id(file_name)
+    if vector_manager.attach_document(session_id, file_name, doc_id):
+        file_state.update(status=DONE, deduplicated=True)
+        return
+    chunks = processor.iter_chunks({file_name: doc_id})
+    file_state["chunks"] = vector_manager.add_chunk_stream(
+        _report_progress(chunks, job, file_name, job_queue)
+    )
+    vector_manager.mark_documents_stored(session_id, [doc_id])
+    file_state["status"] = DONE
+
+
+def _load_upload(job: Dict, file_name: str, processor, job_queue) -> bool:
+    data = job_queue.get_upload(job["job_id"], file_name)
+    if data is not None:
+        processor.add_source(file_name, data)
+        return True
+    path = job["files"][file_name].get("path")
+    if path and os.path.exists(path):
+        processor.add_source(file_name, path)
+        return True
+    return False
+
+
+@contextmanager
+def _heartbeat(job_queue: JobQueueInterface, job_id: str):
+    # Progress is saved every PROGRESS_EVERY chunks, which a slow PDF or
+    # embedding call can stretch past JOB_STALE_SECONDS.
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(config.JOB_STALE_SECONDS / 3):
+            try:
+                job_queue.heartbeat(job_id)
+            except Exception:
+                logger.exception("Heartbeat for job %s failed", job_id)
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_ingestion_job(job: Dict, job_queue: JobQueueInterface):
+    job["status"] = RUNNING
+    job_queue.save(job)
+    processor = DocumentProcessor(upload_dir(job["session_id"]))
+    api_key = job.get("openai_api_key")
+    vector_manager = get_vector_manager(api_key)
+    for file_name, file_state in job["files"].items():
+        if file_state["status"] == DONE:
+            continue
+        if not api_key and config.EMBEDDING_BACKEND == "openai":
+            file_state.update(
+                status=FAILED,
+                error="The API key expired before ingestion; upload again",
+            )
+            continue
+        if not _load_upload(job, file_name, processor, job_queue):
+            file_state.update(status=FAILED, error="Uploaded file is missing")
+            continue
+        try:
+            _ingest_file(job, file_name, processor, vector_manager, job_queue)
+        except Exception as e:
+            logger.exception("Ingesting %s failed", file_name)
+            file_state.update(status=FAILED, error=str(e))
+        processor.delete_processed_files([file_name])
+        job_queue.delete_upload(job["job_id"], file_name)
+        job_queue.save(job)
+    statuses = {file_state["status"] for file_state in job["files"].values()}
+    job["status"] = DONE if statuses == {DONE} else FAILED
+    job_queue.finish(job)
+
+
+def run_worker(
+    job_queue: JobQueueInterface,
+    stop_event: Optional[threading.Event] = None,
+    poll_interval: float = config.JOB_POLL_INTERVAL,
+):
+    while stop_event is None or not stop_event.is_set():
+        job_queue.requeue_stale()
+        job = job_queue.dequeue(timeout=poll_interval)
+        if job is None:
+            continue
+        try:
+            with _heartbeat(job_queue, job["job_id"]):
+                run_ingestion_job(job, job_queue)
+        except Exception:
+            logger.exception("Ingestion job %s failed", job["job_id"])
+            job["status"] = FAILED
+            job_queue.finish(job)
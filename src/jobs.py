@@ -0,0 +1,319 @@
+import copy
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+import config
+import redis
+from factories import JobQueueInterface
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+def new_job(session_id: str, file_names: List[str], openai_api_key: str) -> Dict:
+    now = time.time()
+    return {
+        "job_id": str(uuid.uuid4()),
+        "session_id": session_id,
+        "openai_api_key": openai_api_key,
+        "status": QUEUED,
+        "files": {
+            file_name: {"status": QUEUED, "chunks": 0, "error": None}
+            for file_name in file_names
+        },
+        "created": now,
+        "updated": now,
+    }
+
+
+def upload_dir(session_id: str) -> str:
+    return os.path.join(config.UPLOADS_DIR, session_id)
+
+
+def _without_api_key(job: Dict) -> Dict:
+    return {key: value for key, value in job.items() if key != "openai_api_key"}
+
+
+class LocalJobQueue(JobQueueInterface):
+    def __init__(self, workers: int = config.INGESTION_WORKERS):
+        self.workers = workers
+        self.jobs: Dict[str, Dict] = {}
+        self.uploads: Dict[str, Dict[str, bytes]] = {}
+        self.api_keys: Dict[str, str] = {}
+        self.queue: "queue.Queue[str]" = queue.Queue()
+        self.lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def start_workers(self):
+        from ingestion import run_worker
+
+        with self.lock:
+            if self._threads:
+                return
+            for _ in range(self.workers):
+                thread = threading.Thread(target=run_worker, args=(self,), daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, job: Dict, uploads: Optional[Dict[str, bytes]] = None) -> str:
+        # Workers (and with them the PDF stack) start with the first upload.
+        self.start_workers()
+        with self.lock:
+            self.uploads[job["job_id"]] = dict(uploads or {})
+            if job.get("openai_api_key"):
+                self.api_keys[job["job_id"]] = job["openai_api_key"]
+        self.save(job)
+        self.queue.put(job["job_id"])
+        return job["job_id"]
+
+    def dequeue(self, timeout: float) -> Optional[Dict]:
+        try:
+            job_id = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        job = self.get_job(job_id)
+        if job is not None:
+            with self.lock:
+                job["openai_api_key"] = self.api_keys.get(job_id)
+        return job
+
+    def save(self, job: Dict):
+        job["updated"] = time.time()
+        with self.lock:
+            self.jobs[job["job_id"]] = copy.deepcopy(_without_api_key(job))
+
+    def finish(self, job: Dict):
+        self.save(job)
+        with self.lock:
+            self.uploads.pop(job["job_id"], None)
+            self.api_keys.pop(job["job_id"], None)
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return copy.deepcopy(job) if job is not None else None
+
+    def get_session_jobs(self, session_id: str) -> List[Dict]:
+        with self.lock:
+            return [
+                copy.deepcopy(job)
+                for job in self.jobs.values()
+                if job["session_id"] == session_id
+            ]
+
+    def heartbeat(self, job_id: str):
+        pass
+
+    def requeue_stale(self) -> int:
+        return 0
+
+    def get_upload(self, job_id: str, file_name: str) -> Optional[bytes]:
+        with self.lock:
+            return self.uploads.get(job_id, {}).get(file_name)
+
+    def delete_upload(self, job_id: str, file_name: str):
+        with self.lock:
+            self.uploads.get(job_id, {}).pop(file_name, None)
+
+    def purge_session(self, session_id: str) -> int:
+        with self.lock:
+            job_ids = [
+                job_id
+                for job_id, job in self.jobs.items()
+                if job["session_id"] == session_id
+                and job["status"] not in ACTIVE_STATUSES
+            ]
+            for job_id in job_ids:
+                del self.jobs[job_id]
+                self.uploads.pop(job_id, None)
+                self.api_keys.pop(job_id, None)
+            return len(job_ids)
+
+
+DEQUEUE_SCRIPT = """
+local queue_key = KEYS[1]
+local processing_key = KEYS[2]
+local now = tonumber(ARGV[1])
+local job_id = redis.call("RPOP", queue_key)
+if not job_id then
+    return false
+end
+redis.call("ZADD", processing_key, now, job_id)
+return job_id
+"""
+
+REQUEUE_STALE_SCRIPT = """
+local queue_key = KEYS[1]
+local processing_key = KEYS[2]
+local deadline = tonumber(ARGV[1])
+local stale = redis.call("ZRANGEBYSCORE", processing_key, "-inf", deadline)
+for _, job_id in ipairs(stale) do
+    redis.call("ZREM", processing_key, job_id)
+    redis.call("RPUSH", queue_key, job_id)
+end
+return #stale
+"""
+
+
+class RedisJobQueue(JobQueueInterface):
+    def __init__(self, redis_client=None, upload_client=None):
+        self.redis_client = redis_client or redis.Redis(
+            host=config.REDIS_HOST,
+            port=config.REDIS_PORT,
+            db=config.REDIS_DB,
+            decode_responses=True,
+        )
+        # PDF bytes must not go through the decoding client.
+        self.upload_client = upload_client or redis.Redis(
+            host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB
+        )
+        self.job_ttl = config.JOB_TTL_SECONDS
+        self.api_key_ttl = config.JOB_API_KEY_TTL_SECONDS
+        self.stale_seconds = config.JOB_STALE_SECONDS
+        self.queue_key = "ingestion_queue"
+        self.processing_key = "ingestion_processing"
+        self.job_prefix = "ingestion_job:"
+        self.session_jobs_prefix = "session_jobs:"
+        self.upload_prefix = "ingestion_upload:"
+        self.api_key_prefix = "ingestion_api_key:"
+        self._dequeue = self.redis_client.register_script(DEQUEUE_SCRIPT)
+        self._requeue_stale = self.redis_client.register_script(REQUEUE_STALE_SCRIPT)
+
+    def enqueue(self, job: Dict, uploads: Optional[Dict[str, bytes]] = None) -> str:
+        job["updated"] = time.time()
+        if uploads:
+            upload_key = f"{self.upload_prefix}{job['job_id']}"
+            pipe = self.upload_client.pipeline()
+            pipe.hset(upload_key, mapping=uploads)
+            pipe.expire(upload_key, self.job_ttl)
+            pipe.execute()
+        session_key = f"{self.session_jobs_prefix}{job['session_id']}"
+        pipe = self.redis_client.pipeline()
+        if job.get("openai_api_key"):
+            pipe.set(
+                f"{self.api_key_prefix}{job['job_id']}",
+                job["openai_api_key"],
+                ex=self.api_key_ttl,
+            )
+        pipe.set(
+            f"{self.job_prefix}{job['job_id']}",
+            json.dumps(_without_api_key(job)),
+            ex=self.job_ttl,
+        )
+        pipe.zadd(session_key, {job["job_id"]: job["created"]})
+        pipe.expire(session_key, self.job_ttl)
+        pipe.lpush(self.queue_key, job["job_id"])
+        pipe.execute()
+        return job["job_id"]
+
+    def dequeue(self, timeout: float) -> Optional[Dict]:
+        deadline = time.monotonic() + timeout
+        while True:
+            job_id = self._dequeue(
+                keys=[self.queue_key, self.processing_key], args=[time.time()]
+            )
+            if job_id:
+                job = self.get_job(job_id)
+                if job is not None:
+                    job["openai_api_key"] = self.redis_client.get(
+                        f"{self.api_key_prefix}{job_id}"
+                    )
+                    return job
+                self.redis_client.zrem(self.processing_key, job_id)
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(remaining, 0.2))
+
+    def save(self, job: Dict):
+        job["updated"] = time.time()
+        pipe = self.redis_client.pipeline()
+        pipe.set(
+            f"{self.job_prefix}{job['job_id']}",
+            json.dumps(_without_api_key(job)),
+            ex=self.job_ttl,
+        )
+        pipe.zadd(self.processing_key, {job["job_id"]: job["updated"]}, xx=True)
+        pipe.execute()
+
+    def finish(self, job: Dict):
+        job["updated"] = time.time()
+        pipe = self.redis_client.pipeline()
+        pipe.set(
+            f"{self.job_prefix}{job['job_id']}",
+            json.dumps(_without_api_key(job)),
+            ex=self.job_ttl,
+        )
+        pipe.zrem(self.processing_key, job["job_id"])
+        pipe.delete(f"{self.api_key_prefix}{job['job_id']}")
+        pipe.execute()
+        self.upload_client.delete(f"{self.upload_prefix}{job['job_id']}")
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        data = self.redis_client.get(f"{self.job_prefix}{job_id}")
+        return json.loads(data) if data else None
+
+    def get_session_jobs(self, session_id: str) -> List[Dict]:
+        job_ids = self.redis_client.zrange(
+            f"{self.session_jobs_prefix}{session_id}", 0, -1
+        )
+        if not job_ids:
+            return []
+        data = self.redis_client.mget([f"{self.job_prefix}{j}" for j in job_ids])
+        return [json.loads(item) for item in data if item]
+
+    def heartbeat(self, job_id: str):
+        self.redis_client.zadd(self.processing_key, {job_id: time.time()}, xx=True)
+
+    def requeue_stale(self) -> int:
+        return self._requeue_stale(
+            keys=[self.queue_key, self.processing_key],
+            args=[time.time() - self.stale_seconds],
+        )
+
+    def get_upload(self, job_id: str, file_name: str) -> Optional[bytes]:
+        return self.upload_client.hget(f"{self.upload_prefix}{job_id}", file_name)
+
+    def delete_upload(self, job_id: str, file_name: str):
+        self.upload_client.hdel(f"{self.upload_prefix}{job_id}", file_name)
+
+    def purge_session(self, session_id: str) -> int:
+        job_ids = [
+            job["job_id"]
+            for job in self.get_session_jobs(session_id)
+            if job["status"] not in ACTIVE_STATUSES
+        ]
+        if not job_ids:
+            return 0
+        pipe = self.redis_client.pipeline()
+        pipe.delete(*(f"{self.job_prefix}{job_id}" for job_id in job_ids))
+        pipe.delete(*(f"{self.api_key_prefix}{job_id}" for job_id in job_ids))
+        pipe.zrem(f"{self.session_jobs_prefix}{session_id}", *job_ids)
+        pipe.execute()
+        self.upload_client.delete(
+            *(f"{self.upload_prefix}{job_id}" for job_id in job_ids)
+        )
+        return len(job_ids)
+
+
+_job_queue = None
+
+
+def get_job_queue():
+    global _job_queue
+    if _job_queue is None:
+        app_env = os.getenv("APP_ENV", "development").lower()
+        if app_env == "production":
+            _job_queue = RedisJobQueue()
+        else:
+            _job_queue = LocalJobQueue()
+    return _job_queue
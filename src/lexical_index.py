@@ -0,0 +1,219 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+import config
+from langchain_core.documents import Document
+
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./:]\w+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class CorpusStatistics(NamedTuple):
+    doc_count: int
+    total_length: int
+    document_frequency: Dict[str, int]
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.chunks: Dict[str, Dict] = {}
+        self.total_length = 0
+
+    def add(self, chunk_id: str, text: str, file_name: str):
+        if chunk_id in self.chunks:
+            self.remove([chunk_id])
+        term_counts = Counter(tokenize(text))
+        length = sum(term_counts.values())
+        for term, count in term_counts.items():
+            self.postings.setdefault(term, {})[chunk_id] = count
+        self.chunks[chunk_id] = {
+            "text": text,
+            "file_name": file_name,
+            "length": length,
+            "terms": list(term_counts),
+        }
+        self.total_length += length
+
+    def remove(self, chunk_ids: Iterable[str]):
+        for chunk_id in chunk_ids:
+            chunk = self.chunks.pop(chunk_id, None)
+            if chunk is None:
+                continue
+            self.total_length -= chunk["length"]
+            for term in chunk["terms"]:
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(chunk_id, None)
+                    if not posting:
+                        del self.postings[term]
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        statistics: Optional[CorpusStatistics] = None,
+    ) -> List[Tuple[str, float]]:
+        """Score this index's chunks. ``statistics`` supplies the IDF and
+        average length when several indexes are ranked against each other."""
+        if not self.chunks:
+            return []
+        if statistics is None:
+            statistics = CorpusStatistics(len(self.chunks), self.total_length, {})
+        doc_count = statistics.doc_count
+        avg_length = statistics.total_length / doc_count or 1
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = statistics.document_frequency.get(term, len(posting))
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            for chunk_id, tf in posting.items():
+                length_ratio = self.chunks[chunk_id]["length"] / avg_length
+                norm = self.k1 * (1 - self.b + self.b * length_ratio)
+                score = idf * tf * (self.k1 + 1) / (tf + norm)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + score
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+class LexicalIndexManager:
+    """One BM25 index per document, kept as an append-only ``{doc_id}.jsonl``
+    of chunks. Writers only append; readers index the rows added since they
+    last looked, so nothing is re-tokenized while a document is ingested."""
+
+    def __init__(self, index_dir=config.LEXICAL_INDEX_DIR):
+        self.index_dir = index_dir
+        self.lock = threading.Lock()
+        # doc_id -> (index, file inode, bytes already indexed)
+        self.indexes: Dict[str, Tuple[BM25Index, int, int]] = {}
+        os.makedirs(index_dir, exist_ok=True)
+
+    def _path(self, doc_id: str) -> str:
+        return os.path.join(self.index_dir, f"{doc_id}.jsonl")
+
+    def _load(self, doc_id: str) -> BM25Index:
+        try:
+            stat = os.stat(self._path(doc_id))
+        except FileNotFoundError:
+            self.indexes.pop(doc_id, None)
+            return BM25Index()
+        cached = self.indexes.get(doc_id)
+        if cached is None or cached[1] != stat.st_ino or cached[2] > stat.st_size:
+            cached = (BM25Index(), stat.st_ino, 0)
+        index, inode, offset = cached
+        if offset < stat.st_size:
+            with open(self._path(doc_id), "rb") as f:
+                f.seek(offset)
+                data = f.read(stat.st_size - offset)
+            # A row still being appended is picked up on the next read.
+            data = data[: data.rfind(b"\n") + 1]
+            for line in data.splitlines():
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                index.add(row["id"], row["text"], row["file_name"])
+            offset += len(data)
+        self.indexes[doc_id] = (index, inode, offset)
+        return index
+
+    def add_chunks(self, doc_id: str, chunk_ids: Sequence[str], chunks: Sequence[Dict]):
+        data = "".join(
+            json.dumps(
+                {
+                    "id": chunk_id,
+                    "text": chunk["content"],
+                    "file_name": chunk["metadata"]["file_name"],
+                }
+            )
+            + "\n"
+            for chunk_id, chunk in zip(chunk_ids, chunks)
+        ).encode()
+        # A single O_APPEND write keeps concurrent writers' rows whole.
+        fd = os.open(self._path(doc_id), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    def document_ids(self) -> List[str]:
+        return [
+            name[: -len(".jsonl")]
+            for name in os.listdir(self.index_dir)
+            if name.endswith(".jsonl")
+        ]
+
+    def remove_document(self, doc_id: str):
+        with self.lock:
+            self.indexes.pop(doc_id, None)
+            try:
+                os.remove(self._path(doc_id))
+            except FileNotFoundError:
+                pass
+
+    def search(self, doc_ids: Iterable[str], query: str, k: int) -> List[Document]:
+        terms = set(tokenize(query))
+        with self.lock:
+            indexes = {doc_id: self._load(doc_id) for doc_id in doc_ids}
+            # Scored with statistics over all of the session's documents so
+            # chunks from different documents are ranked on the same scale.
+            statistics = CorpusStatistics(
+                sum(len(index.chunks) for index in indexes.values()),
+                sum(index.total_length for index in indexes.values()),
+                {
+                    term: sum(
+                        len(index.postings.get(term, ())) for index in indexes.values()
+                    )
+                    for term in terms
+                },
+            )
+            results = [
+                (score, doc_id, chunk_id, index.chunks[chunk_id])
+                for doc_id, index in indexes.items()
+                for chunk_id, score in index.search(query, k, statistics)
+            ]
+        results.sort(key=lambda result: result[0], reverse=True)
+        return [
+            Document(
+                id=chunk_id,
+                page_content=chunk["text"],
+                metadata={"doc_id": doc_id, "file_name": chunk["file_name"]},
+            )
+            for _, doc_id, chunk_id, chunk in results[:k]
+        ]
+
+
+def reciprocal_rank_fusion(
+    result_lists: Sequence[Sequence[Document]], k: int, rrf_k: int = config.RRF_K
+) -> List[Document]:
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = doc.id or doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            documents.setdefault(key, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [documents[key] for key in ranked[:k]]
+
+
+_lexical_index: Optional[LexicalIndexManager] = None
+
+
+def get_lexical_index() -> Optional[LexicalIndexManager]:
+    global _lexical_index
+    if not config.HYBRID_SEARCH:
+        return None
+    if _lexical_index is None:
+        _lexical_index = LexicalIndexManager()
+    return _lexical_index
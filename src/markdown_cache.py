@@ -0,0 +1,85 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from importlib.metadata import version
+from typing import List, Optional
+import config
+
+CONVERTER_VERSION = f"pymupdf4llm-{version('pymupdf4llm')}"
+
+
+class MarkdownCache:
+    def __init__(
+        self,
+        db_path=config.MARKDOWN_CACHE_PATH,
+        max_bytes: int = config.MARKDOWN_CACHE_MAX_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS markdown ("
+            "key TEXT PRIMARY KEY, pages BLOB NOT NULL, "
+            "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS markdown_last_access ON markdown (last_access)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def _key(content_hash: str) -> str:
+        return f"{content_hash}:{CONVERTER_VERSION}"
+
+    def get(self, content_hash: str) -> Optional[List[str]]:
+        key = self._key(content_hash)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT pages FROM markdown WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE markdown SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self.conn.commit()
+        return json.loads(zlib.decompress(row[0]))
+
+    def set(self, content_hash: str, pages: List[str]):
+        blob = zlib.compress(json.dumps(pages).encode(), 6)
+        if len(blob) > self.max_bytes:
+            return
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO markdown (key, pages, size, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (self._key(content_hash), blob, len(blob), time.time()),
+            )
+            (total,) = self.conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM markdown"
+            ).fetchone()
+            if total > self.max_bytes:
+                evicted = 0
+                for key, size in self.conn.execute(
+                    "SELECT key, size FROM markdown ORDER BY last_access"
+                ).fetchall():
+                    if total - evicted <= self.max_bytes:
+                        break
+                    self.conn.execute("DELETE FROM markdown WHERE key = ?", (key,))
+                    evicted += size
+            self.conn.commit()
+
+
+_markdown_cache = None
+
+
+def get_markdown_cache():
+    global _markdown_cache
+    if _markdown_cache is None:
+        _markdown_cache = MarkdownCache()
+    return _markdown_cache
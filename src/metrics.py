@@ -0,0 +1,193 @@
+import bisect
+import functools
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+import config
+
+logger = logging.getLogger("rag.metrics")
+
+DURATION_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+LABEL_TAGS = ("backend",)
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class MetricsRegistry:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters: Dict[LabelKey, float] = {}
+        self.histograms: Dict[LabelKey, list] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> LabelKey:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @staticmethod
+    def _format_labels(labels, extra=()) -> str:
+        pairs = [*labels, *extra]
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(
+                (key, (list(h[0]), h[1], h[2])) for key, h in self.histograms.items()
+            )
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{self._format_labels(labels)} {value}")
+        for (name, labels), (bucket_counts, total, count) in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                le = self._format_labels(labels, [("le", bound)])
+                lines.append(f"{name}_bucket{le} {cumulative}")
+            le = self._format_labels(labels, [("le", "+Inf")])
+            lines.append(f"{name}_bucket{le} {count}")
+            lines.append(f"{name}_sum{self._format_labels(labels)} {total}")
+            lines.append(f"{name}_count{self._format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def record(stage: str, seconds: float, error: bool = False, **tags):
+    labels = {"stage": stage, **{k: tags[k] for k in LABEL_TAGS if k in tags}}
+    registry.observe("rag_stage_duration_seconds", seconds, **labels)
+    if error:
+        registry.inc("rag_stage_errors_total", **labels)
+    if tags.get("chunk_count"):
+        registry.inc("rag_stage_chunks_total", tags["chunk_count"], **labels)
+    if tags.get("file_size"):
+        registry.inc("rag_stage_bytes_total", tags["file_size"], **labels)
+    if config.METRICS_LOG:
+        logger.info(
+            json.dumps(
+                {
+                    "stage": stage,
+                    "duration_ms": round(seconds * 1000, 3),
+                    "error": error,
+                    **tags,
+                },
+                default=str,
+            )
+        )
+
+
+@contextmanager
+def timed(stage: str, **tags):
+    start = time.perf_counter()
+    error = False
+    try:
+        yield tags
+    except BaseException:
+        error = True
+        raise
+    finally:
+        record(stage, time.perf_counter() - start, error, **tags)
+
+
+def instrumented(stage: str):
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            tags = {"backend": type(self).__name__}
+            if args:
+                tags["session_id"] = args[0]
+            with timed(stage, **tags):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_server = None
+_server_failed = False
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(
+    port: int = config.METRICS_PORT, host: str = config.METRICS_HOST
+):
+    global _server, _server_failed
+    if not port:
+        return None
+    with _server_lock:
+        # Streamlit calls this on every rerun; a port another process holds
+        # is only tried once.
+        if _server is None and not _server_failed:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError:
+                logger.warning("Metrics server could not bind %s:%s", host, port)
+                _server_failed = True
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
@@ -0,0 +1,72 @@
+import argparse
+from typing import Dict
+import config
+from resources import get_vector_manager
+
+
+def migrate(vectorstore, batch_size=config.VECTORSTORE_BATCH_SIZE, dry_run=False):
+    stats: Dict[str, int] = {"moved": 0, "kept": 0, "documents": 0}
+    legacy = vectorstore.base_collection()
+    if legacy is None:
+        return stats
+
+    documents = set()
+    offset = 0
+    while True:
+        page = legacy.get(
+            include=["embeddings", "documents", "metadatas"],
+            limit=batch_size,
+            offset=offset,
+        )
+        if not page["ids"]:
+            if not dry_run and not stats["kept"]:
+                # An empty legacy collection would still be searched on
+                # every query.
+                vectorstore.delete_shard(vectorstore.base_name)
+            return {**stats, "documents": len(documents)}
+        positions = [
+            i
+            for i, metadata in enumerate(page["metadatas"])
+            if metadata and metadata.get("doc_id")
+        ]
+        stats["kept"] += len(page["ids"]) - len(positions)
+        stats["moved"] += len(positions)
+        documents.update(page["metadatas"][i]["doc_id"] for i in positions)
+        # Moved chunks leave the legacy collection, so the next page starts
+        # after the ones that stay.
+        offset += len(page["ids"]) - (0 if dry_run else len(positions))
+        if dry_run or not positions:
+            continue
+        moved_ids = [page["ids"][i] for i in positions]
+        vectorstore.upsert(
+            ids=moved_ids,
+            embeddings=[page["embeddings"][i] for i in positions],
+            documents=[page["documents"][i] for i in positions],
+            metadatas=[page["metadatas"][i] for i in positions],
+        )
+        legacy.delete(ids=moved_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Move chunks from the single legacy ChromaDB collection into "
+        "per-document (or VECTOR_SHARDS hashed) collections. Embeddings are "
+        "copied, nothing is re-embedded."
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only report how many chunks would be moved.",
+    )
+    args = parser.parse_args()
+
+    stats = migrate(get_vector_manager().vectorstore, dry_run=args.dry_run)
+    print(
+        f"{'Would move' if args.dry_run else 'Moved'} {stats['moved']} chunk(s) "
+        f"of {stats['documents']} document(s) into shards; {stats['kept']} chunk(s) "
+        "without a document id stay in the legacy collection (re-upload to move them)."
+    )
+
+
+if __name__ == "__main__":
+    main()
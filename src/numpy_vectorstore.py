@@ -0,0 +1,348 @@
+import fcntl
+import json
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+import numpy as np
+import config
+from embeddings import embedding_backend_id
+from factories import ChromaDBInterface
+from vectorstore import _collection_name, _doc_id
+
+MAX_OPEN_DOCUMENTS = 256
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+
+class DocumentVectors:
+    """Read-only view of one document's files; the vectors stay memory-mapped
+    so processes reading the same document share it through the page cache."""
+
+    def __init__(self, directory: str, dim: int, dtype: str, rows: int):
+        self.dim = dim
+        self.dtype = dtype
+        lines = []
+        with open(os.path.join(directory, "chunks.jsonl"), "r") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                lines.append(json.loads(line))
+        rows = min(rows, len(lines))
+        row_ids = [line["id"] for line in lines[:rows]]
+        # Rows are append-only; a re-written chunk id supersedes older rows.
+        latest = {chunk_id: row for row, chunk_id in enumerate(row_ids)}
+        self.rows = np.fromiter(sorted(latest.values()), dtype=np.int64)
+        self.ids = [row_ids[row] for row in self.rows]
+        self.documents = [lines[row]["document"] for row in self.rows]
+        self.metadatas = [lines[row]["metadata"] for row in self.rows]
+        self.positions = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        if rows:
+            self.vectors = np.memmap(
+                os.path.join(directory, "vectors.bin"),
+                dtype=DTYPES[dtype],
+                mode="r",
+                shape=(rows, dim),
+            )
+            self.stats = np.memmap(
+                os.path.join(directory, "stats.bin"),
+                dtype=np.float32,
+                mode="r",
+                shape=(rows, 2),
+            )
+        else:
+            self.vectors = np.zeros((0, dim), dtype=DTYPES[dtype])
+            self.stats = np.zeros((0, 2), dtype=np.float32)
+
+    def decode(self, positions) -> np.ndarray:
+        rows = self.rows[positions]
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.dtype == "int8":
+            vectors *= self.stats[rows, 0][:, None]
+        return vectors
+
+    def distances(self, query: np.ndarray) -> np.ndarray:
+        vectors, stats = self.vectors, self.stats
+        if len(self.rows) < len(vectors):
+            vectors, stats = vectors[self.rows], stats[self.rows]
+        products = np.asarray(vectors, dtype=np.float32) @ query
+        if self.dtype == "int8":
+            products *= stats[:, 0]
+        # Squared L2, the same metric as the Chroma collections.
+        return stats[:, 1] - 2 * products + float(query @ query)
+
+
+class NumpyVectorStore:
+    """Each document's vectors in a compact memory-mapped file, searched
+    exactly with one matrix product per document.
+
+    Chunks are appended to ``vectors.bin`` (float32, float16 or int8 with a
+    per-row scale), ``stats.bin`` (scale and squared norm per row) and
+    ``chunks.jsonl`` (id, text and metadata); the JSONL line is written last,
+    so a row only becomes visible once all three are on disk. A writer that
+    died part-way leaves rows without a JSONL line behind, which the next
+    writer cuts off before appending so the files stay aligned row by row.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        embeddings,
+        dtype: str = config.NUMPY_VECTOR_DTYPE,
+        family_name: Optional[str] = None,
+    ):
+        self.root = root
+        self.family_name = family_name or os.path.basename(root)
+        self.embeddings = embeddings
+        self.dtype = dtype
+        self.lock = threading.Lock()
+        self._documents: "OrderedDict[str, tuple]" = OrderedDict()
+        os.makedirs(root, exist_ok=True)
+
+    def close(self):
+        """Drop the memory-mapped documents held open by this store."""
+        with self.lock:
+            self._documents.clear()
+
+    def shard_name(self, doc_id: str) -> str:
+        return re.sub(r"[^a-zA-Z0-9_-]+", "-", doc_id)
+
+    def _directory(self, doc_id: str) -> str:
+        return os.path.join(self.root, self.shard_name(doc_id))
+
+    @contextmanager
+    def _write_lock(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_meta(self, directory: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(directory, "meta.json"), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, directory: str, dim: int) -> Dict[str, Any]:
+        backend_id = embedding_backend_id()
+        meta = self._read_meta(directory)
+        if meta is None:
+            meta = {"dim": dim, "dtype": self.dtype, "embedding_backend": backend_id}
+            with open(os.path.join(directory, "meta.json"), "w") as f:
+                json.dump(meta, f)
+        elif meta["embedding_backend"] != backend_id:
+            raise ValueError(
+                f"'{directory}' holds embeddings from "
+                f"'{meta['embedding_backend']}', not '{backend_id}'"
+            )
+        return meta
+
+    def _truncate_to_committed(self, directory: str, meta: Dict[str, Any]):
+        jsonl_path = os.path.join(directory, "chunks.jsonl")
+        committed = rows = 0
+        try:
+            with open(jsonl_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    committed += len(line)
+                    rows += 1
+        except FileNotFoundError:
+            pass
+        row_bytes = meta["dim"] * np.dtype(DTYPES[meta["dtype"]]).itemsize
+        for name, size in (
+            ("chunks.jsonl", committed),
+            ("vectors.bin", rows * row_bytes),
+            ("stats.bin", rows * 8),
+        ):
+            path = os.path.join(directory, name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+
+    def _encode(self, vectors: np.ndarray, dtype: str):
+        norms = np.einsum("ij,ij->i", vectors, vectors)
+        if dtype != "int8":
+            return vectors.astype(DTYPES[dtype]), np.ones_like(norms), norms
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+        return quantized, scales.astype(np.float32), norms
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        by_document: Dict[str, List[int]] = {}
+        for position, metadata in enumerate(metadatas):
+            by_document.setdefault(metadata["doc_id"], []).append(position)
+        for doc_id, positions in by_document.items():
+            directory = self._directory(doc_id)
+            vectors = np.asarray([embeddings[i] for i in positions], dtype=np.float32)
+            with self._write_lock(directory):
+                meta = self._write_meta(directory, vectors.shape[1])
+                self._truncate_to_committed(directory, meta)
+                encoded, scales, norms = self._encode(vectors, meta["dtype"])
+                with open(os.path.join(directory, "vectors.bin"), "ab") as f:
+                    f.write(encoded.tobytes())
+                with open(os.path.join(directory, "stats.bin"), "ab") as f:
+                    f.write(
+                        np.column_stack([scales, norms]).astype(np.float32).tobytes()
+                    )
+                with open(os.path.join(directory, "chunks.jsonl"), "a") as f:
+                    f.writelines(
+                        json.dumps(
+                            {
+                                "id": ids[i],
+                                "document": documents[i],
+                                "metadata": metadatas[i],
+                            }
+                        )
+                        + "\n"
+                        for i in positions
+                    )
+
+    def _open(self, doc_id: str) -> Optional[DocumentVectors]:
+        directory = self._directory(doc_id)
+        try:
+            stamp = os.stat(os.path.join(directory, "chunks.jsonl"))
+        except FileNotFoundError:
+            return None
+        stamp = (stamp.st_size, stamp.st_mtime_ns)
+        with self.lock:
+            cached = self._documents.get(doc_id)
+            if cached is not None and cached[0] == stamp:
+                self._documents.move_to_end(doc_id)
+                return cached[1]
+        meta = self._read_meta(directory)
+        row_bytes = meta["dim"] * np.dtype(DTYPES[meta["dtype"]]).itemsize
+        rows = min(
+            os.path.getsize(os.path.join(directory, "vectors.bin")) // row_bytes,
+            os.path.getsize(os.path.join(directory, "stats.bin")) // 8,
+        )
+        document = DocumentVectors(directory, meta["dim"], meta["dtype"], rows)
+        with self.lock:
+            self._documents[doc_id] = (stamp, document)
+            self._documents.move_to_end(doc_id)
+            while len(self._documents) > MAX_OPEN_DOCUMENTS:
+                self._documents.popitem(last=False)
+        return document
+
+    def query(
+        self, query_embedding, k: int, doc_ids=(), where=None
+    ) -> List[Dict[str, Any]]:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        candidates = []
+        for doc_id in doc_ids:
+            document = self._open(doc_id)
+            if document is None or not document.ids:
+                continue
+            distances = document.distances(query)
+            top = np.argpartition(distances, min(k, len(distances)) - 1)[:k]
+            embeddings = document.decode(top)
+            candidates.extend(
+                {
+                    "id": document.ids[i],
+                    "document": document.documents[i],
+                    "metadata": document.metadatas[i],
+                    "embedding": embedding,
+                    "distance": float(distances[i]),
+                }
+                for i, embedding in zip(top, embeddings)
+            )
+        candidates.sort(key=lambda match: match["distance"])
+        return candidates[:k]
+
+    def get_embeddings(self, ids: List[str]) -> Dict[str, Any]:
+        by_document: Dict[str, List[str]] = {}
+        for chunk_id in ids:
+            doc_id = _doc_id(chunk_id)
+            if doc_id:
+                by_document.setdefault(doc_id, []).append(chunk_id)
+        embeddings = {}
+        for doc_id, chunk_ids in by_document.items():
+            document = self._open(doc_id)
+            if document is None:
+                continue
+            found = [c for c in chunk_ids if c in document.positions]
+            positions = [document.positions[c] for c in found]
+            embeddings.update(zip(found, document.decode(positions)))
+        return embeddings
+
+    def delete_shard(self, name: str) -> int:
+        with self.lock:
+            for doc_id in [d for d in self._documents if self.shard_name(d) == name]:
+                del self._documents[doc_id]
+        directory = os.path.join(self.root, name)
+        try:
+            rows = os.path.getsize(os.path.join(directory, "stats.bin")) // 8
+        except FileNotFoundError:
+            rows = 0
+        shutil.rmtree(directory, ignore_errors=True)
+        return rows
+
+    def delete_documents(self, doc_ids: List[str]) -> int:
+        return sum(self.delete_shard(self.shard_name(doc_id)) for doc_id in doc_ids)
+
+    def delete_where(self, where: Dict[str, Any]):
+        # Only chunks from before the document registry are deleted by
+        # metadata, and those never lived in this store.
+        pass
+
+    def base_collection(self):
+        return None
+
+    def shard_names(self) -> List[str]:
+        return sorted(
+            name
+            for name in os.listdir(self.root)
+            if os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def drop_other_backends(self) -> int:
+        """Delete document directories next to this store's that hold another
+        embedding backend's vectors."""
+        backend_id = embedding_backend_id()
+        parent = os.path.dirname(self.root)
+        dropped = 0
+        for root_name in os.listdir(parent):
+            if root_name != self.family_name and not root_name.startswith(
+                f"{self.family_name}-"
+            ):
+                continue
+            root = os.path.join(parent, root_name)
+            if not os.path.isdir(root):
+                continue
+            for name in os.listdir(root):
+                meta = self._read_meta(os.path.join(root, name))
+                if meta is not None and meta["embedding_backend"] != backend_id:
+                    shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+                    dropped += 1
+            if root != self.root and not os.listdir(root):
+                os.rmdir(root)
+        return dropped
+
+    def count(self) -> int:
+        total = 0
+        for name in self.shard_names():
+            try:
+                with open(os.path.join(self.root, name, "chunks.jsonl"), "r") as f:
+                    total += len({json.loads(line)["id"] for line in f})
+            except FileNotFoundError:
+                continue
+        return total
+
+
+class NumpyVectorDB(ChromaDBInterface):
+    def __init__(self, root):
+        self.root = root
+        self.collection_name = "documents"
+
+    def get_vectorstore(self, embed_model, shards=None):
+        return NumpyVectorStore(
+            os.path.join(self.root, _collection_name(self.collection_name)),
+            embed_model,
+            family_name=self.collection_name,
+        )
@@ -1,51 +1,276 @@
+import hashlib
+import multiprocessing
 import os
-from typing import List, Dict, Any
+import time
+from collections import defaultdict, deque
+from itertools import groupby
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple, Union
 import config
+import metrics
+from embeddings import embedding_backend_id
+from markdown_cache import get_markdown_cache
+import pymupdf
 import pymupdf4llm
 from langchain.text_splitter import MarkdownTextSplitter
 
+# A PDF is read either from a file path or straight from an in-memory buffer.
+Source = Union[str, bytes, memoryview]
+
+
+def _open_pdf(source: Source) -> pymupdf.Document:
+    if isinstance(source, str):
+        return pymupdf.open(source)
+    return pymupdf.open(stream=source, filetype="pdf")
+
+
+def _convert_page_range(
+    source: Source, pages: Optional[List[int]]
+) -> Tuple[List[str], float]:
+    start = time.perf_counter()
+    with _open_pdf(source) as doc:
+        page_chunks = pymupdf4llm.to_markdown(doc, pages=pages, page_chunks=True)
+    return [page["text"] for page in page_chunks], time.perf_counter() - start
+
+
+def document_id_for(content_hash: str) -> str:
+    settings = f"{config.CHUNK_SIZE}:{config.CHUNK_OVERLAP}:{embedding_backend_id()}"
+    return f"{content_hash}-{hashlib.sha256(settings.encode()).hexdigest()[:8]}"
+
 
 class DocumentProcessor:
-    def __init__(self, data_dir: str):
+    def __init__(
+        self,
+        data_dir: str,
+        workers: int = config.PDF_WORKERS,
+        pages_per_task: int = config.PDF_PAGES_PER_TASK,
+        timeout: float = config.PDF_CONVERSION_TIMEOUT,
+        markdown_cache=None,
+        max_cached_chars: int = config.MARKDOWN_CACHE_MAX_DOCUMENT_CHARS,
+    ):
         self.data_dir = data_dir
+        self.markdown_cache = markdown_cache or get_markdown_cache()
+        self.max_cached_chars = max_cached_chars
+        self._content_hashes: Dict[str, str] = {}
+        self.sources: Dict[str, Source] = {}
+        self.workers = workers
+        self.pages_per_task = pages_per_task
+        self.timeout = timeout
+        self.splitter = MarkdownTextSplitter(
+            chunk_size=config.CHUNK_SIZE, chunk_overlap=config.CHUNK_OVERLAP
+        )
+
+    def add_source(self, file_name: str, source: Source):
+        """Read ``file_name`` from ``source`` (a path or the PDF bytes)
+        instead of ``data_dir``."""
+        self.sources[file_name] = source
+        self._content_hashes.pop(file_name, None)
+
+    def _source(self, file_name: str) -> Source:
+        source = self.sources.get(file_name)
+        if source is None:
+            source = os.path.join(self.data_dir, file_name)
+        return source
+
+    def _page_ranges(self, source: Source) -> List[List[int]]:
+        with _open_pdf(source) as doc:
+            page_count = doc.page_count
+        return [
+            list(range(start, min(start + self.pages_per_task, page_count)))
+            for start in range(0, page_count, self.pages_per_task)
+        ]
+
+    def _file_size(self, file_name: str) -> int:
+        source = self._source(file_name)
+        if isinstance(source, str):
+            return os.path.getsize(source)
+        return len(source)
+
+    def _record_conversion(
+        self, file_name: str, pages: Optional[List[int]], seconds: float
+    ):
+        first_range = not pages or pages[0] == 0
+        metrics.record(
+            "pdf_to_markdown",
+            seconds,
+            file_name=file_name,
+            file_size=self._file_size(file_name) if first_range else None,
+            pages=len(pages) if pages is not None else None,
+            workers=self.workers,
+        )
+
+    def _pdf_to_markdown(
+        self, file_name: str, pages: Optional[List[int]] = None
+    ) -> List[str]:
+        page_texts, seconds = _convert_page_range(self._source(file_name), pages)
+        self._record_conversion(file_name, pages, seconds)
+        return page_texts
+
+    def group_pages(self, page_texts: List[str]) -> Iterator[str]:
+        """Join cached pages into the same page ranges a fresh conversion
+        yields, so chunk boundaries don't depend on whether it was cached."""
+        for start in range(0, len(page_texts), self.pages_per_task):
+            yield "".join(page_texts[start : start + self.pages_per_task])
+
+    def _iter_markdown(self, file_names: List[str]) -> Iterator[Tuple[str, str]]:
+        to_convert = []
+        for file_name in file_names:
+            page_texts = self.markdown_cache.get(self.content_hash(file_name))
+            if page_texts is None:
+                to_convert.append(file_name)
+            else:
+                for md_text in self.group_pages(page_texts):
+                    yield file_name, md_text
+        # Pages are kept for the cache until the document is complete; one
+        # that outgrows max_cached_chars is not cached, so its pages are let go.
+        converted: Dict[str, Optional[List[str]]] = {}
+        sizes = defaultdict(int)
+        for file_name, page_texts, is_last in self._convert_pages(to_convert):
+            pages = converted.setdefault(file_name, [])
+            if pages is not None:
+                sizes[file_name] += sum(len(text) for text in page_texts)
+                if sizes[file_name] > self.max_cached_chars:
+                    converted[file_name] = None
+                else:
+                    pages.extend(page_texts)
+            if is_last:
+                sizes.pop(file_name, None)
+                pages = converted.pop(file_name)
+                if pages is not None:
+                    self.markdown_cache.set(self.content_hash(file_name), pages)
+            yield file_name, "".join(page_texts)
+
+    def _convert_pages(
+        self, file_names: List[str]
+    ) -> Iterator[Tuple[str, List[str], bool]]:
+        tasks = [
+            (file_name, pages)
+            for file_name in file_names
+            for pages in self._page_ranges(self._source(file_name))
+        ]
+        last_tasks = {file_name: index for index, (file_name, _) in enumerate(tasks)}
+        if self.workers <= 1 or len(tasks) <= 1:
+            for index, (file_name, pages) in enumerate(tasks):
+                page_texts = self._pdf_to_markdown(file_name, pages)
+                yield file_name, page_texts, index == last_tasks[file_name]
+            return
+
+        # Worker processes get in-memory PDFs pickled with each task; a
+        # memoryview can't be pickled, so it is turned into bytes once per file.
+        task_sources = {}
+        for file_name in file_names:
+            source = self._source(file_name)
+            if isinstance(source, memoryview):
+                source = bytes(source)
+            task_sources[file_name] = source
+        # Each call gets its own pool, so terminating it when a conversion
+        # hangs (or the caller stops early) only affects this call's files.
+        pool = multiprocessing.get_context("spawn").Pool(min(self.workers, len(tasks)))
+        try:
+            waited = defaultdict(float)
+            in_flight = deque()
+            for index, (file_name, pages) in enumerate(tasks):
+                result = pool.apply_async(
+                    _convert_page_range, (task_sources[file_name], pages)
+                )
+                is_last = index == last_tasks[file_name]
+                in_flight.append((file_name, pages, result, is_last))
+                if len(in_flight) >= self.workers * 2:
+                    yield self._wait_for_markdown(*in_flight.popleft(), waited)
+            while in_flight:
+                yield self._wait_for_markdown(*in_flight.popleft(), waited)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _wait_for_markdown(
+        self, file_name: str, pages: List[int], result, is_last: bool, waited
+    ) -> Tuple[str, List[str], bool]:
+        started = time.monotonic()
+        try:
+            page_texts, seconds = result.get(
+                timeout=max(self.timeout - waited[file_name], 0)
+            )
+        except multiprocessing.TimeoutError:
+            raise TimeoutError(
+                f"Converting {file_name} took longer than {self.timeout}s"
+            ) from None
+        waited[file_name] += time.monotonic() - started
+        self._record_conversion(file_name, pages, seconds)
+        return file_name, page_texts, is_last
 
-    def _pdf_to_markdown(self, file_path: str) -> str:
-        md_text = pymupdf4llm.to_markdown(file_path)
-        return md_text
+    def content_hash(self, file_name: str) -> str:
+        if file_name not in self._content_hashes:
+            source = self._source(file_name)
+            if isinstance(source, str):
+                digest = hashlib.sha256()
+                with open(source, "rb") as f:
+                    for block in iter(lambda: f.read(1 << 20), b""):
+                        digest.update(block)
+            else:
+                digest = hashlib.sha256(source)
+            self._content_hashes[file_name] = digest.hexdigest()[:32]
+        return self._content_hashes[file_name]
+
+    def document_id(self, file_name: str) -> str:
+        return document_id_for(self.content_hash(file_name))
 
     def _markdown_to_chunks(
-        self, md_text: str, source_file: str, session_id: str
+        self, md_text: str, source_file: str, doc_id: str, first_index: int
     ) -> List[Dict[str, Any]]:
-        splitter = MarkdownTextSplitter(
-            chunk_size=config.CHUNK_SIZE, chunk_overlap=config.CHUNK_OVERLAP
-        )
-        documents = splitter.create_documents([md_text])
+        with metrics.timed(
+            "markdown_to_chunks", doc_id=doc_id, file_name=source_file
+        ) as tags:
+            documents = self.splitter.create_documents([md_text])
+            tags["chunk_count"] = len(documents)
         return [
             {
                 "content": doc.page_content,
                 "metadata": {
                     "source": source_file,
-                    "session_id": session_id,
                     "file_name": source_file,
+                    "doc_id": doc_id,
+                    "chunk_index": first_index + i,
                 },
             }
-            for doc in documents
+            for i, doc in enumerate(documents)
         ]
 
-    def process_new_files(
-        self, new_files: List[str], session_id: str
-    ) -> List[Dict[str, Any]]:
-        all_chunks = []
-        for file_name in new_files:
-            file_path = os.path.join(self.data_dir, file_name)
-            md_text = self._pdf_to_markdown(file_path)
-            file_chunks = self._markdown_to_chunks(md_text, file_name, session_id)
-            all_chunks.extend(file_chunks)
-        return all_chunks
+    def chunk_markdown(
+        self, md_texts: Iterable[str], file_name: str, doc_id: str
+    ) -> Iterator[Dict[str, Any]]:
+        carry = ""
+        emitted = 0
+        for md_text in md_texts:
+            chunks = self._markdown_to_chunks(
+                f"{carry}\n\n{md_text}" if carry else md_text,
+                file_name,
+                doc_id,
+                emitted,
+            )
+            carry = chunks.pop()["content"] if chunks else ""
+            emitted += len(chunks)
+            yield from chunks
+        if carry:
+            yield from self._markdown_to_chunks(carry, file_name, doc_id, emitted)
+
+    def iter_chunks(self, documents: Dict[str, str]) -> Iterator[Dict[str, Any]]:
+        for file_name, md_pages in groupby(
+            self._iter_markdown(list(documents)), key=lambda item: item[0]
+        ):
+            yield from self.chunk_markdown(
+                (md_text for _, md_text in md_pages), file_name, documents[file_name]
+            )
+
+    def process_new_files(self, documents: Dict[str, str]) -> List[Dict[str, Any]]:
+        return list(self.iter_chunks(documents))
 
     def delete_processed_files(self, file_names: List[str]) -> None:
         for file_name in file_names:
-            file_path = os.path.join(self.data_dir, file_name)
+            file_path = self.sources.pop(file_name, None)
+            if file_path is None:
+                file_path = os.path.join(self.data_dir, file_name)
+            elif not isinstance(file_path, str):
+                continue
             try:
                 if os.path.exists(file_path):
                     os.remove(file_path)
@@ -9,8 +9,10 @@ SYSTEM_PROMPT = (
     "Give short and concise answers. Be very strict and concise."
 )
 
-AUGMENTED_PROMPT = (
-    "Answer the following question using the context provided below. "
+CONTEXT_PROMPT = (
+    "Answer the user's questions using the context provided below. "
     "IMPORTANT: Respond in the EXACT same language as the question."
-    "\n\nContext:\n{context}\n\nQuestion: {query}\n\nAnswer:"
+    "\n\nContext:\n{context}"
 )
+
+SUMMARY_PROMPT = "Summary of the earlier conversation:\n{summary}"
@@ -0,0 +1,105 @@
+import argparse
+import os
+from collections import defaultdict
+from typing import Dict
+import config
+from markdown_cache import get_markdown_cache
+from processing import DocumentProcessor, document_id_for
+from resources import get_vector_manager
+
+
+def reindex(vector_manager, processor, markdown_cache, dry_run=False) -> Dict[str, int]:
+    registry = vector_manager.document_registry
+    references = defaultdict(list)
+    for session_id, file_name, doc_id in registry.get_references():
+        references[doc_id].append((session_id, file_name))
+
+    visible = {
+        (session_id, file_name)
+        for session_id in {s for refs in references.values() for s, _ in refs}
+        for file_name in registry.get_session_documents(session_id)
+    }
+
+    stats = {
+        "reindexed": 0,
+        "up_to_date": 0,
+        "not_cached": 0,
+        "chunks": 0,
+        "dropped_collections": 0,
+    }
+    for doc_id, doc_references in references.items():
+        content_hash = doc_id.split("-")[0]
+        new_doc_id = document_id_for(content_hash)
+        # An interrupted run leaves references on a document that was never
+        # marked stored; those are picked up again.
+        if new_doc_id == doc_id and all(ref in visible for ref in doc_references):
+            stats["up_to_date"] += 1
+            continue
+        page_texts = markdown_cache.get(content_hash)
+        if page_texts is None:
+            stats["not_cached"] += 1
+            continue
+        stats["reindexed"] += 1
+        if dry_run:
+            continue
+
+        # References move to the new document before its chunks are written,
+        # so the garbage collector never finds them unreferenced.
+        stored = [
+            vector_manager.attach_document(session_id, file_name, new_doc_id)
+            for session_id, file_name in doc_references
+        ]
+        if not any(stored):
+            stats["chunks"] += vector_manager.add_chunk_stream(
+                processor.chunk_markdown(
+                    processor.group_pages(page_texts),
+                    doc_references[0][1],
+                    new_doc_id,
+                )
+            )
+            for session_id in {session_id for session_id, _ in doc_references}:
+                vector_manager.mark_documents_stored(session_id, [new_doc_id])
+        if new_doc_id != doc_id:
+            vector_manager.drop_documents([doc_id])
+
+    # Vectors from the previous backend are only dropped once every document
+    # has been rebuilt; documents that need a re-upload still point at them.
+    if not dry_run and not stats["not_cached"]:
+        stats["dropped_collections"] = vector_manager.vectorstore.drop_other_backends()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Re-chunk and re-embed every stored document from the markdown "
+        "cache after a CHUNK_SIZE/CHUNK_OVERLAP or embedding backend change."
+    )
+    parser.add_argument(
+        "--openai-api-key",
+        default=os.getenv("OPENAI_API_KEY"),
+        help="Needed with the openai embedding backend (default: $OPENAI_API_KEY).",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only report which documents would be re-indexed.",
+    )
+    args = parser.parse_args()
+
+    stats = reindex(
+        get_vector_manager(args.openai_api_key),
+        DocumentProcessor(config.DATA_DIR),
+        get_markdown_cache(),
+        dry_run=args.dry_run,
+    )
+    print(
+        f"Re-indexed {stats['reindexed']} document(s) into {stats['chunks']} chunks; "
+        f"{stats['up_to_date']} already up to date, "
+        f"{stats['not_cached']} not in the markdown cache (re-upload needed); "
+        f"dropped {stats['dropped_collections']} collection(s) of other embedding "
+        "backends."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import config
+from answer_cache import get_answer_cache
+from embedding_cache import CachedEmbeddings, get_embedding_cache
+from embeddings import create_embeddings, embedding_backend_id
+from lexical_index import get_lexical_index
+from utils.resource_pool import shared_pool
+
+
+def get_embed_model(openai_api_key):
+    backend_id = embedding_backend_id()
+    if config.EMBEDDING_BACKEND != "openai":
+        openai_api_key = None
+
+    def create():
+        embeddings = create_embeddings(openai_api_key)
+        if config.EMBEDDING_BACKEND == "hashing":
+            return embeddings
+        # OpenAI vectors keep the bare model name as their cache namespace so
+        # entries cached before backends were pluggable stay valid.
+        namespace = backend_id
+        if config.EMBEDDING_BACKEND == "openai":
+            namespace = config.EMBEDDING_MODEL
+        return CachedEmbeddings(embeddings, get_embedding_cache(), namespace)
+
+    return shared_pool.get(("embeddings", backend_id, openai_api_key), create)
+
+
+def get_vector_manager(openai_api_key=None):
+    def create():
+        # Deferred so chromadb only loads once something is stored or retrieved.
+        from vectorstore import get_vectorstore, VectorStoreManager
+
+        embed_model = (
+            get_embed_model(openai_api_key)
+            if openai_api_key or config.EMBEDDING_BACKEND != "openai"
+            else None
+        )
+        return VectorStoreManager(
+            get_vectorstore(embed_model),
+            lexical_index=get_lexical_index(),
+            answer_cache=get_answer_cache(),
+        )
+
+    # Evicted managers stop their query threads; anything still holding one
+    # falls back to querying shards serially.
+    return shared_pool.get(
+        ("vector_manager", openai_api_key), create, close=lambda m: m.close()
+    )
+
+
+def create_chatbot(openai_api_key, session_id, memory=None):
+    from chatbot import ChatBot
+
+    vector_manager = get_vector_manager(openai_api_key)
+    return ChatBot(
+        vectorstore=vector_manager.vectorstore,
+        openai_api_key=openai_api_key,
+        session_id=session_id,
+        lexical_index=vector_manager.lexical_index,
+        answer_cache=vector_manager.answer_cache,
+        document_registry=vector_manager.document_registry,
+        memory=memory,
+    )
@@ -1,17 +1,14 @@
 import streamlit as st
-import openai
 from streamlit_local_storage import LocalStorage
 
 
 class AuthService:
-    def __init__(self):
-        self.local_storage = LocalStorage()
+    # Holds no state of its own (that lives in st.session_state and the
+    # browser's local storage), so one instance serves every session.
 
     def initialize_api_key(self):
         if "openai_api_key" not in st.session_state:
-            st.session_state.openai_api_key = self.local_storage.getItem(
-                "openai_api_key"
-            )
+            st.session_state.openai_api_key = LocalStorage().getItem("openai_api_key")
 
     def render_api_key_input(self):
         openai_api_key = st.sidebar.text_input(
@@ -24,7 +21,7 @@ class AuthService:
     def validate_and_set_api_key(self, api_key):
         if api_key:
             if api_key != st.session_state.openai_api_key:
-                self.local_storage.setItem("openai_api_key", api_key)
+                LocalStorage().setItem("openai_api_key", api_key)
                 st.session_state.openai_api_key = api_key
 
             if not api_key.startswith("sk-"):
@@ -33,6 +30,8 @@ class AuthService:
                 )
                 return False
 
+            import openai
+
             openai.api_key = api_key
             return True
         else:
@@ -41,3 +40,13 @@ class AuthService:
 
     def get_current_api_key(self):
         return st.session_state.get("openai_api_key")
+
+
+_auth_service = None
+
+
+def get_auth_service():
+    global _auth_service
+    if _auth_service is None:
+        _auth_service = AuthService()
+    return _auth_service
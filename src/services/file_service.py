@@ -1,87 +1,124 @@
-import os
 import streamlit as st
-from langchain_openai import OpenAIEmbeddings
-from processing import DocumentProcessor
-from vectorstore import get_vectorstore, VectorStoreManager
-from chatbot import ChatBot
+from jobs import ACTIVE_STATUSES, FAILED
+from services.session_service import get_session_service
+from uploads import job_statuses, queue_uploads
 import config
 
 
 class FileService:
-    def __init__(self, session_service):
+    """Uploads, ingestion status and chatbots for the current session, either
+    in-process or, with ``API_URL`` set, through the HTTP API."""
+
+    def __init__(self, session_service, api_client=None):
         self.session_service = session_service
+        self.api_client = api_client
 
     def process_uploaded_files(self, uploaded_files, openai_api_key):
         if not uploaded_files:
             return None
 
-        files_to_process = []
-        for uploaded_file in uploaded_files:
-            if self.session_service.can_add_file():
-                if self.session_service.add_file_to_session(uploaded_file.name):
-                    files_to_process.append(uploaded_file)
-            else:
-                st.sidebar.error(
-                    f"Cannot upload {uploaded_file.name}: maximum files limit reached"
+        # The uploader hands back every file on each rerun. A file whose job
+        # failed is only queued again once it is uploaded again, which gives
+        # it a new file id.
+        queued_ids = st.session_state.setdefault("queued_upload_ids", set())
+        uploaded_files = [f for f in uploaded_files if f.file_id not in queued_ids]
+        if not uploaded_files:
+            return False
+
+        session_id = self.session_service.get_current_session_id()
+        if self.api_client is None:
+            result = queue_uploads(
+                session_id,
+                {f.name: f.getbuffer() for f in uploaded_files},
+                openai_api_key,
+            )
+        else:
+            # Only send the files the API doesn't know about yet.
+            states = self.api_client.file_states(session_id)
+            new_files = [
+                f
+                for f in uploaded_files
+                if not (
+                    states.get(f.name, {}).get("processed")
+                    or states.get(f.name, {}).get("status") not in (None, FAILED)
                 )
+            ]
+            if not new_files:
+                return False
+            result = self.api_client.upload(
+                session_id,
+                {f.name: f.getvalue() for f in new_files},
+                openai_api_key,
+            )
+
+        queued_ids.update(
+            f.file_id for f in uploaded_files if f.name in result["queued"]
+        )
+        for file_name in result["rejected"]:
+            st.sidebar.error(f"Cannot upload {file_name}: maximum files limit reached")
+        if result["queued"]:
+            st.sidebar.info(
+                f"Queued {len(result['queued'])} document(s) for processing."
+            )
+        return len(result["queued"]) > 0
+
+    def get_file_statuses(self):
+        session_id = self.session_service.get_current_session_id()
+        if not session_id:
+            return {}
+        if self.api_client is None:
+            return job_statuses(session_id)
+        return {
+            file_name: state
+            for file_name, state in self.api_client.file_states(session_id).items()
+            if state["status"] is not None
+        }
+
+    def has_active_jobs(self):
+        return any(
+            file_state["status"] in ACTIVE_STATUSES
+            for file_state in self.get_file_statuses().values()
+        )
 
-        if files_to_process:
-            with st.spinner("Processing documents..."):
-                self._save_uploaded_files(files_to_process)
-                self._process_documents(files_to_process, openai_api_key)
+    def remove_file(self, file_name, openai_api_key):
+        session_id = self.session_service.get_current_session_id()
+        if self.api_client is not None:
+            self.api_client.delete_file(session_id, file_name, openai_api_key)
+            return
+        from resources import get_vector_manager
 
-        return len(files_to_process) > 0
+        get_vector_manager(openai_api_key).remove_documents_by_session_and_file(
+            session_id, file_name
+        )
+        self.session_service.remove_file_from_session(file_name)
 
-    def create_chatbot(self, openai_api_key):
+    def create_chatbot(self, openai_api_key, memory=None):
         current_session_files = self.session_service.get_session_files()
 
         if current_session_files:
-            embed_model = OpenAIEmbeddings(
-                model=config.EMBEDDING_MODEL, openai_api_key=openai_api_key
-            )
-            vectorstore = get_vectorstore(embed_model)
-            return ChatBot(
-                vectorstore=vectorstore,
-                openai_api_key=openai_api_key,
-                session_id=self.session_service.get_current_session_id(),
-            )
+            session_id = self.session_service.get_current_session_id()
+            if self.api_client is not None:
+                from api_client import RemoteChatBot
+
+                return RemoteChatBot(
+                    self.api_client, session_id, openai_api_key, memory
+                )
+            from resources import create_chatbot
+
+            return create_chatbot(openai_api_key, session_id, memory)
         return None
 
-    def _save_uploaded_files(self, uploaded_files):
-        if not os.path.exists(config.DATA_DIR):
-            os.makedirs(config.DATA_DIR)
-
-        file_paths = []
-        for uploaded_file in uploaded_files:
-            file_path = os.path.join(config.DATA_DIR, uploaded_file.name)
-            with open(file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            file_paths.append(file_path)
-        return file_paths
-
-    def _process_documents(self, uploaded_files, openai_api_key):
-        embed_model = OpenAIEmbeddings(
-            model=config.EMBEDDING_MODEL, openai_api_key=openai_api_key
-        )
-        vectorstore = get_vectorstore(embed_model)
-        vector_manager = VectorStoreManager(vectorstore)
 
-        processed_files = vector_manager.get_processed_files_for_session(
-            self.session_service.get_current_session_id()
-        )
+_file_service = None
 
-        doc_processor = DocumentProcessor(config.DATA_DIR)
-        all_files = [f.name for f in uploaded_files]
-        new_files = [f for f in all_files if f not in processed_files]
 
-        if new_files:
-            chunks = doc_processor.process_new_files(
-                new_files, self.session_service.get_current_session_id()
-            )
-            vector_manager.add_chunks(chunks)
-            doc_processor.delete_processed_files(new_files)
-            st.sidebar.success(
-                f"Successfully processed {len(new_files)} new document(s)."
-            )
-        else:
-            st.sidebar.info("All documents are already processed.")
+def get_file_service():
+    global _file_service
+    if _file_service is None:
+        api_client = None
+        if config.API_URL:
+            from api_client import get_api_client
+
+            api_client = get_api_client()
+        _file_service = FileService(get_session_service(), api_client)
+    return _file_service
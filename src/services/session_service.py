@@ -1,46 +1,69 @@
 import streamlit as st
 from streamlit_local_storage import LocalStorage
-from session_manager import get_session_manager
-from langchain_openai import OpenAIEmbeddings
-from vectorstore import get_vectorstore, VectorStoreManager
 import config
 
 
 class SessionService:
-    def __init__(self):
-        self.local_storage = LocalStorage()
-        self.session_manager = get_session_manager()
+    """The browser's session, kept by the session manager or, with
+    ``API_URL`` set, by the HTTP API."""
+
+    def __init__(self, api_client=None):
+        self.api_client = api_client
+        self.session_manager = None
+        if api_client is None:
+            from session_manager import get_session_manager
+
+            self.session_manager = get_session_manager()
+
+    def _is_valid_session(self, session_id):
+        if self.api_client is not None:
+            return self.api_client.get_session(session_id) is not None
+        return self.session_manager.is_valid_session(session_id)
+
+    def _create_session(self):
+        if self.api_client is not None:
+            return self.api_client.create_session()
+        from garbage_collector import get_garbage_collector
+
+        new_session_id = self.session_manager.generate_session_id()
+        removed_sessions = self.session_manager.create_session(new_session_id)
+        if removed_sessions:
+            get_garbage_collector().schedule(removed_sessions)
+        return new_session_id
 
     def initialize_session(self):
         if "session_id" not in st.session_state:
-            stored_session_id = self.local_storage.getItem("session_id")
-            if stored_session_id and self.session_manager.is_valid_session(
-                stored_session_id
-            ):
+            local_storage = LocalStorage()
+            stored_session_id = local_storage.getItem("session_id")
+            if stored_session_id and self._is_valid_session(stored_session_id):
                 st.session_state.session_id = stored_session_id
             else:
-                new_session_id = self.session_manager.generate_session_id()
-                removed_session = self.session_manager.create_session(new_session_id)
-                if removed_session:
-                    embed_model = OpenAIEmbeddings(model=config.EMBEDDING_MODEL)
-                    vectorstore = get_vectorstore(embed_model)
-                    vector_manager = VectorStoreManager(vectorstore)
-                    vector_manager.remove_documents_by_session(removed_session)
+                new_session_id = self._create_session()
                 st.session_state.session_id = new_session_id
-                self.local_storage.setItem("session_id", new_session_id)
+                local_storage.setItem("session_id", new_session_id)
 
     def get_current_session_id(self):
         return st.session_state.get("session_id")
 
+    def _remote_session(self, session_id):
+        return self.api_client.get_session(session_id) or {
+            "files": [],
+            "can_add_file": False,
+        }
+
     def get_session_files(self):
         session_id = self.get_current_session_id()
         if session_id:
+            if self.api_client is not None:
+                return self._remote_session(session_id)["files"]
             return self.session_manager.get_session_files(session_id)
         return []
 
     def can_add_file(self):
         session_id = self.get_current_session_id()
         if session_id:
+            if self.api_client is not None:
+                return self._remote_session(session_id)["can_add_file"]
             return self.session_manager.can_add_file(session_id)
         return False
 
@@ -55,3 +78,18 @@ class SessionService:
         if session_id:
             return self.session_manager.remove_file_from_session(session_id, filename)
         return False
+
+
+_session_service = None
+
+
+def get_session_service():
+    global _session_service
+    if _session_service is None:
+        api_client = None
+        if config.API_URL:
+            from api_client import get_api_client
+
+            api_client = get_api_client()
+        _session_service = SessionService(api_client)
+    return _session_service
@@ -1,102 +1,250 @@
 import json
 import os
+import sqlite3
+import threading
+import time
 import uuid
-from typing import Dict, List
+from contextlib import contextmanager
+from typing import List
 import config
 import redis
+from factories import SessionManagerInterface
+from metrics import instrumented
+
+_session_manager = None
 
 
 def get_session_manager():
-    app_env = os.getenv("APP_ENV", "development").lower()
-    if app_env == "production":
-        return RedisSessionManager()
-    else:
-        return LocalSessionManager()
+    global _session_manager
+    if _session_manager is None:
+        app_env = os.getenv("APP_ENV", "development").lower()
+        if app_env == "production":
+            _session_manager = RedisSessionManager()
+        else:
+            _session_manager = LocalSessionManager()
+    return _session_manager
 
 
-class LocalSessionManager:
-    def __init__(self):
-        self.json_file_path = config.SESSIONS_JSON
+class LocalSessionManager(SessionManagerInterface):
+    def __init__(self, db_path=config.SESSIONS_DB):
+        self.db_path = db_path
         self.max_sessions = config.MAX_SESSIONS
         self.max_files_per_session = config.MAX_FILES_PER_SESSION
-        self.data = self._load_data()
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL UNIQUE)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_files ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+                "file_name TEXT NOT NULL, UNIQUE (session_id, file_name))"
+            )
+            self._import_json(conn)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
 
-    def _load_data(self) -> Dict:
-        if os.path.exists(self.json_file_path):
+    def _import_json(self, conn: sqlite3.Connection):
+        json_file_path = config.SESSIONS_JSON
+        if not os.path.exists(json_file_path):
+            return
+        if conn.execute("SELECT 1 FROM sessions LIMIT 1").fetchone() is None:
             try:
-                with open(self.json_file_path, "r") as f:
+                with open(json_file_path, "r") as f:
                     data = json.load(f)
-                    if "session_queue" not in data:
-                        data["session_queue"] = []
-                    if "session_files" not in data:
-                        data["session_files"] = {}
-                    return data
-            except (json.JSONDecodeError, KeyError):
-                pass
-        return {"session_queue": [], "session_files": {}}
-
-    def _save_data(self):
-        os.makedirs(os.path.dirname(self.json_file_path), exist_ok=True)
-        if "session_queue" not in self.data:
-            self.data["session_queue"] = []
-        if "session_files" not in self.data:
-            self.data["session_files"] = {}
-        with open(self.json_file_path, "w") as f:
-            json.dump(self.data, f, indent=2)
+            except (json.JSONDecodeError, OSError):
+                data = {}
+            conn.executemany(
+                "INSERT OR IGNORE INTO sessions (session_id) VALUES (?)",
+                [(session_id,) for session_id in data.get("session_queue", [])],
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO session_files (session_id, file_name) VALUES (?, ?)",
+                [
+                    (session_id, file_name)
+                    for session_id, files in data.get("session_files", {}).items()
+                    for file_name in files
+                ],
+            )
+        os.replace(json_file_path, f"{json_file_path}.migrated")
 
     def generate_session_id(self) -> str:
         return str(uuid.uuid4())
 
+    @instrumented("session.is_valid_session")
     def is_valid_session(self, session_id: str) -> bool:
-        return session_id in self.data["session_files"]
-
-    def create_session(self, session_id: str) -> str:
-        if len(self.data["session_queue"]) >= self.max_sessions:
-            oldest_session = self.data["session_queue"].pop(0)
-            if oldest_session in self.data["session_files"]:
-                del self.data["session_files"][oldest_session]
-            return oldest_session
-        if session_id not in self.data["session_queue"]:
-            self.data["session_queue"].append(session_id)
-        if session_id not in self.data["session_files"]:
-            self.data["session_files"][session_id] = []
-        self._save_data()
-        return None
+        row = (
+            self._connection()
+            .execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,))
+            .fetchone()
+        )
+        return row is not None
+
+    @instrumented("session.create_session")
+    def create_session(self, session_id: str) -> List[str]:
+        with self._transaction() as conn:
+            if conn.execute(
+                "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone():
+                return []
+            removed = []
+            (session_count,) = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+            if session_count >= self.max_sessions:
+                (oldest_session,) = conn.execute(
+                    "SELECT session_id FROM sessions ORDER BY seq LIMIT 1"
+                ).fetchone()
+                conn.execute(
+                    "DELETE FROM sessions WHERE session_id = ?", (oldest_session,)
+                )
+                conn.execute(
+                    "DELETE FROM session_files WHERE session_id = ?", (oldest_session,)
+                )
+                removed.append(oldest_session)
+            conn.execute("INSERT INTO sessions (session_id) VALUES (?)", (session_id,))
+            return removed
 
+    @instrumented("session.add_file_to_session")
     def add_file_to_session(self, session_id: str, file_name: str) -> bool:
-        if session_id not in self.data["session_files"]:
-            self.data["session_files"][session_id] = []
-        if len(self.data["session_files"][session_id]) >= self.max_files_per_session:
-            return False
-        if file_name not in self.data["session_files"][session_id]:
-            self.data["session_files"][session_id].append(file_name)
-            self._save_data()
-        return True
+        with self._transaction() as conn:
+            if conn.execute(
+                "SELECT 1 FROM session_files WHERE session_id = ? AND file_name = ?",
+                (session_id, file_name),
+            ).fetchone():
+                return True
+            (file_count,) = conn.execute(
+                "SELECT COUNT(*) FROM session_files WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            if file_count >= self.max_files_per_session:
+                return False
+            conn.execute(
+                "INSERT INTO session_files (session_id, file_name) VALUES (?, ?)",
+                (session_id, file_name),
+            )
+            return True
 
+    @instrumented("session.remove_file_from_session")
     def remove_file_from_session(self, session_id: str, file_name: str):
-        if session_id in self.data["session_files"]:
-            if file_name in self.data["session_files"][session_id]:
-                self.data["session_files"][session_id].remove(file_name)
-                self._save_data()
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM session_files WHERE session_id = ? AND file_name = ?",
+                (session_id, file_name),
+            )
 
+    @instrumented("session.get_session_files")
     def get_session_files(self, session_id: str) -> List[str]:
-        return self.data["session_files"].get(session_id, [])
+        rows = self._connection().execute(
+            "SELECT file_name FROM session_files WHERE session_id = ? ORDER BY seq",
+            (session_id,),
+        )
+        return [file_name for (file_name,) in rows]
 
+    @instrumented("session.can_add_file")
     def can_add_file(self, session_id: str) -> bool:
-        current_files = self.get_session_files(session_id)
-        return len(current_files) < self.max_files_per_session
+        (file_count,) = (
+            self._connection()
+            .execute(
+                "SELECT COUNT(*) FROM session_files WHERE session_id = ?",
+                (session_id,),
+            )
+            .fetchone()
+        )
+        return file_count < self.max_files_per_session
 
+    @instrumented("session.remove_session")
     def remove_session(self, session_id: str):
-        if session_id in self.data["session_queue"]:
-            self.data["session_queue"].remove(session_id)
-        if session_id in self.data["session_files"]:
-            del self.data["session_files"][session_id]
-        self._save_data()
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            conn.execute(
+                "DELETE FROM session_files WHERE session_id = ?", (session_id,)
+            )
+
+    def list_sessions(self) -> List[str]:
+        rows = self._connection().execute("SELECT session_id FROM sessions")
+        return [session_id for (session_id,) in rows]
+
+
+CREATE_SESSION_SCRIPT = """
+local queue_key = KEYS[1]
+local session_id = ARGV[1]
+local max_sessions = tonumber(ARGV[2])
+local now = ARGV[3]
+local expired_before = "(" .. ARGV[4]
+local files_prefix = ARGV[5]
+local removed = redis.call("ZRANGEBYSCORE", queue_key, "-inf", expired_before)
+if #removed > 0 then
+    redis.call("ZREMRANGEBYSCORE", queue_key, "-inf", expired_before)
+end
+if not redis.call("ZSCORE", queue_key, session_id) then
+    local excess = redis.call("ZCARD", queue_key) - max_sessions + 1
+    if excess > 0 then
+        local evicted = redis.call("ZPOPMIN", queue_key, excess)
+        for i = 1, #evicted, 2 do
+            table.insert(removed, evicted[i])
+        end
+    end
+end
+for _, removed_id in ipairs(removed) do
+    redis.call("DEL", files_prefix .. removed_id)
+end
+redis.call("ZADD", queue_key, now, session_id)
+return removed
+"""
+
+TOUCH_SESSION_SCRIPT = """
+local queue_key = KEYS[1]
+local last_seen = redis.call("ZSCORE", queue_key, ARGV[1])
+if not last_seen or tonumber(last_seen) < tonumber(ARGV[3]) then
+    return 0
+end
+redis.call("ZADD", queue_key, "XX", ARGV[2], ARGV[1])
+return 1
+"""
 
+ADD_FILE_SCRIPT = """
+local files_key = KEYS[1]
+local file_name = ARGV[1]
+local max_files = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+if redis.call("LPOS", files_key, file_name) then
+    return 1
+end
+if redis.call("LLEN", files_key) >= max_files then
+    return 0
+end
+redis.call("RPUSH", files_key, file_name)
+redis.call("EXPIRE", files_key, ttl)
+return 1
+"""
 
-class RedisSessionManager:
-    def __init__(self):
-        self.redis_client = redis.Redis(
+
+class RedisSessionManager(SessionManagerInterface):
+    """Sessions live in one sorted set scored by their last activity, so
+    expired sessions are a score range and the least recently used one is
+    the lowest score. Every script only touches the keys it is given."""
+
+    def __init__(self, redis_client=None):
+        self.redis_client = redis_client or redis.Redis(
             host=config.REDIS_HOST,
             port=config.REDIS_PORT,
             db=config.REDIS_DB,
@@ -104,51 +252,98 @@ class RedisSessionManager:
         )
         self.max_sessions = config.MAX_SESSIONS
         self.max_files_per_session = config.MAX_FILES_PER_SESSION
-        self.session_queue_key = "session_queue"
+        self.session_ttl = config.SESSION_TTL_SECONDS
+        self.session_queue_key = "session_last_seen"
+        self.legacy_session_queue_key = "session_queue"
         self.session_files_prefix = "session_files:"
+        self._create_session = self.redis_client.register_script(CREATE_SESSION_SCRIPT)
+        self._touch_session = self.redis_client.register_script(TOUCH_SESSION_SCRIPT)
+        self._add_file = self.redis_client.register_script(ADD_FILE_SCRIPT)
+        self._migrate_legacy_queue()
+
+    def _migrate_legacy_queue(self):
+        # Sessions used to be kept, oldest first, in a list without expiry.
+        legacy = self.redis_client.lrange(self.legacy_session_queue_key, 0, -1)
+        if not legacy:
+            return
+        now = time.time()
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zadd(
+            self.session_queue_key,
+            {
+                session_id: now - (len(legacy) - position) / 1000
+                for position, session_id in enumerate(legacy)
+            },
+            nx=True,
+        )
+        for session_id in legacy:
+            pipe.expire(f"{self.session_files_prefix}{session_id}", self.session_ttl)
+        pipe.delete(self.legacy_session_queue_key)
+        pipe.execute()
 
     def generate_session_id(self) -> str:
         return str(uuid.uuid4())
 
+    @instrumented("session.is_valid_session")
     def is_valid_session(self, session_id: str) -> bool:
-        return self.redis_client.exists(f"{self.session_files_prefix}{session_id}") == 1
-
-    def create_session(self, session_id: str) -> str:
-        queue_length = self.redis_client.llen(self.session_queue_key)
-        if queue_length >= self.max_sessions:
-            oldest_session = self.redis_client.lpop(self.session_queue_key)
-            if oldest_session:
-                self.redis_client.delete(f"{self.session_files_prefix}{oldest_session}")
-                return oldest_session
-        existing_sessions = self.redis_client.lrange(self.session_queue_key, 0, -1)
-        if session_id not in existing_sessions:
-            self.redis_client.rpush(self.session_queue_key, session_id)
-        if not self.redis_client.exists(f"{self.session_files_prefix}{session_id}"):
-            self.redis_client.lpush(f"{self.session_files_prefix}{session_id}", "")
-            self.redis_client.lpop(f"{self.session_files_prefix}{session_id}")
-        return None
+        now = time.time()
+        pipe = self.redis_client.pipeline(transaction=False)
+        self._touch_session(
+            keys=[self.session_queue_key],
+            args=[session_id, now, now - self.session_ttl],
+            client=pipe,
+        )
+        pipe.expire(f"{self.session_files_prefix}{session_id}", self.session_ttl)
+        session_valid, _ = pipe.execute()
+        return session_valid == 1
 
+    @instrumented("session.create_session")
+    def create_session(self, session_id: str) -> List[str]:
+        now = time.time()
+        removed = self._create_session(
+            keys=[self.session_queue_key],
+            args=[
+                session_id,
+                self.max_sessions,
+                now,
+                now - self.session_ttl,
+                self.session_files_prefix,
+            ],
+        )
+        return removed
+
+    @instrumented("session.add_file_to_session")
     def add_file_to_session(self, session_id: str, file_name: str) -> bool:
         session_key = f"{self.session_files_prefix}{session_id}"
-        current_files = self.redis_client.lrange(session_key, 0, -1)
-        if len(current_files) >= self.max_files_per_session:
-            return False
-        if file_name not in current_files:
-            self.redis_client.rpush(session_key, file_name)
-        return True
+        added = self._add_file(
+            keys=[session_key],
+            args=[file_name, self.max_files_per_session, self.session_ttl],
+        )
+        return added == 1
 
+    @instrumented("session.remove_file_from_session")
     def remove_file_from_session(self, session_id: str, file_name: str):
         session_key = f"{self.session_files_prefix}{session_id}"
         self.redis_client.lrem(session_key, 0, file_name)
 
+    @instrumented("session.get_session_files")
     def get_session_files(self, session_id: str) -> List[str]:
         session_key = f"{self.session_files_prefix}{session_id}"
         return self.redis_client.lrange(session_key, 0, -1)
 
+    @instrumented("session.can_add_file")
     def can_add_file(self, session_id: str) -> bool:
-        current_files = self.get_session_files(session_id)
-        return len(current_files) < self.max_files_per_session
+        session_key = f"{self.session_files_prefix}{session_id}"
+        return self.redis_client.llen(session_key) < self.max_files_per_session
 
+    @instrumented("session.remove_session")
     def remove_session(self, session_id: str):
-        self.redis_client.lrem(self.session_queue_key, 0, session_id)
-        self.redis_client.delete(f"{self.session_files_prefix}{session_id}")
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zrem(self.session_queue_key, session_id)
+        pipe.delete(f"{self.session_files_prefix}{session_id}")
+        pipe.execute()
+
+    def list_sessions(self) -> List[str]:
+        return self.redis_client.zrangebyscore(
+            self.session_queue_key, time.time() - self.session_ttl, "+inf"
+        )
@@ -1,6 +1,5 @@
 import streamlit as st
-from langchain_openai import OpenAIEmbeddings
-from vectorstore import get_vectorstore, VectorStoreManager
+from jobs import ACTIVE_STATUSES, FAILED
 import config
 
 
@@ -14,15 +13,34 @@ class SidebarComponent:
 
         if current_session_files:
             st.sidebar.subheader("Your Files")
+            statuses = self.file_service.get_file_statuses()
             for file_name in current_session_files:
                 col1, col2 = st.sidebar.columns([3, 1])
                 with col1:
                     st.text(file_name)
+                    self._render_file_status(statuses.get(file_name))
                 with col2:
                     if st.button("🗑️", key=f"delete_{file_name}"):
                         self._handle_file_deletion(file_name, openai_api_key)
                         st.rerun()
 
+            if self.file_service.has_active_jobs():
+                with st.sidebar:
+                    self._poll_processing_jobs()
+
+    def _render_file_status(self, file_state):
+        if not file_state:
+            return
+        if file_state["status"] in ACTIVE_STATUSES:
+            st.caption(f"⏳ {file_state['status']} ({file_state['chunks']} chunks)")
+        elif file_state["status"] == FAILED:
+            st.caption(f"⚠️ failed: {file_state['error']}")
+
+    @st.fragment(run_every=2)
+    def _poll_processing_jobs(self):
+        if not self.file_service.has_active_jobs():
+            st.rerun()
+
     def render_file_uploader(self):
         can_upload = self.session_service.can_add_file()
         current_session_files = self.session_service.get_session_files()
@@ -44,12 +62,4 @@ class SidebarComponent:
         return uploaded_files
 
     def _handle_file_deletion(self, file_name, openai_api_key):
-        embed_model = OpenAIEmbeddings(
-            model=config.EMBEDDING_MODEL, openai_api_key=openai_api_key
-        )
-        vectorstore = get_vectorstore(embed_model)
-        vector_manager = VectorStoreManager(vectorstore)
-        vector_manager.remove_documents_by_session_and_file(
-            self.session_service.get_current_session_id(), file_name
-        )
-        self.session_service.remove_file_from_session(file_name)
+        self.file_service.remove_file(file_name, openai_api_key)
@@ -0,0 +1,77 @@
+import os
+import tempfile
+from typing import Dict, List, Mapping, Optional
+import config
+from document_registry import get_document_registry
+from jobs import FAILED, get_job_queue, new_job, upload_dir
+from session_manager import get_session_manager
+
+
+def spool_upload(session_id: str, data) -> str:
+    directory = upload_dir(session_id)
+    os.makedirs(directory, exist_ok=True)
+    fd, file_path = tempfile.mkstemp(dir=directory, suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return file_path
+
+
+def job_statuses(session_id: str) -> Dict[str, Dict]:
+    statuses = {}
+    jobs = get_job_queue().get_session_jobs(session_id)
+    for job in sorted(jobs, key=lambda job: job["created"]):
+        statuses.update(job["files"])
+    return statuses
+
+
+def file_states(session_id: str) -> Dict[str, Dict]:
+    processed = set(get_document_registry().get_session_documents(session_id))
+    statuses = job_statuses(session_id)
+    return {
+        file_name: {
+            "processed": file_name in processed,
+            "status": statuses.get(file_name, {}).get("status"),
+            "chunks": statuses.get(file_name, {}).get("chunks", 0),
+            "error": statuses.get(file_name, {}).get("error"),
+        }
+        for file_name in get_session_manager().get_session_files(session_id)
+    }
+
+
+def queue_uploads(
+    session_id: str, uploads: Mapping[str, bytes], openai_api_key: Optional[str]
+) -> Dict[str, List[str]]:
+    """Adds new files to the session and queues them for ingestion.
+
+    Files that are already indexed or queued are skipped, files whose last
+    job failed are queued again and files over the session's limit are
+    rejected. Small uploads travel with the job, larger ones are spooled to
+    disk.
+    """
+    session_manager = get_session_manager()
+    processed = set(get_document_registry().get_session_documents(session_id))
+    queued_files = {
+        file_name
+        for file_name, state in job_statuses(session_id).items()
+        if state["status"] != FAILED
+    } & set(session_manager.get_session_files(session_id))
+    result = {"job_id": None, "queued": [], "skipped": [], "rejected": []}
+    for file_name in uploads:
+        if file_name in processed or file_name in queued_files:
+            result["skipped"].append(file_name)
+        elif session_manager.add_file_to_session(session_id, file_name):
+            result["queued"].append(file_name)
+        else:
+            result["rejected"].append(file_name)
+
+    if result["queued"]:
+        job = new_job(session_id, result["queued"], openai_api_key)
+        in_memory = {}
+        for file_name in result["queued"]:
+            data = uploads[file_name]
+            if len(data) <= config.UPLOAD_IN_MEMORY_MAX_BYTES:
+                in_memory[file_name] = data
+            else:
+                job["files"][file_name]["path"] = spool_upload(session_id, data)
+        result["job_id"] = get_job_queue().enqueue(job, in_memory)
+    return result
@@ -0,0 +1,75 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+import config
+
+
+def _digest(key: Hashable) -> str:
+    # Keys carry API keys; only their hash is kept.
+    return hashlib.sha256(repr(key).encode()).hexdigest()
+
+
+Entry = Tuple[Future, float, Optional[Callable[[Any], None]]]
+
+
+def _close(entries: List[Entry]):
+    for future, _, close in entries:
+        # Resources still being built are left to whoever is waiting on them.
+        if close is None or not future.done() or future.exception() is not None:
+            continue
+        close(future.result())
+
+
+class ResourcePool:
+    def __init__(self, idle_ttl: float):
+        self.idle_ttl = idle_ttl
+        self.lock = threading.Lock()
+        self.resources: Dict[str, Entry] = {}
+
+    def get(
+        self,
+        key: Hashable,
+        factory: Callable[[], Any],
+        close: Optional[Callable[[Any], None]] = None,
+    ) -> Any:
+        """Return the resource for ``key``, building it with ``factory`` on
+        first use. ``close`` is called with the resource when it is evicted;
+        only pass it for resources nothing else keeps a reference to."""
+        key = _digest(key)
+        with self.lock:
+            now = time.monotonic()
+            evicted = self._evict_idle(now)
+            entry = self.resources.get(key)
+            created = entry is None
+            future = Future() if created else entry[0]
+            self.resources[key] = (future, now, close)
+        _close(evicted)
+        if created:
+            # Built outside the lock so a slow client only holds up callers
+            # waiting for the same key.
+            try:
+                future.set_result(factory())
+            except BaseException as e:
+                with self.lock:
+                    if self.resources.get(key, (None,))[0] is future:
+                        del self.resources[key]
+                future.set_exception(e)
+        return future.result()
+
+    def _evict_idle(self, now: float) -> List[Entry]:
+        evicted = []
+        for key, entry in list(self.resources.items()):
+            if now - entry[1] > self.idle_ttl:
+                evicted.append(self.resources.pop(key))
+        return evicted
+
+    def clear(self):
+        with self.lock:
+            evicted = list(self.resources.values())
+            self.resources.clear()
+        _close(evicted)
+
+
+shared_pool = ResourcePool(config.RESOURCE_IDLE_TTL)
@@ -1,4 +1,5 @@
 import streamlit as st
+from conversation_memory import ConversationMemory
 
 
 class StateManager:
@@ -12,6 +13,9 @@ class StateManager:
         if "messages" not in st.session_state:
             st.session_state.messages = []
 
+        if "conversation_memory" not in st.session_state:
+            st.session_state.conversation_memory = ConversationMemory()
+
     def get_chatbot(self):
         return st.session_state.get("chatbot")
 
@@ -26,5 +30,9 @@ class StateManager:
             st.session_state.messages = []
         st.session_state.messages.append(message)
 
+    def get_conversation_memory(self):
+        return st.session_state.conversation_memory
+
     def clear_messages(self):
         st.session_state.messages = []
+        st.session_state.conversation_memory.clear()
@@ -1,36 +1,323 @@
+import logging
 import os
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 import config
 
-from langchain_chroma import Chroma
 import chromadb
+from chromadb.api.models.Collection import Collection
+from chromadb.errors import NotFoundError
+from document_registry import get_document_registry
+from embedding_writer import EmbeddingWriter
+from embeddings import embedding_backend_id
 from factories import ChromaDBInterface
+from utils.resource_pool import shared_pool
+
+logger = logging.getLogger("rag.vectorstore")
+
+
+def _collection_name(base_name: str) -> str:
+    if config.EMBEDDING_BACKEND == "openai":
+        return base_name
+    return f"{base_name}-{re.sub(r'[^a-zA-Z0-9._-]+', '-', embedding_backend_id())}"
+
+
+def _open_collection(client, name: str) -> Collection:
+    backend_id = embedding_backend_id()
+    collection = client.get_or_create_collection(
+        name, embedding_function=None, metadata={"embedding_backend": backend_id}
+    )
+    metadata = collection.metadata or {}
+    recorded = metadata.get("embedding_backend")
+    if recorded is None:
+        collection.modify(metadata={**metadata, "embedding_backend": backend_id})
+    elif recorded != backend_id:
+        raise ValueError(
+            f"Collection '{name}' holds embeddings from '{recorded}', "
+            f"not '{backend_id}'"
+        )
+    return collection
+
+
+def _doc_id(chunk_id: str) -> Optional[str]:
+    doc_id, separator, _ = chunk_id.rpartition(":")
+    return doc_id if separator else None
+
+
+class ShardedVectorStore:
+    """Chunks spread over Chroma collections by document.
+
+    With ``shards=0`` every document gets its own collection: a session's
+    query only searches its own documents, and dropping a document deletes
+    its collection. Otherwise documents are hashed into ``shards`` bucket
+    collections and queries filter on ``doc_id`` within a bucket. Shards are
+    created on first write. Chunks written before sharding (without a
+    ``doc_id``) stay in the base collection until migrated with
+    ``migrate_shards.py``.
+    """
+
+    def __init__(
+        self, client, base_name: str, embeddings, shards: Optional[int] = None
+    ):
+        self.client = client
+        self.family_name = base_name
+        self.base_name = _collection_name(base_name)
+        self.embeddings = embeddings
+        self.shards = config.VECTOR_SHARDS if shards is None else shards
+        self.lock = threading.Lock()
+        self._collections: Dict[str, Collection] = {}
+        # Nothing creates the base collection any more, so once it is found
+        # missing this store stops looking for legacy chunks.
+        self._base_missing = False
+        self._executor = ThreadPoolExecutor(max_workers=config.MAX_FILES_PER_SESSION)
+        self._closed = False
+
+    def close(self):
+        """Stop the query threads. Queries made afterwards run serially."""
+        self._closed = True
+        self._executor.shutdown(wait=False)
+
+    def shard_name(self, doc_id: str) -> str:
+        if self.shards:
+            bucket = zlib.crc32(doc_id.encode()) % self.shards
+            return f"{self.base_name}-shard-{bucket:04d}"
+        safe_id = re.sub(r"[^a-zA-Z0-9_-]+", "-", doc_id)
+        return f"{self.base_name}-doc-{safe_id}"
+
+    def _collection(self, name: str, create: bool = False) -> Optional[Collection]:
+        with self.lock:
+            collection = self._collections.get(name)
+        if collection is not None:
+            return collection
+        if create:
+            collection = _open_collection(self.client, name)
+        else:
+            try:
+                collection = self.client.get_collection(name, embedding_function=None)
+            except NotFoundError:
+                return None
+        with self.lock:
+            self._collections[name] = collection
+        return collection
+
+    def _forget(self, name: str):
+        with self.lock:
+            self._collections.pop(name, None)
+
+    def base_collection(self) -> Optional[Collection]:
+        return self._collection(self.base_name)
+
+    def _has_base_collection(self) -> bool:
+        if not self._base_missing and self.base_collection() is None:
+            self._base_missing = True
+        return not self._base_missing
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        by_shard: Dict[str, List[int]] = {}
+        for position, metadata in enumerate(metadatas):
+            by_shard.setdefault(self.shard_name(metadata["doc_id"]), []).append(
+                position
+            )
+        for name, positions in by_shard.items():
+            self._collection(name, create=True).upsert(
+                ids=[ids[i] for i in positions],
+                embeddings=[embeddings[i] for i in positions],
+                documents=[documents[i] for i in positions],
+                metadatas=[metadatas[i] for i in positions],
+            )
+
+    def _targets(self, doc_ids, where) -> List[Tuple[str, Optional[Dict]]]:
+        """Collections to search for ``doc_ids``; ``where`` selects chunks in
+        the base collection, which holds chunks written before sharding."""
+        if not doc_ids:
+            return [(self.base_name, where)]
+        by_shard: Dict[str, List[str]] = {}
+        for doc_id in doc_ids:
+            by_shard.setdefault(self.shard_name(doc_id), []).append(doc_id)
+        if not self.shards:
+            targets = [(name, None) for name in by_shard]
+        else:
+            targets = [
+                (name, {"doc_id": {"$in": shard_doc_ids}})
+                for name, shard_doc_ids in by_shard.items()
+            ]
+        if where is not None and self._has_base_collection():
+            targets.append((self.base_name, where))
+        return targets
+
+    def _query_shard(self, name, where, query_embedding, k) -> List[Dict[str, Any]]:
+        collection = self._collection(name)
+        if collection is None:
+            return []
+        try:
+            result = collection.query(
+                query_embeddings=[query_embedding],
+                n_results=k,
+                where=where,
+                include=["documents", "metadatas", "embeddings", "distances"],
+            )
+        except NotFoundError:
+            self._forget(name)
+            return []
+        return [
+            {
+                "id": chunk_id,
+                "document": document,
+                "metadata": metadata or {},
+                "embedding": embedding,
+                "distance": distance,
+            }
+            for chunk_id, document, metadata, embedding, distance in zip(
+                result["ids"][0],
+                result["documents"][0],
+                result["metadatas"][0],
+                result["embeddings"][0],
+                result["distances"][0],
+            )
+        ]
+
+    def query(
+        self, query_embedding, k: int, doc_ids=(), where=None
+    ) -> List[Dict[str, Any]]:
+        targets = self._targets(doc_ids, where)
+        if len(targets) == 1 or self._closed:
+            results = [
+                match
+                for name, shard_where in targets
+                for match in self._query_shard(name, shard_where, query_embedding, k)
+            ]
+        else:
+            futures = [
+                self._executor.submit(
+                    self._query_shard, name, shard_where, query_embedding, k
+                )
+                for name, shard_where in targets
+            ]
+            results = [match for future in futures for match in future.result()]
+        results.sort(key=lambda match: match["distance"])
+        return results[:k]
+
+    def get_embeddings(self, ids: List[str]) -> Dict[str, Any]:
+        by_shard: Dict[str, List[str]] = {}
+        for chunk_id in ids:
+            doc_id = _doc_id(chunk_id)
+            name = self.shard_name(doc_id) if doc_id else self.base_name
+            by_shard.setdefault(name, []).append(chunk_id)
+        embeddings = {}
+        for name, shard_ids in by_shard.items():
+            collection = self._collection(name)
+            if collection is None:
+                continue
+            try:
+                result = collection.get(ids=shard_ids, include=["embeddings"])
+            except NotFoundError:
+                self._forget(name)
+                continue
+            embeddings.update(zip(result["ids"], result["embeddings"]))
+        return embeddings
+
+    def delete_shard(self, name: str) -> int:
+        collection = self._collection(name)
+        self._forget(name)
+        if collection is None:
+            return 0
+        count = collection.count()
+        try:
+            self.client.delete_collection(name)
+        except NotFoundError:
+            return 0
+        return count
+
+    def delete_documents(self, doc_ids: List[str]) -> int:
+        deleted = 0
+        for name, where in self._targets(doc_ids, None):
+            if where is None:
+                deleted += self.delete_shard(name)
+                continue
+            collection = self._collection(name)
+            if collection is None:
+                continue
+            ids = collection.get(where=where, include=[])["ids"]
+            if ids:
+                collection.delete(ids=ids)
+            deleted += len(ids)
+        return deleted
+
+    def delete_where(self, where: Dict[str, Any]):
+        collection = self.base_collection()
+        if collection is not None:
+            collection.delete(where=where)
+
+    def count(self) -> int:
+        names = self.shard_names()
+        if self.base_collection() is not None:
+            names.append(self.base_name)
+        return sum(self._collection(name).count() for name in names)
+
+    def shard_names(self) -> List[str]:
+        prefix = f"{self.base_name}-shard-" if self.shards else f"{self.base_name}-doc-"
+        return [
+            collection.name
+            for collection in self.client.list_collections()
+            if collection.name.startswith(prefix)
+        ]
+
+    def drop_other_backends(self) -> int:
+        """Delete this store's collections that hold another embedding
+        backend's vectors; untagged collections are left alone."""
+        backend_id = embedding_backend_id()
+        dropped = 0
+        for collection in self.client.list_collections():
+            name = collection.name
+            if name != self.family_name and not name.startswith(f"{self.family_name}-"):
+                continue
+            recorded = (collection.metadata or {}).get("embedding_backend")
+            if recorded is not None and recorded != backend_id:
+                self.delete_shard(name)
+                dropped += 1
+        return dropped
 
 
 class LocalChromaDB(ChromaDBInterface):
     def __init__(self, persist_directory):
         self.persist_directory = persist_directory
+        self.collection_name = "langchain"
         if not os.path.exists(persist_directory):
             os.makedirs(persist_directory, exist_ok=True)
 
-    def get_vectorstore(self, embed_model):
-        return Chroma(
-            persist_directory=self.persist_directory, embedding_function=embed_model
+    def get_client(self):
+        return chromadb.PersistentClient(path=str(self.persist_directory))
+
+    def get_vectorstore(self, embed_model, shards=None):
+        client = shared_pool.get(
+            ("chroma_client", str(self.persist_directory)), self.get_client
         )
+        return ShardedVectorStore(client, self.collection_name, embed_model, shards)
 
 
 class RemoteChromaDB(ChromaDBInterface):
     def __init__(self, host, port):
         self.host = host
         self.port = port
+        self.collection_name = "documents"
 
-    def get_vectorstore(self, embed_model):
-        client = chromadb.HttpClient(host=self.host, port=self.port)
-        return Chroma(
-            client=client, collection_name="documents", embedding_function=embed_model
-        )
+    def get_client(self):
+        return chromadb.HttpClient(host=self.host, port=self.port)
+
+    def get_vectorstore(self, embed_model, shards=None):
+        client = shared_pool.get(("chroma_client", self.host, self.port), self.get_client)
+        return ShardedVectorStore(client, self.collection_name, embed_model, shards)
 
 
 def get_vectorstore(embed_model):
+    if config.VECTOR_STORE == "numpy":
+        from numpy_vectorstore import NumpyVectorDB
+
+        return NumpyVectorDB(config.NUMPY_VECTORS_PATH).get_vectorstore(embed_model)
     app_env = os.getenv("APP_ENV", "development").lower()
     if app_env == "production":
         chromadb_host = config.CHROMADB_HOST
@@ -43,50 +330,114 @@ def get_vectorstore(embed_model):
 
 
 class VectorStoreManager:
-    def __init__(self, vectorstore):
+    def __init__(
+        self,
+        vectorstore,
+        lexical_index=None,
+        answer_cache=None,
+        document_registry=None,
+    ):
         self.vectorstore = vectorstore
+        self.lexical_index = lexical_index
+        self.answer_cache = answer_cache
+        self.document_registry = document_registry or get_document_registry()
+        self.writer = EmbeddingWriter(vectorstore)
 
-    def add_chunks(self, chunks):
-        texts = [chunk["content"] for chunk in chunks]
-        metadatas = [chunk["metadata"] for chunk in chunks]
-        self.vectorstore.add_texts(texts=texts, metadatas=metadatas)
+    def close(self):
+        self.vectorstore.close()
 
-    def remove_documents_by_session_and_file(self, session_id: str, file_name: str):
+    def _delete_documents(self, doc_ids: List[str]) -> int:
+        if not doc_ids:
+            return 0
+        deleted = self.vectorstore.delete_documents(doc_ids)
+        if self.lexical_index is not None:
+            for doc_id in doc_ids:
+                self.lexical_index.remove_document(doc_id)
+        return deleted
+
+    def _delete_orphaned(self, doc_ids: List[str]) -> int:
+        """Delete the chunks of documents the registry marked as being
+        deleted for this caller, then clear the marks."""
         try:
-            all_docs = self.vectorstore.get()
-            ids_to_delete = []
-            for i, metadata in enumerate(all_docs["metadatas"]):
-                if (
-                    metadata.get("session_id") == session_id
-                    and metadata.get("file_name") == file_name
-                ):
-                    ids_to_delete.append(all_docs["ids"][i])
-            if ids_to_delete:
-                self.vectorstore.delete(ids=ids_to_delete)
-        except Exception:
-            pass
+            return self._delete_documents(doc_ids)
+        finally:
+            for doc_id in doc_ids:
+                self.document_registry.finish_deletion(doc_id)
+
+    def _index_written(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        if self.lexical_index is None:
+            return
+        by_document: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        for chunk_id, chunk in batch:
+            by_document.setdefault(chunk["metadata"]["doc_id"], []).append(
+                (chunk_id, chunk)
+            )
+        for doc_id, doc_chunks in by_document.items():
+            self.lexical_index.add_chunks(
+                doc_id,
+                [chunk_id for chunk_id, _ in doc_chunks],
+                [chunk for _, chunk in doc_chunks],
+            )
+
+    def add_chunk_stream(self, chunks: Iterable[Dict[str, Any]]) -> int:
+        items = (
+            (f"{chunk['metadata']['doc_id']}:{chunk['metadata']['chunk_index']}", chunk)
+            for chunk in chunks
+        )
+        return self.writer.write(items, on_written=self._index_written)
+
+    def add_chunks(self, chunks: List[Dict[str, Any]]) -> int:
+        return self.add_chunk_stream(chunks)
 
-    def remove_documents_by_session(self, session_id: str):
+    def attach_document(self, session_id: str, file_name: str, doc_id: str) -> bool:
+        stored = self.document_registry.add_reference(session_id, file_name, doc_id)
+        if stored and self.answer_cache is not None:
+            self.answer_cache.invalidate_session(session_id)
+        if not stored:
+            # The last session to drop this document may still be deleting its
+            # chunks; anything written before that finishes would go with them.
+            while self.document_registry.is_deleting(doc_id):
+                time.sleep(0.1)
+        return stored
+
+    def mark_documents_stored(self, session_id: str, doc_ids: Iterable[str]):
+        for doc_id in doc_ids:
+            self.document_registry.mark_stored(doc_id)
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate_session(session_id)
+
+    def drop_documents(self, doc_ids: Iterable[str]) -> int:
+        """Delete the chunks of documents no session references any more."""
+        registry = self.document_registry
+        return self._delete_orphaned(
+            [doc_id for doc_id in doc_ids if registry.remove_document(doc_id)]
+        )
+
+    def remove_documents_by_session_and_file(self, session_id: str, file_name: str):
         try:
-            all_docs = self.vectorstore.get()
-            ids_to_delete = []
-            for i, metadata in enumerate(all_docs["metadatas"]):
-                if metadata.get("session_id") == session_id:
-                    ids_to_delete.append(all_docs["ids"][i])
-            if ids_to_delete:
-                self.vectorstore.delete(ids=ids_to_delete)
+            orphaned = self.document_registry.remove_reference(session_id, file_name)
+            if orphaned:
+                self._delete_orphaned([orphaned])
+            if self.answer_cache is not None:
+                self.answer_cache.invalidate_session(session_id)
         except Exception:
-            pass
+            logger.exception(
+                "Removing %s from session %s failed", file_name, session_id
+            )
+
+    def remove_sessions(self, session_ids: List[str]) -> Dict[str, int]:
+        orphaned = []
+        for session_id in session_ids:
+            orphaned.extend(self.document_registry.remove_session(session_id))
+        chunks = self._delete_orphaned(orphaned)
+        self.vectorstore.delete_where({"session_id": {"$in": list(session_ids)}})
+        if self.answer_cache is not None:
+            for session_id in session_ids:
+                self.answer_cache.invalidate_session(session_id)
+        return {"documents": len(orphaned), "chunks": chunks}
 
     def get_processed_files_for_session(self, session_id: str):
         try:
-            all_docs = self.vectorstore.get()
-            processed_files = set()
-            for metadata in all_docs["metadatas"]:
-                if metadata.get("session_id") == session_id:
-                    file_name = metadata.get("file_name")
-                    if file_name:
-                        processed_files.add(file_name)
-            return list(processed_files)
+            return list(self.document_registry.get_session_documents(session_id))
         except Exception:
             return []
@@ -0,0 +1,16 @@
+import logging
+from garbage_collector import get_garbage_collector
+from ingestion import run_worker
+from jobs import RedisJobQueue
+from metrics import start_metrics_server
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    start_metrics_server()
+    get_garbage_collector().start()
+    run_worker(RedisJobQueue())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import asyncio
+import chromadb
+import pytest
+from pydantic_ai.models.test import TestModel
+from chatbot import ChatBot
+from document_registry import LocalDocumentRegistry
+from embeddings import HashingEmbeddings
+from vectorstore import ShardedVectorStore, VectorStoreManager
+
+
+@pytest.fixture
+def chatbot(tmp_path):
+    vectorstore = ShardedVectorStore(
+        chromadb.PersistentClient(path=str(tmp_path / "chroma")),
+        "test",
+        HashingEmbeddings(),
+    )
+    registry = LocalDocumentRegistry(str(tmp_path / "documents.sqlite3"))
+    manager = VectorStoreManager(vectorstore, document_registry=registry)
+    manager.attach_document("session", "a.pdf", "doc")
+    manager.add_chunks(
+        [
+            {
+                "content": "The warranty covers parts and labour for two years.",
+                "metadata": {
+                    "source": "a.pdf",
+                    "file_name": "a.pdf",
+                    "doc_id": "doc",
+                    "chunk_index": 0,
+                },
+            }
+        ]
+    )
+    manager.mark_documents_stored("session", ["doc"])
+    yield ChatBot(
+        vectorstore=vectorstore,
+        openai_api_key="test-key",
+        session_id="session",
+        document_registry=registry,
+    )
+    vectorstore.close()
+
+
+def test_chat_records_usage(chatbot):
+    with chatbot.agent.override(model=TestModel(custom_output_text="Two years.")):
+        assert chatbot.chat("How long is the warranty?") == "Two years."
+    assert chatbot.last_prompt_stats["input_tokens"] > 0
+    assert chatbot.last_prompt_stats["cache_read_tokens"] == 0
+
+
+def test_chat_stream_records_usage(chatbot):
+    async def collect():
+        return [text async for text in chatbot.chat_stream("How long?")]
+
+    with chatbot.agent.override(model=TestModel(custom_output_text="Two years.")):
+        assert "".join(asyncio.run(collect())) == "Two years."
+    assert chatbot.last_prompt_stats["input_tokens"] > 0
+    assert chatbot.memory.turns
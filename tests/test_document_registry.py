@@ -0,0 +1,68 @@
+import fakeredis
+import pytest
+import config
+from document_registry import LocalDocumentRegistry, RedisDocumentRegistry
+
+
+@pytest.fixture(params=["local", "redis"])
+def registry(request, tmp_path):
+    if request.param == "local":
+        return LocalDocumentRegistry(str(tmp_path / "documents.sqlite3"))
+    return RedisDocumentRegistry(fakeredis.FakeRedis(decode_responses=True))
+
+
+def test_last_reference_marks_the_document_deleting(registry):
+    registry.add_reference("s1", "a.pdf", "doc")
+    registry.add_reference("s2", "a.pdf", "doc")
+    registry.mark_stored("doc")
+
+    assert registry.remove_reference("s1", "a.pdf") is None
+    assert not registry.is_deleting("doc")
+    assert registry.remove_reference("s2", "a.pdf") == "doc"
+    assert registry.is_deleting("doc")
+
+    registry.finish_deletion("doc")
+    assert not registry.is_deleting("doc")
+    assert not registry.add_reference("s1", "a.pdf", "doc")
+
+
+def test_reference_added_while_deleting_is_kept(registry):
+    registry.add_reference("s1", "a.pdf", "doc")
+    registry.mark_stored("doc")
+    assert registry.remove_session("s1") == ["doc"]
+
+    assert not registry.add_reference("s2", "a.pdf", "doc")
+    assert registry.is_deleting("doc")
+    registry.finish_deletion("doc")
+
+    assert not registry.is_deleting("doc")
+    assert registry.get_session_documents("s2") == {}
+    registry.mark_stored("doc")
+    assert registry.get_session_documents("s2") == {"a.pdf": "doc"}
+    assert registry.get_references() == [("s2", "a.pdf", "doc")]
+
+
+def test_only_one_caller_owns_a_deletion(registry):
+    registry.add_reference("s1", "a.pdf", "doc")
+    assert registry.remove_reference("s1", "a.pdf") == "doc"
+    registry.add_reference("s2", "a.pdf", "doc")
+
+    assert registry.remove_reference("s2", "a.pdf") is None
+    assert not registry.remove_document("doc")
+    registry.finish_deletion("doc")
+    assert registry.remove_document("doc")
+
+
+def test_remove_document_keeps_referenced_documents(registry):
+    registry.add_reference("s1", "a.pdf", "doc")
+    assert not registry.remove_document("doc")
+    assert not registry.is_deleting("doc")
+
+
+def test_stale_deletion_is_taken_over(registry, monkeypatch):
+    registry.add_reference("s1", "a.pdf", "doc")
+    assert registry.remove_reference("s1", "a.pdf") == "doc"
+
+    monkeypatch.setattr(config, "DOCUMENT_DELETE_TIMEOUT_SECONDS", -1)
+    assert not registry.is_deleting("doc")
+    assert registry.remove_document("doc")
@@ -0,0 +1,130 @@
+import fakeredis
+import pytest
+import config
+import session_manager
+from session_manager import LocalSessionManager, RedisSessionManager
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session_manager.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def manager(redis_client, clock):
+    return RedisSessionManager(redis_client=redis_client)
+
+
+def test_create_and_validate(manager):
+    assert manager.create_session("a") == []
+    assert manager.is_valid_session("a")
+    assert not manager.is_valid_session("unknown")
+    assert manager.list_sessions() == ["a"]
+
+
+def test_create_is_idempotent(manager):
+    manager.create_session("a")
+    assert manager.create_session("a") == []
+    assert manager.list_sessions() == ["a"]
+
+
+def test_full_queue_evicts_least_recently_used(manager, redis_client, clock):
+    for i in range(config.MAX_SESSIONS):
+        manager.create_session(f"s{i}")
+        manager.add_file_to_session(f"s{i}", "a.pdf")
+        clock.now += 1
+    manager.is_valid_session("s0")
+    clock.now += 1
+
+    assert manager.create_session("new") == ["s1"]
+    assert not manager.is_valid_session("s1")
+    assert not redis_client.exists("session_files:s1")
+    assert manager.get_session_files("s0") == ["a.pdf"]
+    assert len(manager.list_sessions()) == config.MAX_SESSIONS
+
+
+def test_expired_sessions_are_pruned_and_returned(manager, redis_client, clock):
+    manager.create_session("old")
+    manager.add_file_to_session("old", "a.pdf")
+    clock.now += manager.session_ttl / 2
+    manager.create_session("recent")
+    clock.now += manager.session_ttl / 2 + 1
+
+    assert not manager.is_valid_session("old")
+    assert manager.list_sessions() == ["recent"]
+    assert manager.create_session("new") == ["old"]
+    assert redis_client.zscore(manager.session_queue_key, "old") is None
+    assert not redis_client.exists("session_files:old")
+
+
+def test_validation_extends_the_session(manager, clock):
+    manager.create_session("a")
+    for _ in range(3):
+        clock.now += manager.session_ttl - 1
+        assert manager.is_valid_session("a")
+
+
+def test_legacy_queue_is_migrated(redis_client, clock):
+    redis_client.rpush("session_queue", "first", "second")
+    redis_client.rpush("session_files:first", "a.pdf")
+
+    manager = RedisSessionManager(redis_client=redis_client)
+
+    assert not redis_client.exists("session_queue")
+    assert manager.is_valid_session("first")
+    assert manager.is_valid_session("second")
+    assert manager.get_session_files("first") == ["a.pdf"]
+    assert redis_client.ttl("session_files:first") > 0
+    assert manager.list_sessions() == ["first", "second"]
+
+
+def test_migrated_sessions_keep_their_order(redis_client, clock):
+    redis_client.rpush(
+        "session_queue", *(f"s{i}" for i in range(config.MAX_SESSIONS))
+    )
+    manager = RedisSessionManager(redis_client=redis_client)
+    assert manager.create_session("new") == ["s0"]
+
+
+def test_file_limit(manager):
+    manager.create_session("a")
+    for i in range(config.MAX_FILES_PER_SESSION):
+        assert manager.add_file_to_session("a", f"{i}.pdf")
+    assert manager.add_file_to_session("a", "0.pdf")
+    assert not manager.can_add_file("a")
+    assert not manager.add_file_to_session("a", "extra.pdf")
+    manager.remove_file_from_session("a", "0.pdf")
+    assert manager.can_add_file("a")
+
+
+def test_remove_session(manager, redis_client):
+    manager.create_session("a")
+    manager.add_file_to_session("a", "a.pdf")
+    manager.remove_session("a")
+    assert not manager.is_valid_session("a")
+    assert not redis_client.exists("session_files:a")
+    assert manager.list_sessions() == []
+
+
+def test_local_create_returns_evicted(tmp_path):
+    manager = LocalSessionManager(tmp_path / "sessions.sqlite3")
+    for i in range(config.MAX_SESSIONS):
+        assert manager.create_session(f"s{i}") == []
+    assert manager.create_session("s0") == []
+    assert manager.create_session("new") == ["s0"]
+    assert not manager.is_valid_session("s0")